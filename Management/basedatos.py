@@ -0,0 +1,38 @@
+"""
+Ajustes por conexión de la base de datos. Con el perfil 'sqlite' (DB_PERFIL) cada
+conexión nueva aplica SQLITE_PRAGMAS: WAL, synchronous=NORMAL, mmap, tamaño de caché y
+busy_timeout. Son ajustes de la conexión (journal_mode queda además en el archivo), así
+que deben repetirse en cada una; las bases en memoria de los tests no usan WAL.
+"""
+import logging
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+def aplicar_pragmas(connection, pragmas=None):
+    """Ejecuta los PRAGMA en una conexión SQLite y devuelve {pragma: valor vigente}."""
+    pragmas = settings.SQLITE_PRAGMAS if pragmas is None else pragmas
+    vigentes = {}
+    with connection.cursor() as cursor:
+        for nombre, valor in pragmas.items():
+            if nombre == 'journal_mode' and connection.is_in_memory_db():
+                continue
+            cursor.execute(f"PRAGMA {nombre} = {valor}")
+            cursor.execute(f"PRAGMA {nombre}")
+            fila = cursor.fetchone()
+            vigentes[nombre] = fila[0] if fila else None
+    if pragmas.get('journal_mode') and not connection.is_in_memory_db() \
+            and str(vigentes.get('journal_mode')).lower() != str(pragmas['journal_mode']).lower():
+        logger.warning(f"SQLite no aceptó el modo de diario - Pedido: {pragmas['journal_mode']}, "
+                       f"Vigente: {vigentes.get('journal_mode')}")
+    return vigentes
+
+
+@receiver(connection_created)
+def ajustar_conexion_sqlite(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        aplicar_pragmas(connection)
@@ -0,0 +1,78 @@
+"""
+Métricas propias expuestas en /metrics junto a las de django_prometheus.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+
+compresion_bytes_originales = Counter(
+    'compresion_bytes_originales_total',
+    "Bytes de respuesta antes de comprimir",
+    ['codificacion'],
+)
+compresion_bytes_comprimidos = Counter(
+    'compresion_bytes_comprimidos_total',
+    "Bytes de respuesta enviados tras comprimir",
+    ['codificacion'],
+)
+compresion_cpu_segundos = Counter(
+    'compresion_cpu_segundos_total',
+    "Tiempo de CPU dedicado a comprimir respuestas",
+    ['codificacion'],
+)
+compresion_ratio = Histogram(
+    'compresion_ratio',
+    "Relación tamaño comprimido / original de cada respuesta",
+    ['codificacion'],
+    buckets=(0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.7, 0.9, 1.0),
+)
+
+
+def registrar_compresion(codificacion, originales, comprimidos, cpu_segundos):
+    compresion_bytes_originales.labels(codificacion).inc(originales)
+    compresion_bytes_comprimidos.labels(codificacion).inc(comprimidos)
+    compresion_cpu_segundos.labels(codificacion).inc(cpu_segundos)
+    if originales:
+        compresion_ratio.labels(codificacion).observe(comprimidos / originales)
+
+
+admision_rechazos = Counter(
+    'admision_rechazos_total',
+    "Peticiones rechazadas con 429 por el control de admisión",
+    ['motivo', 'clase'],
+)
+admision_en_curso = Gauge(
+    'admision_en_curso',
+    "Peticiones admitidas que se están atendiendo en este proceso",
+)
+
+
+def _ip_permitida(request):
+    import ipaddress
+
+    from django.conf import settings
+
+    ip = request.META.get(settings.ADMISION_CABECERA_IP) or request.META.get('REMOTE_ADDR', '')
+    try:
+        direccion = ipaddress.ip_address(ip.split(',')[0].strip())
+    except ValueError:
+        return False
+    return any(direccion in ipaddress.ip_network(red, strict=False) for red in settings.METRICAS_REDES_PERMITIDAS)
+
+
+def vista_metricas(request):
+    """
+    /metrics de django_prometheus solo para las redes de METRICAS_REDES_PERMITIDAS, quien
+    envíe METRICAS_TOKEN como Bearer o el personal con sesión; al resto, 403.
+    """
+    import hmac
+
+    from django.conf import settings
+    from django.http import HttpResponseForbidden
+    from django_prometheus.exports import ExportToDjangoView
+
+    autorizacion = request.META.get('HTTP_AUTHORIZATION', '')
+    con_token = bool(settings.METRICAS_TOKEN) and hmac.compare_digest(
+        autorizacion.encode(), f"Bearer {settings.METRICAS_TOKEN}".encode()
+    )
+    if not (_ip_permitida(request) or con_token or request.user.is_staff):
+        return HttpResponseForbidden("No tienes permiso para acceder a las métricas.")
+    return ExportToDjangoView(request)
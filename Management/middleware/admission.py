@@ -0,0 +1,166 @@
+# middleware/admission.py
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from Management.metrics import admision_en_curso, admision_rechazos
+
+METODOS_SEGUROS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+def clase_de_ruta(request, nombre_vista):
+    """'exportacion', 'escritura' o 'lectura', que determina el cubo de tokens a usar."""
+    if nombre_vista.startswith(settings.ADMISION_PREFIJOS_EXPORTACION):
+        return 'exportacion'
+    if request.method not in METODOS_SEGUROS and nombre_vista not in settings.ADMISION_LECTURAS_POST:
+        return 'escritura'
+    return 'lectura'
+
+
+def identidad(request):
+    """
+    Usuario o IP a la que se cobra la petición, resuelta sin consultar la base de datos:
+    el id del token JWT (solo se verifica la firma) o el de la sesión ya cargada.
+    """
+    autorizacion = request.META.get('HTTP_AUTHORIZATION', '')
+    if autorizacion.startswith('Bearer '):
+        from rest_framework_simplejwt.exceptions import TokenError
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        try:
+            token = AccessToken(autorizacion[len('Bearer '):])
+            return f"u{token[settings.SIMPLE_JWT['USER_ID_CLAIM']]}"
+        except (TokenError, KeyError):
+            pass
+    sesion = getattr(request, 'session', None)
+    if sesion is not None and settings.SESSION_COOKIE_NAME in request.COOKIES:
+        usuario = sesion.get('_auth_user_id')
+        if usuario:
+            return f"u{usuario}"
+    ip = request.META.get(settings.ADMISION_CABECERA_IP) or request.META.get('REMOTE_ADDR', '')
+    return f"ip{ip.split(',')[0].strip()}"
+
+
+def consumir_token(clave, tasa, rafaga, ahora=None):
+    """
+    Cubo de tokens con `rafaga` tokens que se recargan a `tasa` por segundo, implementado
+    como GCRA: en la caché solo se guarda el instante teórico de la próxima llegada, en
+    milisegundos. Cada petición lo avanza con incr (atómico en Redis y en LocMemCache) y
+    lo devuelve con decr si no se admite, así que dos workers no pueden gastar el mismo
+    token. La clave caduca cuando ese instante ya pasó y add la vuelve a crear desde
+    ahora; como la caducidad va en segundos, tras una pausa se admite como mucho un
+    segundo de `tasa` por encima de la ráfaga.
+
+    Sin caché compartida (CACHE_COMPARTIDA) cada proceso lleva sus propios cubos: el
+    límite efectivo es el configurado por el número de workers.
+    Devuelve (admitida, segundos hasta que haya un token).
+    """
+    cache = caches[settings.ADMISION_CACHE]
+    ahora = round((time.time() if ahora is None else ahora) * 1000)
+    intervalo = max(1, round(1000 / tasa))
+    tolerancia = intervalo * (rafaga - 1)
+    while True:
+        try:
+            siguiente = cache.incr(clave, intervalo)
+            break
+        except ValueError:
+            # No existe (o caducó): la crea quien llegue primero; el resto reintenta incr
+            if cache.add(clave, ahora + intervalo, timeout=math.ceil(intervalo / 1000)):
+                return True, 0
+    llegada = siguiente - intervalo
+    if llegada - ahora > tolerancia:
+        cache.decr(clave, intervalo)
+        return False, (llegada - tolerancia - ahora) / 1000
+    cache.touch(clave, timeout=max(1, math.ceil((siguiente - ahora) / 1000)))
+    return True, 0
+
+
+def _rechazo(motivo, clase, reintentar, detalle):
+    admision_rechazos.labels(motivo, clase).inc()
+    response = JsonResponse({'detail': detalle}, status=429)
+    response['Retry-After'] = str(max(1, math.ceil(reintentar)))
+    return response
+
+
+_semaforos = {}
+_semaforos_lock = threading.Lock()
+
+
+def semaforo(nombre, limite):
+    """Semáforo del proceso para `nombre` (None = límite global); uno nuevo si cambia el límite."""
+    clave = (nombre, limite)
+    with _semaforos_lock:
+        if clave not in _semaforos:
+            _semaforos[clave] = threading.BoundedSemaphore(limite)
+        return _semaforos[clave]
+
+
+def admitir(request, nombre_vista, concurrencia_global=True):
+    """
+    Cobra el token de la clase de ruta y reserva los semáforos de concurrencia (el global
+    solo con `concurrencia_global`). Devuelve la respuesta 429 si la petición no se
+    admite o None; los semáforos reservados se liberan con liberar(request).
+    """
+    if not settings.ADMISION_ACTIVA or nombre_vista in settings.ADMISION_EXENTAS:
+        return None
+    clase = clase_de_ruta(request, nombre_vista)
+    tasa, rafaga = settings.ADMISION_TASAS[clase]
+    admitida, espera = consumir_token(f"admision:{clase}:{identidad(request)}", tasa, rafaga)
+    if not admitida:
+        return _rechazo('limite_tasa', clase, espera, "Demasiadas peticiones, reintente más tarde.")
+
+    request._admision_semaforos = []
+    if concurrencia_global:
+        global_ = semaforo(None, settings.ADMISION_MAX_CONCURRENCIA)
+        if not global_.acquire(blocking=False):
+            return _rechazo('sobrecarga', clase, 1, "Servidor ocupado, reintente en unos segundos.")
+        request._admision_semaforos.append(global_)
+
+    limite = settings.ADMISION_LIMITES_VISTA.get(nombre_vista)
+    if limite is not None:
+        por_vista = semaforo(nombre_vista, limite)
+        if not por_vista.acquire(blocking=False):
+            liberar(request)
+            return _rechazo('limite_vista', clase, settings.ADMISION_REINTENTO_VISTA_SEGUNDOS,
+                            "Hay demasiadas exportaciones en curso, reintente más tarde.")
+        request._admision_semaforos.append(por_vista)
+    admision_en_curso.inc()
+    request._admision_en_curso = True
+    return None
+
+
+def liberar(request):
+    """Libera, una sola vez, los semáforos que admitir() reservó para `request`."""
+    if getattr(request, '_admision_en_curso', False):
+        request._admision_en_curso = False
+        admision_en_curso.dec()
+    semaforos = getattr(request, '_admision_semaforos', [])
+    while semaforos:
+        semaforos.pop().release()
+
+
+class AdmissionControlMiddleware(MiddlewareMixin):
+    """
+    Decide antes de ejecutar la vista si la petición se admite: primero el cubo de tokens
+    del usuario (o IP) para su clase de ruta, luego el límite de peticiones simultáneas
+    del proceso y, para las vistas costosas, su propio límite. Lo que no se admite
+    recibe 429 con Retry-After sin llegar a la base de datos. Las respuestas en
+    streaming conservan sus semáforos hasta que se cierran.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return admitir(request, request.resolver_match.url_name or '')
+
+    def process_response(self, request, response):
+        if response.streaming:
+            # El cuerpo se genera mientras se envía, después de este método: los semáforos se
+            # liberan cuando el servidor cierra la respuesta, al terminar o si el cliente se va
+            response._resource_closers.append(lambda: liberar(request))
+        else:
+            liberar(request)
+        return response
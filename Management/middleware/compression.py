@@ -0,0 +1,178 @@
+# middleware/compression.py
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from Management.metrics import registrar_compresion
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Tipos que se comprimen. HTML queda fuera a propósito: sus páginas llevan el token CSRF
+# y comprimirlas junto a datos controlados por el usuario abre la puerta a BREACH.
+TIPOS_COMPRIMIBLES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/yaml',
+    'text/csv',
+    'text/plain',
+    'text/css',
+    'text/javascript',
+)
+
+
+class _Gzip:
+    def __init__(self, nivel):
+        self._compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def comprimir(self, datos):
+        return self._compresor.compress(datos)
+
+    def terminar(self):
+        return self._compresor.flush()
+
+
+class _Brotli:
+    def __init__(self, nivel):
+        self._compresor = brotli.Compressor(quality=nivel)
+
+    def comprimir(self, datos):
+        return self._compresor.process(datos)
+
+    def terminar(self):
+        return self._compresor.finish()
+
+
+class _Zstd:
+    def __init__(self, nivel):
+        self._compresor = zstandard.ZstdCompressor(level=nivel).compressobj()
+
+    def comprimir(self, datos):
+        return self._compresor.compress(datos)
+
+    def terminar(self):
+        return self._compresor.flush()
+
+
+def codificaciones_disponibles():
+    """Codificaciones soportadas por el servidor en orden de preferencia."""
+    disponibles = []
+    if zstandard is not None:
+        disponibles.append(('zstd', _Zstd, settings.COMPRESION_NIVEL_ZSTD))
+    if brotli is not None:
+        disponibles.append(('br', _Brotli, settings.COMPRESION_NIVEL_BROTLI))
+    disponibles.append(('gzip', _Gzip, settings.COMPRESION_NIVEL_GZIP))
+    return disponibles
+
+
+def negociar(accept_encoding):
+    """Elige la codificación preferida del servidor entre las que acepta el cliente (q > 0)."""
+    aceptadas = {}
+    for parte in accept_encoding.split(','):
+        nombre, _, parametros = parte.strip().partition(';')
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        if nombre:
+            aceptadas[nombre.strip().lower()] = calidad
+    comodin = aceptadas.get('*', 0.0)
+    for nombre, clase, nivel in codificaciones_disponibles():
+        if aceptadas.get(nombre, comodin) > 0:
+            return nombre, clase, nivel
+    return None
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Comprime las respuestas de la API y las exportaciones con zstd, brotli o gzip según
+    Accept-Encoding. Las respuestas en memoria por debajo de COMPRESION_UMBRAL_BYTES se
+    envían tal cual; las respuestas en streaming se comprimen sobre la marcha sin
+    cargarlas enteras. Los eventos (text/event-stream) no se comprimen porque deben
+    llegar al cliente en cuanto se emiten.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+        tipo = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if tipo not in TIPOS_COMPRIMIBLES and not tipo.endswith('+json'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < settings.COMPRESION_UMBRAL_BYTES:
+            return response
+        elegida = negociar(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if elegida is None:
+            return response
+        nombre, clase, nivel = elegida
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._comprimir_async(response.streaming_content, nombre, clase(nivel))
+            else:
+                response.streaming_content = self._comprimir_flujo(response.streaming_content, nombre, clase(nivel))
+            del response['Content-Length']
+        else:
+            inicio = time.thread_time()
+            compresor = clase(nivel)
+            comprimido = compresor.comprimir(response.content) + compresor.terminar()
+            cpu = time.thread_time() - inicio
+            registrar_compresion(nombre, len(response.content), len(comprimido), cpu)
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response['Content-Length'] = str(len(comprimido))
+
+        # El cuerpo ya no es idéntico byte a byte: el ETag pasa a ser débil
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = nombre
+        return response
+
+    @staticmethod
+    def _comprimir_flujo(contenido, nombre, compresor):
+        originales = comprimidos = cpu = 0
+        for trozo in contenido:
+            inicio = time.thread_time()
+            salida = compresor.comprimir(trozo)
+            cpu += time.thread_time() - inicio
+            originales += len(trozo)
+            comprimidos += len(salida)
+            if salida:
+                yield salida
+        final = compresor.terminar()
+        comprimidos += len(final)
+        registrar_compresion(nombre, originales, comprimidos, cpu)
+        yield final
+
+    @staticmethod
+    async def _comprimir_async(contenido, nombre, compresor):
+        originales = comprimidos = cpu = 0
+        async for trozo in contenido:
+            inicio = time.thread_time()
+            salida = compresor.comprimir(trozo)
+            cpu += time.thread_time() - inicio
+            originales += len(trozo)
+            comprimidos += len(salida)
+            if salida:
+                yield salida
+        final = compresor.terminar()
+        comprimidos += len(final)
+        registrar_compresion(nombre, originales, comprimidos, cpu)
+        yield final
@@ -1,36 +1,157 @@
-# middleware/logging_middleware.py
-import logging
-import time
-from django.utils.deprecation import MiddlewareMixin
-
-logger = logging.getLogger(__name__)
-
-class RequestLoggingMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        request.start_time = time.time()
-        return None
-
-    def process_response(self, request, response):
-        duration = time.time() - request.start_time
-        
-        extra = {
-            'user': getattr(request.user, 'username', 'anonymous'),
-            'ip': request.META.get('REMOTE_ADDR'),
-            'method': request.method,
-            'path': request.path,
-            'status_code': response.status_code,
-            'duration': duration
-        }
-        
-        logger.info(
-            f"{request.method} {request.path} - Status: {response.status_code}",
-            extra=extra
-        )
-
-        if response.status_code >= 400:
-            logger.error(
-                f"Error {response.status_code} on {request.method} {request.path}",
-                extra=extra
-            )
-
-        return response
\ No newline at end of file
+# middleware/logging_middleware.py
+import json
+import logging
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from usuarios.sesion import nombre_usuario
+
+logger = logging.getLogger(__name__)
+
+METODOS_ESCRITURA = {'POST', 'PUT', 'PATCH', 'DELETE'}
+CAMPOS_SENSIBLES = {'password', 'password1', 'password2', 'token', 'refresh', 'access', 'csrfmiddlewaretoken'}
+REDACTADO = '***'
+
+
+def redactar(datos):
+    """Sustituye recursivamente los valores de los campos con credenciales."""
+    if isinstance(datos, dict):
+        return {
+            clave: REDACTADO if str(clave).lower() in CAMPOS_SENSIBLES else redactar(valor)
+            for clave, valor in datos.items()
+        }
+    if isinstance(datos, list):
+        return [redactar(valor) for valor in datos]
+    return datos
+
+
+class RequestJournal:
+    """
+    Diario NDJSON de peticiones (una línea por petición) que reproduce
+    `manage.py replay_journal`. Cada línea se escribe con una sola llamada en modo
+    append, así que varios workers pueden compartir el archivo.
+    """
+
+    def __init__(self, ruta, max_cuerpo):
+        self.ruta = ruta
+        self.max_cuerpo = max_cuerpo
+        self._lock = threading.Lock()
+        self._archivo = None
+
+    def cuerpo(self, request):
+        """
+        (content_type, cuerpo) de una escritura con las credenciales redactadas, o None
+        si no se registra. Los formularios multipart se guardan sin archivos y se
+        reproducen como urlencoded.
+        """
+        if request.method not in METODOS_ESCRITURA:
+            return None
+        try:
+            if int(request.META.get('CONTENT_LENGTH') or 0) > self.max_cuerpo:
+                return None
+        except ValueError:
+            return None
+        tipo = request.content_type or ''
+        try:
+            if tipo == 'application/json':
+                return tipo, redactar(json.loads(request.body or b'null'))
+            if tipo == 'application/x-www-form-urlencoded':
+                return tipo, redactar(dict(parse_qsl(request.body.decode(), keep_blank_values=True)))
+            if tipo == 'multipart/form-data':
+                return 'application/x-www-form-urlencoded', redactar(request.POST.dict())
+        except ValueError:
+            pass
+        return None
+
+    def registrar(self, request, response, duracion, cuerpo):
+        autorizacion = request.META.get('HTTP_AUTHORIZATION', '')
+        if autorizacion.startswith('Bearer '):
+            autenticacion = 'jwt'
+        elif settings.SESSION_COOKIE_NAME in request.COOKIES:
+            autenticacion = 'session'
+        else:
+            autenticacion = None
+
+        entrada = {
+            't': round(request.start_time, 6),
+            'm': request.method,
+            'p': request.path,
+            'q': request.META.get('QUERY_STRING', ''),
+            's': response.status_code,
+            'd': round(duracion * 1000, 2),
+            'a': autenticacion,
+        }
+        if cuerpo is not None:
+            entrada['ct'], entrada['b'] = cuerpo
+        linea = json.dumps(entrada, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+        try:
+            with self._lock:
+                if self._archivo is None:
+                    self._archivo = open(self.ruta, 'a', encoding='utf-8', buffering=1)
+                self._archivo.write(linea)
+        except OSError as e:
+            logger.error(f"No se pudo escribir el diario de peticiones - Ruta: {self.ruta}, Error: {str(e)}")
+
+
+_diarios = {}
+_diarios_lock = threading.Lock()
+
+
+def diario():
+    """RequestJournal de REQUEST_JOURNAL_PATH, compartido por el middleware y los lotes, o None."""
+    ruta = getattr(settings, 'REQUEST_JOURNAL_PATH', '')
+    if not ruta:
+        return None
+    clave = (ruta, settings.REQUEST_JOURNAL_MAX_BODY)
+    with _diarios_lock:
+        if clave not in _diarios:
+            _diarios[clave] = RequestJournal(ruta, settings.REQUEST_JOURNAL_MAX_BODY)
+        return _diarios[clave]
+
+
+class RequestLoggingMiddleware(MiddlewareMixin):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.journal = diario()
+
+    def process_request(self, request):
+        request.start_time = time.time()
+        if self.journal:
+            # Se lee antes que la vista para que el cuerpo quede en caché
+            request.journal_body = self.journal.cuerpo(request)
+        return None
+
+    def process_response(self, request, response):
+        duration = time.time() - request.start_time
+
+        extra = {
+            # Sin forzar la carga de request.user: en las vistas HTML el nombre viene de la sesión
+            'user': nombre_usuario(request),
+            'ip': request.META.get('REMOTE_ADDR'),
+            'method': request.method,
+            'path': request.path,
+            'status_code': response.status_code,
+            'duration': duration
+        }
+
+        logger.info(
+            f"{request.method} {request.path} - Status: {response.status_code}",
+            extra=extra
+        )
+
+        if response.status_code >= 400:
+            logger.error(
+                f"Error {response.status_code} on {request.method} {request.path}",
+                extra=extra
+            )
+
+        # Un lote registra cada subpetición por separado (productos.lotes); reproducirlo también las duplicaría
+        if self.journal and not getattr(request, 'journal_omitir', False):
+            self.journal.registrar(request, response, duration, getattr(request, 'journal_body', None))
+
+        return response
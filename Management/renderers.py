@@ -0,0 +1,24 @@
+"""
+JSON compacto por defecto; `?pretty=1` lo devuelve indentado para leerlo a mano.
+"""
+import json
+
+from rest_framework import renderers
+
+
+def pretty(request):
+    return request is not None and request.GET.get('pretty') in ('1', 'true')
+
+
+def dumps(data, request=None):
+    """Serializa `data` sin espacios salvo que la petición pida ?pretty=1."""
+    if pretty(request):
+        return json.dumps(data, indent=4, ensure_ascii=False)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    def get_indent(self, accepted_media_type, renderer_context):
+        if pretty((renderer_context or {}).get('request')):
+            return 4
+        return super().get_indent(accepted_media_type, renderer_context)
@@ -0,0 +1,157 @@
+"""
+Documentación OpenAPI de la API (drf_yasg).
+
+La vista se construye en el primer acceso a /api-docs/ o /redoc/ para no cargar
+drf_yasg durante el arranque de cada worker.
+
+El esquema se genera una sola vez por versión del código: se lee del archivo que
+deja `manage.py generate_openapi_schema` durante el build o, si no existe, se genera
+en la primera petición. En ambos casos queda en memoria y se sirve con ETag y gzip.
+"""
+import functools
+import gzip
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+
+# Parámetro ?format= que usan Swagger UI y ReDoc para pedir el esquema
+FORMATOS_DRF_YASG = {
+    'openapi': 'json',
+    'json': 'json',
+    '.json': 'json',
+    'yaml': 'yaml',
+    '.yaml': 'yaml',
+}
+
+_esquemas = {}
+_esquemas_lock = threading.Lock()
+
+
+@functools.cache
+def get_schema_view():
+    from drf_yasg.views import get_schema_view as drf_yasg_schema_view
+    from rest_framework import permissions
+
+    return drf_yasg_schema_view(
+        info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+@functools.cache
+def info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="Documentación API Inventario",
+        default_version='v1',
+        description="Documentación para la API de gestión de inventarios",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@management.local"),
+        license=openapi.License(name="BSD license"),
+    )
+
+
+@functools.cache
+def version_codigo():
+    """
+    Versión del código desplegado: un hash del contenido de los módulos Python del
+    proyecto. No depende de variables de entorno, que no son las mismas durante el
+    build (donde se pregenera el esquema) que en ejecución.
+    """
+    resumen = hashlib.sha256()
+    for app in ('Management', 'productos', 'usuarios'):
+        for raiz, directorios, archivos in os.walk(os.path.join(settings.BASE_DIR, app)):
+            directorios[:] = sorted(d for d in directorios if d != '__pycache__')
+            for archivo in sorted(archivos):
+                if archivo.endswith('.py'):
+                    ruta = os.path.join(raiz, archivo)
+                    resumen.update(os.path.relpath(ruta, settings.BASE_DIR).encode())
+                    with open(ruta, 'rb') as f:
+                        resumen.update(f.read())
+    return resumen.hexdigest()[:16]
+
+
+def ruta_esquema(formato, version=None):
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, f"schema-{version or version_codigo()}.{formato}")
+
+
+def generar_esquema(formato):
+    """Genera el esquema completo recorriendo todas las vistas y serializers."""
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    generador = OpenAPISchemaGenerator(info())
+    esquema = generador.get_schema(request=None, public=True)
+    codec = OpenAPICodecJson if formato == 'json' else OpenAPICodecYaml
+    return codec(validators=[]).encode(esquema)
+
+
+def esquema(formato):
+    """Devuelve (cuerpo, cuerpo_gzip, etag) del esquema para la versión actual del código."""
+    clave = (version_codigo(), formato)
+    if clave in _esquemas:
+        return _esquemas[clave]
+
+    with _esquemas_lock:
+        if clave not in _esquemas:
+            ruta = ruta_esquema(formato)
+            if os.path.exists(ruta):
+                with open(ruta, 'rb') as f:
+                    cuerpo = f.read()
+                logger.info(f"Esquema OpenAPI cargado de {ruta}")
+            else:
+                cuerpo = generar_esquema(formato)
+                logger.info(f"Esquema OpenAPI generado en memoria - Versión: {clave[0]}, Formato: {formato}")
+            etag = f'"{hashlib.sha256(cuerpo).hexdigest()[:32]}"'
+            _esquemas[clave] = (cuerpo, gzip.compress(cuerpo, compresslevel=9), etag)
+    return _esquemas[clave]
+
+
+def servir_esquema(request, formato):
+    cuerpo, cuerpo_gzip, etag = esquema(formato)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(cuerpo_gzip, content_type=FORMATOS[formato])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(cuerpo, content_type=FORMATOS[formato])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=300'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+@functools.cache
+def _vista_ui(renderer):
+    return get_schema_view().with_ui(renderer, cache_timeout=0)
+
+
+def _documentacion(renderer, request, *args, **kwargs):
+    # La página de la UI es ligera; lo costoso es el esquema que pide con ?format=openapi
+    formato = FORMATOS_DRF_YASG.get(request.GET.get('format', ''))
+    if formato:
+        return servir_esquema(request, formato)
+    return _vista_ui(renderer)(request, *args, **kwargs)
+
+
+def swagger_ui(request, *args, **kwargs):
+    return _documentacion('swagger', request, *args, **kwargs)
+
+
+def redoc_ui(request, *args, **kwargs):
+    return _documentacion('redoc', request, *args, **kwargs)
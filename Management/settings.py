@@ -13,9 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
-import os
-
-
+from django.core.exceptions import ImproperlyConfigured
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -54,13 +52,17 @@ INSTALLED_APPS = [
     'whitenoise.runserver_nostatic'
 ]
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise con camino asíncrono: toda la cadena es sync_and_async_capable, así que
+    # bajo ASGI ninguna petición se adapta a un hilo entero (ver productos/async_views.py)
+    'Management.middleware.static_files.StaticFilesMiddleware',
     'django_prometheus.middleware.PrometheusBeforeMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'Management.middleware.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Management.middleware.admission.AdmissionControlMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'Management.middleware.logging_middleware.RequestLoggingMiddleware',
@@ -72,6 +74,10 @@ ROOT_URLCONF = 'Management.urls'
 
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'Management.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
@@ -84,6 +90,8 @@ import sys
 TESTING = 'pytest' in sys.argv[0]
 
 SWAGGER_USE_COMPAT_RENDERERS = False
+# Esquemas OpenAPI pregenerados por versión (manage.py generate_openapi_schema)
+OPENAPI_SCHEMA_DIR = os.path.join(BASE_DIR, 'openapi')
 
 
 from datetime import timedelta
@@ -111,6 +119,147 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Inventario
+# Umbral de stock bajo para los productos que aún no tienen pronóstico de demanda
+STOCK_BAJO_UMBRAL = 5
+# Parámetros del cálculo de punto de reorden (manage.py forecast_stock)
+PRONOSTICO_VENTANA_DIAS = 28
+PRONOSTICO_PLAZO_ENTREGA_DIAS = 7
+PRONOSTICO_FACTOR_SEGURIDAD = 1.65
+
+# Eventos de stock en tiempo real (/eventos/stock/, requiere ASGI)
+# Las páginas solo abren el EventSource si se sirve con ASGI (SERVIDOR_MODO, ver gunicorn.conf.py);
+# bajo WSGI el endpoint responde 501
+EVENTOS_SSE_ACTIVO = os.environ.get('SERVIDOR_MODO', 'wsgi') == 'asgi'
+# 'local' reparte los eventos dentro de cada proceso; 'postgres' los comparte entre workers con LISTEN/NOTIFY
+EVENTOS_TRANSPORTE = os.environ.get('EVENTOS_TRANSPORTE', 'local')
+# Conexión directa para LISTEN; el pooler de Neon no mantiene las sesiones necesarias
+EVENTOS_PG_DSN = os.environ.get('EVENTOS_PG_DSN', '')
+EVENTOS_HEARTBEAT_SEGUNDOS = 15
+
+# Presupuesto de arranque en frío para manage.py importtime (ms hasta la primera respuesta)
+ARRANQUE_PRESUPUESTO_MS = int(os.environ.get('ARRANQUE_PRESUPUESTO_MS', '3000'))
+
+# Escritura diferida de movimientos: POST /api/inventarios/ encola y responde 202;
+# manage.py drain_inventory_queue los aplica por lotes
+INVENTARIO_ESCRITURA_DIFERIDA = os.environ.get('INVENTARIO_ESCRITURA_DIFERIDA', '0') == '1'
+INVENTARIO_COLA_MAX = int(os.environ.get('INVENTARIO_COLA_MAX', '50000'))
+INVENTARIO_COLA_LOTE = 500
+# Cada cuántos segundos se vuelve a contar la cola al encolar (entre tanto, conteo en caché;
+# sin CACHE_COMPARTIDA ese conteo es de cada proceso, ver productos.ingesta.profundidad_aproximada)
+INVENTARIO_COLA_CONTEO_SEGUNDOS = int(os.environ.get('INVENTARIO_COLA_CONTEO_SEGUNDOS', '5'))
+# Meses completos que Inventario conserva antes de que manage.py archive_inventory los archive
+INVENTARIO_RETENCION_MESES = int(os.environ.get('INVENTARIO_RETENCION_MESES', '12'))
+
+# Auditoría (productos.auditoria): los registros se insertan en lotes de AUDITORIA_LOTE o
+# cada AUDITORIA_INTERVALO_MS; compact_audit_log aplica la retención
+AUDITORIA_LOTE = int(os.environ.get('AUDITORIA_LOTE', '200'))
+AUDITORIA_INTERVALO_MS = int(os.environ.get('AUDITORIA_INTERVALO_MS', '2000'))
+AUDITORIA_RETENCION_DIAS = int(os.environ.get('AUDITORIA_RETENCION_DIAS', '365'))
+
+# Consulta múltiple de productos (?ids= y multi-get) con caché por objeto (productos.cache)
+MULTIGET_MAX_IDS = 1000
+MULTIGET_CACHE = 'default'
+MULTIGET_CACHE_SEGUNDOS = int(os.environ.get('MULTIGET_CACHE_SEGUNDOS', '300'))
+# Instantánea del catálogo mapeada en memoria y compartida por los workers de la máquina
+# (productos/catalogo.py); vacío para desactivarla. Requiere CACHE_COMPARTIDA, porque su
+# versión vive en la caché. En las pruebas se desactiva salvo que se pida
+CATALOGO_INSTANTANEA_DIR = os.environ.get(
+    'CATALOGO_INSTANTANEA_DIR', '' if TESTING else ('/dev/shm' if os.path.isdir('/dev/shm') else '/tmp')
+)
+# Intervalo mínimo entre reconstrucciones; con escrituras más seguidas se lee de la base de datos
+CATALOGO_INSTANTANEA_INTERVALO_MS = int(os.environ.get('CATALOGO_INSTANTANEA_INTERVALO_MS', '1000'))
+
+# POST /api/batch/ (productos.lotes): subpeticiones por lote
+LOTE_API_MAX_PETICIONES = int(os.environ.get('LOTE_API_MAX_PETICIONES', '50'))
+
+# Reportes PDF: procesos que maquetan en paralelo (0 = uno por núcleo) y páginas por trozo
+REPORTES_PDF_PROCESOS = int(os.environ.get('REPORTES_PDF_PROCESOS', '0'))
+REPORTES_PDF_PAGINAS_POR_TROZO = 25
+
+# Compresión de respuestas (Management.middleware.compression); zstd y brotli solo si están instalados
+COMPRESION_UMBRAL_BYTES = int(os.environ.get('COMPRESION_UMBRAL_BYTES', '1024'))
+COMPRESION_NIVEL_GZIP = int(os.environ.get('COMPRESION_NIVEL_GZIP', '6'))
+COMPRESION_NIVEL_BROTLI = int(os.environ.get('COMPRESION_NIVEL_BROTLI', '4'))
+COMPRESION_NIVEL_ZSTD = int(os.environ.get('COMPRESION_NIVEL_ZSTD', '3'))
+
+# Caché compartida entre workers (REDIS_URL, p. ej. redis://host:6379/0); sin ella, memoria por proceso
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Si la caché la ven todos los procesos. Lo que debe invalidarse en todos los workers (la
+# caché por objeto de productos y la versión de la instantánea del catálogo) solo se usa
+# entonces; con una caché en memoria por proceso se lee de la base de datos. CACHE_COMPARTIDA=1 la fuerza (p. ej., con
+# un solo worker)
+CACHE_COMPARTIDA = os.environ.get('CACHE_COMPARTIDA', '1' if os.environ.get('REDIS_URL') else '0') == '1'
+# Sesiones de las vistas HTML (SESION_MOTOR): 'cached_db' lee de la caché 'sesiones' y solo
+# va a la base de datos si falta; 'db' (por defecto sin Redis) siempre va a la base de datos;
+# con una caché local de cada worker, un logout no borraría la copia de los demás. 'cache'
+# también se admite. 'signed_cookies' guarda la sesión firmada en la cookie, sin estado en
+# el servidor y sin consultas, pero solo por elección explícita: el logout no la revoca, y
+# una cookie copiada sigue valiendo hasta que vence (SESSION_COOKIE_AGE); la revalidación
+# periódica solo detecta un cambio de contraseña.
+SESION_MOTOR = os.environ.get('SESION_MOTOR', 'cached_db' if os.environ.get('REDIS_URL') else 'db')
+if SESION_MOTOR not in ('cached_db', 'signed_cookies', 'cache', 'db'):
+    raise ImproperlyConfigured(f"SESION_MOTOR no válido: {SESION_MOTOR!r}")
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESION_MOTOR}'
+SESSION_CACHE_ALIAS = 'sesiones'
+CACHES['sesiones'] = dict(CACHES['default'], KEY_PREFIX='sesion', LOCATION=CACHES['default'].get('LOCATION', 'sesiones'))
+# Cada cuántos segundos se vuelven a leer de la base de datos el usuario y el rol guardados en la sesión
+SESION_REVALIDAR_SEGUNDOS = int(os.environ.get('SESION_REVALIDAR_SEGUNDOS', '300'))
+
+# Control de admisión (Management.middleware.admission)
+ADMISION_ACTIVA = os.environ.get('ADMISION_ACTIVA', '1') == '1'
+# Los cubos de tokens viven en esta caché: sin una compartida (CACHE_COMPARTIDA) cada proceso
+# tiene los suyos y la tasa efectiva por usuario se multiplica por el número de workers
+ADMISION_CACHE = 'default'
+# Clase de ruta -> (tokens por segundo, ráfaga máxima), por usuario o IP
+ADMISION_TASAS = {
+    'lectura': (10, 60),
+    'escritura': (5, 30),
+    'exportacion': (0.2, 5),
+}
+ADMISION_PREFIJOS_EXPORTACION = ('exportar', 'export_', 'async_exportar')
+# Vistas que usan POST solo para enviar parámetros largos y se cobran como lecturas
+ADMISION_LECTURAS_POST = {'producto-multi-get'}
+# Peticiones simultáneas por proceso antes de rechazar con 429
+ADMISION_MAX_CONCURRENCIA = int(os.environ.get('ADMISION_MAX_CONCURRENCIA', '64'))
+# Límites propios por proceso de las vistas costosas (nombre de URL -> simultáneas)
+ADMISION_LIMITES_VISTA = {
+    'exportar_productos_pdf': 2,
+    'exportar_inventarios_pdf': 2,
+    'exportar_productos': 4,
+    'exportar_inventarios': 4,
+    'export_logs_pdf': 1,
+}
+ADMISION_REINTENTO_VISTA_SEGUNDOS = 5
+# Conexiones SSE de larga duración y el scraping de métricas no pasan por el control
+ADMISION_EXENTAS = {'eventos_stock', 'prometheus-django-metrics'}
+# Cabecera con la IP real del cliente detrás del proxy de Fly
+ADMISION_CABECERA_IP = 'HTTP_FLY_CLIENT_IP'
+
+# /metrics solo se sirve a estas redes (la IP del cliente se toma como en ADMISION_CABECERA_IP),
+# a quien envíe METRICAS_TOKEN como 'Authorization: Bearer' o al personal con sesión iniciada
+METRICAS_REDES_PERMITIDAS = [
+    red.strip() for red in os.environ.get('METRICAS_REDES_PERMITIDAS', '127.0.0.1/32,::1/128').split(',') if red.strip()
+]
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+
+# Diario de peticiones reproducible con manage.py replay_journal (vacío = desactivado)
+REQUEST_JOURNAL_PATH = os.environ.get('REQUEST_JOURNAL_PATH', '')
+# Los cuerpos de escritura más grandes se registran sin cuerpo
+REQUEST_JOURNAL_MAX_BODY = 64 * 1024
+
 
 TEMPLATES = [
     {
@@ -131,35 +280,79 @@ TEMPLATES = [
 WSGI_APPLICATION = 'Management.wsgi.application'
 
 ###Configuración de la base de datos
-  #Configuración de la base de datos PostgreSQL
-DATABASES = {
-        'default': {
-               'ENGINE': 'django.db.backends.postgresql',
-               'NAME': 'inventarios',
-               'USER': 'inventarios_owner',
-               'PASSWORD': 'npg_OaGFeupyTQ61',
-               'HOST': 'ep-falling-bird-a8psgl0q-pooler.eastus2.azure.neon.tech',
-               'PORT': '5432',
-               'OPTIONS': {
-                     'sslmode': 'require',
-                },
+# DB_PERFIL elige la base de datos:
+#   'sqlite' (por defecto): archivo SQLite local (DB_SQLITE_RUTA, por defecto db.sqlite3),
+#     con WAL y los PRAGMA de SQLITE_PRAGMAS aplicados al abrir cada conexión
+#     (Management/basedatos.py). No necesita red ni credenciales: es el de desarrollo y
+#     el de los tests, que usan una base en memoria.
+#   'neon': PostgreSQL remoto en Neon, con TLS. El despliegue lo fija en fly.toml.
+#   'postgres_local': PostgreSQL en localhost sin TLS, para reproducir pruebas de
+#     rendimiento y de carga sin red.
+# Las credenciales solo se leen del entorno: DB_NAME, DB_USER, DB_PASSWORD, DB_HOST,
+# DB_PORT y DB_SSLMODE. 'neon' no tiene valores por defecto para el servidor, el
+# usuario ni la contraseña; sin ellos la configuración falla al arrancar.
+DB_PERFIL = os.environ.get('DB_PERFIL', 'sqlite')
+# Conexiones persistentes: evitan el handshake TLS con Neon en cada petición
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
+
+def _postgres(sslmode, **por_defecto):
+    valores = {}
+    for clave in ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT'):
+        valor = os.environ.get(f'DB_{clave}', por_defecto.get(clave.lower()))
+        if valor is None:
+            raise ImproperlyConfigured(f"DB_PERFIL={DB_PERFIL!r} requiere la variable de entorno DB_{clave}")
+        valores[clave] = valor
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        **valores,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'sslmode': os.environ.get('DB_SSLMODE', sslmode),
+        },
     }
-}
-
-###SOLO COMENTANDO LA DATABASE DE POSTGRESQL, PERMITE HACER LAS PRUEBAS EN SQLITE3
 
-# Got an error creating the test database: database "test_postgres" already exists
-# Got an error recreating the test database: database "test_postgres" is being accessed by other users
-# DETAIL:  There is 1 other session using the database.
 
-
-#DATABASES = {
-#    'default':
-#        {
-#            'ENGINE': 'django.db.backends.sqlite3',
-#            'NAME': BASE_DIR / 'db.sqlite3',
-#        }
-#    }
+if DB_PERFIL == 'neon':
+    DATABASES = {
+        'default': _postgres('require', name='inventarios', port='5432'),
+    }
+elif DB_PERFIL == 'postgres_local':
+    DATABASES = {
+        'default': _postgres('disable', name='inventarios', user='postgres', password='',
+                             host='localhost', port='5432'),
+    }
+elif DB_PERFIL == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_SQLITE_RUTA', str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                # Segundos que una escritura espera el bloqueo antes de fallar con "database is locked"
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000,
+                # BEGIN IMMEDIATE: las transacciones toman el bloqueo de escritura al empezar y
+                # esperan el timeout, en lugar de fallar al pasar de lectura a escritura
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"DB_PERFIL no válido: {DB_PERFIL!r}")
+
+# PRAGMA de cada conexión SQLite. WAL deja leer mientras otro proceso escribe y, con
+# synchronous=NORMAL, solo sincroniza el disco en los checkpoints; se pierde como mucho
+# la última transacción ante un corte de luz, nunca la integridad del archivo.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024))),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', str(64 * 1024))),  # negativo: KiB, no páginas
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -18,32 +18,18 @@ from django.urls import path, include
 from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from . import metrics, schema
 
 
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Documentación API Inventario",
-        default_version='v1',
-        description="Documentación para la API de gestión de inventarios",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@management.local"),
-        license=openapi.License(name="BSD license"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
-
-
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api-docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('api-docs/', schema.swagger_ui, name='schema-swagger-ui'),
+    path('redoc/', schema.redoc_ui, name='schema-redoc'),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    # Las métricas no son públicas: ver Management.metrics.vista_metricas
+    path('metrics', metrics.vista_metricas, name='prometheus-django-metrics'),
     path('', include('productos.urls')),
 ]
@@ -0,0 +1,53 @@
+"""
+Calentamiento del proceso para reducir la latencia de la primera petición.
+
+Con GUNICORN_PRELOAD=1 el master carga la aplicación y ejecuta calentar() antes de
+crear los workers, que heredan por fork las URLs resueltas, las plantillas compiladas
+y los módulos pesados. La conexión a la base de datos se abre después, en cada worker.
+"""
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def calentar(modulos_pesados=False, base_datos=False):
+    inicio = time.perf_counter()
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # fuerza la carga de todos los urlpatterns
+
+    for directorio in settings.TEMPLATES[0]['DIRS']:
+        for nombre in os.listdir(directorio):
+            if nombre.endswith('.html'):
+                try:
+                    get_template(nombre)
+                except TemplateDoesNotExist:
+                    pass
+
+    if modulos_pesados:
+        # Se cargan de forma perezosa en las vistas; precargados se comparten entre workers
+        import reportlab.pdfgen.canvas  # noqa: F401
+        from Management.schema import esquema, get_schema_view
+        get_schema_view()
+        esquema('json')
+
+    if base_datos:
+        calentar_conexion()
+
+    logger.info(f"Calentamiento completado en {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+
+def calentar_conexion():
+    conexion = connections['default']
+    conexion.ensure_connection()
+    # Sin conexiones persistentes se cerraría al terminar la primera petición
+    if not conexion.settings_dict.get('CONN_MAX_AGE'):
+        conexion.close()
@@ -0,0 +1,41 @@
+# Configuración de gunicorn (Dockerfile: gunicorn -c gunicorn.conf.py)
+import os
+
+# SERVIDOR_MODO=wsgi -> workers síncronos (por defecto)
+# SERVIDOR_MODO=asgi -> workers uvicorn: vistas async y eventos en tiempo real
+SERVIDOR_MODO = os.environ.get('SERVIDOR_MODO', 'wsgi')
+
+bind = f":{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+
+if SERVIDOR_MODO == 'asgi':
+    wsgi_app = 'Management.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'Management.wsgi:application'
+
+# GUNICORN_PRELOAD=1 carga y calienta la aplicación en el master antes del fork
+PRECARGA = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+preload_app = PRECARGA
+
+
+def when_ready(server):
+    if PRECARGA:
+        from Management.warmup import calentar
+        calentar(modulos_pesados=True)
+
+
+def post_worker_init(worker):
+    from Management.warmup import calentar, calentar_conexion
+    if PRECARGA:
+        calentar_conexion()
+    else:
+        calentar(base_datos=True)
+
+
+def worker_exit(server, worker):
+    # Los procesos que renderizan los PDF (productos.reportes) no deben sobrevivir al worker
+    import sys
+    reportes = sys.modules.get('productos.reportes')
+    if reportes is not None:
+        reportes.cerrar_pool()
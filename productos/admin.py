@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Categoria, Producto, Inventario
+from .models import (
+    Categoria, Producto, Inventario, StockDiario, MovimientoDiario, PronosticoStock, MovimientoPendiente, RegistroAuditoria,
+    InventarioArchivado, MesArchivado, ValoracionCategoria,
+)
 
 
 # Register your models here.
@@ -7,3 +10,11 @@ from .models import Categoria, Producto, Inventario
 admin.site.register(Categoria)
 admin.site.register(Producto)
 admin.site.register(Inventario)
+admin.site.register(StockDiario)
+admin.site.register(MovimientoDiario)
+admin.site.register(PronosticoStock)
+admin.site.register(MovimientoPendiente)
+admin.site.register(RegistroAuditoria)
+admin.site.register(InventarioArchivado)
+admin.site.register(MesArchivado)
+admin.site.register(ValoracionCategoria)
@@ -0,0 +1,213 @@
+"""
+Archivo de movimientos antiguos. Inventario conserva solo los meses dentro de la
+retención, así que las consultas diarias, exportaciones y listados recorren una tabla
+acotada; los meses anteriores se mueven a InventarioArchivado (una partición por mes en
+PostgreSQL) o a archivos NDJSON comprimidos. Los acumulados diarios y los snapshots ya
+reflejan esos movimientos, por lo que el stock y las analíticas no cambian.
+"""
+import datetime
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import operator
+import os
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import BooleanField, Max, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Inventario, InventarioArchivado, MesArchivado, MovimientoPendiente
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 5000
+CAMPOS = ['id', 'tipo', 'producto_id', 'cantidad', 'fecha_actualizacion', 'fecha_creacion']
+
+
+def inicio_mes(fecha):
+    return timezone.make_aware(datetime.datetime(fecha.year, fecha.month, 1))
+
+
+def mes_siguiente(momento):
+    local = timezone.localtime(momento)
+    return inicio_mes(datetime.date(local.year + local.month // 12, local.month % 12 + 1, 1))
+
+
+def limite_retencion(meses, hoy=None):
+    """Primer instante que se conserva en Inventario: el inicio del mes de hace `meses` meses."""
+    hoy = hoy or timezone.localdate()
+    indice = hoy.year * 12 + hoy.month - 1 - meses
+    return inicio_mes(datetime.date(indice // 12, indice % 12 + 1, 1))
+
+
+def horizonte_archivo():
+    """
+    Primer día cuyos movimientos siguen completos en Inventario, o None si no se ha
+    archivado nada. Las reconstrucciones de acumulados y snapshots no deben recalcular
+    días anteriores a él.
+    """
+    hasta = MesArchivado.objects.aggregate(hasta=Max('hasta'))['hasta']
+    return timezone.localtime(hasta).date() if hasta else None
+
+
+def asegurar_particion(mes):
+    """Crea, si no existe, la partición mensual de PostgreSQL que empieza en `mes`."""
+    if connection.vendor != 'postgresql':
+        return
+    qn = connection.ops.quote_name
+    padre = InventarioArchivado._meta.db_table
+    local = timezone.localtime(mes)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {qn(f'{padre}_p{local:%Y%m}')} PARTITION OF {qn(padre)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [mes, mes_siguiente(mes)],
+        )
+
+
+def _desvincular(ids):
+    # Los tickets de la cola de escritura apuntan al movimiento creado; se conservan sin él
+    MovimientoPendiente.objects.filter(inventario_id__in=ids).update(inventario=None)
+
+
+def _mover_a_tabla(filas, ahora):
+    InventarioArchivado.objects.bulk_create(
+        [InventarioArchivado(archivado_en=ahora, **dict(zip(CAMPOS, fila))) for fila in filas],
+        ignore_conflicts=True,
+    )
+
+
+def _ruta_archivo(directorio, mes):
+    # Ruta absoluta: MesArchivado.destino se vuelve a leer desde historial() en otro proceso
+    return os.path.join(os.path.abspath(directorio), f"inventario-{timezone.localtime(mes):%Y-%m}.ndjson.gz")
+
+
+def _mover_a_archivo(filas, ruta):
+    # Modo 'a': cada lote es un miembro gzip más del mismo archivo, que gzip lee como uno solo
+    with gzip.open(ruta, 'at', encoding='utf-8') as archivo:
+        for fila in filas:
+            archivo.write(json.dumps(dict(zip(CAMPOS, fila)), cls=DjangoJSONEncoder) + '\n')
+
+
+def archivar_movimientos(antes_de, lote=TAMANO_LOTE, directorio=None):
+    """
+    Mueve los movimientos con fecha_creacion anterior a `antes_de`, mes a mes y en lotes
+    de `lote` filas, a InventarioArchivado o, con `directorio`, a un NDJSON comprimido
+    por mes. Cada lote copia y borra en la misma transacción con DELETE directos, sin
+    señales, para no descontar los acumulados diarios. Cada mes queda anotado en
+    MesArchivado. Devuelve {mes: filas}.
+    """
+    base = Inventario._base_manager
+    movidos = {}
+    while True:
+        primero = base.filter(fecha_creacion__lt=antes_de).order_by('fecha_creacion') \
+            .values_list('fecha_creacion', flat=True).first()
+        if primero is None:
+            break
+        local = timezone.localtime(primero)
+        desde = inicio_mes(datetime.date(local.year, local.month, 1))
+        hasta = min(mes_siguiente(desde), antes_de)
+        if directorio is None:
+            asegurar_particion(desde)
+        del_mes = base.filter(fecha_creacion__gte=desde, fecha_creacion__lt=hasta)
+        clave = f"{timezone.localtime(desde):%Y-%m}"
+        destino = 'tabla' if directorio is None else _ruta_archivo(directorio, desde)
+
+        while True:
+            with transaction.atomic():
+                filas = list(del_mes.order_by('id').values_list(*CAMPOS)[:lote])
+                if not filas:
+                    break
+                ids = [fila[0] for fila in filas]
+                if directorio is None:
+                    _mover_a_tabla(filas, timezone.now())
+                else:
+                    _mover_a_archivo(filas, destino)
+                _desvincular(ids)
+                base.filter(pk__in=ids)._raw_delete(base.db)
+            movidos[clave] = movidos.get(clave, 0) + len(filas)
+        registro, _ = MesArchivado.objects.get_or_create(
+            mes=timezone.localtime(desde).date(), destino=destino,
+            defaults={'hasta': hasta},
+        )
+        registro.filas += movidos.get(clave, 0)
+        registro.hasta = max(registro.hasta, hasta)
+        registro.save()
+        logger.info(f"Mes de movimientos archivado - Mes: {clave}, Filas: {movidos.get(clave, 0)}, "
+                    f"Destino: {directorio or 'tabla de archivo'}")
+    return movidos
+
+
+def _leer_archivos(desde, hasta, producto_id, tipo):
+    """
+    Movimientos de los meses archivados en NDJSON que caen en [desde, hasta], con los
+    mismos filtros que historial(). Un archivo que ya no está se registra y se omite.
+    """
+    meses = MesArchivado.objects.exclude(destino='tabla').order_by('mes')
+    if desde is not None:
+        meses = meses.filter(hasta__gt=desde)
+    if hasta is not None:
+        meses = meses.filter(mes__lte=timezone.localtime(hasta).date())
+    for ruta in meses.values_list('destino', flat=True):
+        try:
+            archivo = gzip.open(ruta, 'rt', encoding='utf-8')
+        except FileNotFoundError:
+            logger.error(f"Archivo de movimientos no encontrado - Ruta: {ruta}")
+            continue
+        with archivo:
+            for linea in archivo:
+                movimiento = json.loads(linea)
+                for campo in ('fecha_creacion', 'fecha_actualizacion'):
+                    movimiento[campo] = parse_datetime(movimiento[campo])
+                if (desde is not None and movimiento['fecha_creacion'] < desde) \
+                        or (hasta is not None and movimiento['fecha_creacion'] > hasta) \
+                        or (producto_id is not None and movimiento['producto_id'] != producto_id) \
+                        or (tipo and movimiento['tipo'] != tipo):
+                    continue
+                movimiento['archivado'] = True
+                yield movimiento
+
+
+def historial(desde=None, hasta=None, producto_id=None, tipo=None, incluir_archivo=False, limite=None):
+    """
+    Hasta `limite` movimientos, más recientes primero, como diccionarios con
+    'archivado'. Sin `incluir_archivo` (o si `desde` es posterior al horizonte del
+    archivo) solo se consulta Inventario; si no, se une con InventarioArchivado en una
+    sola consulta y, si hay meses archivados en NDJSON, con los movimientos de esos
+    archivos, que ya no están en la base de datos.
+    """
+    def filtrar(queryset):
+        if desde is not None:
+            queryset = queryset.filter(fecha_creacion__gte=desde)
+        if hasta is not None:
+            queryset = queryset.filter(fecha_creacion__lte=hasta)
+        if producto_id is not None:
+            queryset = queryset.filter(producto_id=producto_id)
+        if tipo:
+            queryset = queryset.filter(tipo=tipo)
+        return queryset.annotate(
+            archivado=Value(queryset.model is InventarioArchivado, output_field=BooleanField())
+        ).values(*CAMPOS, 'archivado')
+
+    def recortar(movimientos):
+        return movimientos if limite is None else movimientos[:limite]
+
+    movimientos = filtrar(Inventario.objects.all())
+    if incluir_archivo:
+        horizonte = horizonte_archivo()
+        if horizonte is not None and (desde is None or timezone.localtime(desde).date() < horizonte):
+            movimientos = movimientos.union(filtrar(InventarioArchivado.objects.all()), all=True)
+            if MesArchivado.objects.exclude(destino='tabla').exists():
+                todos = itertools.chain(
+                    recortar(movimientos.order_by('-fecha_creacion', '-id')),
+                    _leer_archivos(desde, hasta, producto_id, tipo),
+                )
+                orden = operator.itemgetter('fecha_creacion', 'id')
+                if limite is None:
+                    return sorted(todos, key=orden, reverse=True)
+                return heapq.nlargest(limite, todos, key=orden)
+    return recortar(movimientos.order_by('-fecha_creacion', '-id'))
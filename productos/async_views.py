@@ -0,0 +1,132 @@
+import functools
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, JsonResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from Management import renderers
+
+from .models import Categoria, Inventario, Producto
+from .pronosticos import filtro_bajo_stock
+from .serializers import CategoriaSerializer, ProductoSerializer
+
+logger = logging.getLogger(__name__)
+
+# Vistas de solo lectura con el ORM asíncrono. Bajo ASGI cada worker atiende muchas
+# peticiones a la vez mientras esperan a la base de datos remota; bajo WSGI funcionan
+# igual, aunque sin ese beneficio. Para eso ningún middleware de MIDDLEWARE puede ser
+# solo síncrono: uno así haría que Django ejecutara la petición entera en un hilo. Los
+# que heredan de MiddlewareMixin ejecutan sus process_* en el hilo de la petición, un
+# salto corto que no retiene el event loop mientras la vista espera.
+
+
+def jwt_requerido(vista):
+    """Equivalente asíncrono de IsAuthenticated + JWTAuthentication para vistas Django."""
+
+    @functools.wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        if getattr(settings, 'TESTING', False):
+            return await vista(request, *args, **kwargs)
+
+        autenticacion = JWTAuthentication()
+        header = autenticacion.get_header(request)
+        raw = autenticacion.get_raw_token(header) if header else None
+        if raw is None:
+            return JsonResponse({'detail': 'Las credenciales de autenticación no se proveyeron.'}, status=401)
+        try:
+            token = autenticacion.get_validated_token(raw)
+            request.user = await get_user_model().objects.aget(
+                **{settings.SIMPLE_JWT['USER_ID_FIELD']: token[settings.SIMPLE_JWT['USER_ID_CLAIM']]},
+                is_active=True,
+            )
+        except (InvalidToken, TokenError, KeyError, get_user_model().DoesNotExist):
+            return JsonResponse({'detail': 'Token inválido o expirado.'}, status=401)
+        return await vista(request, *args, **kwargs)
+
+    return envoltura
+
+
+@jwt_requerido
+async def productos_list(request):
+    productos = [p async for p in Producto.objects.order_by('id').aiterator()]
+    logger.debug(f"Productos listados (async) - Total: {len(productos)}")
+    return JsonResponse(ProductoSerializer(productos, many=True).data, safe=False)
+
+
+@jwt_requerido
+async def productos_detail(request, pk):
+    try:
+        producto = await Producto.objects.aget(pk=pk)
+    except Producto.DoesNotExist:
+        return JsonResponse({'detail': 'No encontrado.'}, status=404)
+    return JsonResponse(ProductoSerializer(producto).data)
+
+
+@jwt_requerido
+async def categorias_list(request):
+    categorias = [c async for c in Categoria.objects.order_by('id').aiterator()]
+    logger.debug(f"Categorías listadas (async) - Total: {len(categorias)}")
+    return JsonResponse(CategoriaSerializer(categorias, many=True).data, safe=False)
+
+
+@jwt_requerido
+async def categorias_detail(request, pk):
+    try:
+        categoria = await Categoria.objects.aget(pk=pk)
+    except Categoria.DoesNotExist:
+        return JsonResponse({'detail': 'No encontrado.'}, status=404)
+    return JsonResponse(CategoriaSerializer(categoria).data)
+
+
+@jwt_requerido
+async def dashboard_data(request):
+    bajo_stock = Producto.objects.filter(filtro_bajo_stock()).order_by('stock')
+    data = {
+        'productos': await Producto.objects.acount(),
+        'categorias': await Categoria.objects.acount(),
+        'inventarios': await Inventario.objects.acount(),
+        'productos_bajo_stock': [
+            p async for p in bajo_stock.values('id', 'nombre', 'stock').aiterator()
+        ],
+    }
+    return JsonResponse(data)
+
+
+async def exportar_productos_json(request):
+    productos = Producto.objects.values('id', 'nombre', 'descripcion', 'precio', 'stock', 'categoria__nombre')
+    data = [
+        {
+            'id': p['id'],
+            'nombre': p['nombre'],
+            'descripcion': p['descripcion'],
+            'precio': float(p['precio']),
+            'stock': p['stock'],
+            'categoria': p['categoria__nombre'],
+        }
+        async for p in productos.aiterator()
+    ]
+    response = HttpResponse(renderers.dumps(data, request), content_type='application/json')
+    response['Content-Disposition'] = 'attachment; filename="productos.json"'
+    logger.info(f"JSON de productos generado (async) - Productos: {len(data)}")
+    return response
+
+
+async def exportar_inventarios_json(request):
+    inventarios = Inventario.objects.values('id', 'tipo', 'producto__nombre', 'cantidad', 'fecha_actualizacion')
+    data = [
+        {
+            'id': i['id'],
+            'tipo': i['tipo'],
+            'producto': i['producto__nombre'],
+            'cantidad': i['cantidad'],
+            'fecha_actualizacion': i['fecha_actualizacion'].isoformat(),
+        }
+        async for i in inventarios.aiterator()
+    ]
+    response = HttpResponse(renderers.dumps(data, request), content_type='application/json')
+    response['Content-Disposition'] = 'attachment; filename="inventarios.json"'
+    logger.info(f"JSON de inventarios generado (async) - Registros: {len(data)}")
+    return response
@@ -0,0 +1,173 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import RegistroAuditoria
+
+logger = logging.getLogger(__name__)
+
+
+def instantanea(instancia):
+    """Valores de las columnas de `instancia` (las FK como id), sin los campos auto_now ni la versión."""
+    return {
+        campo.attname: campo.value_from_object(instancia)
+        for campo in instancia._meta.concrete_fields
+        if not getattr(campo, 'auto_now', False) and campo.name != 'version'
+    }
+
+
+def diferencias(antes, despues):
+    """{campo: [valor anterior, valor nuevo]} con los campos que cambiaron."""
+    return {
+        campo: [antes.get(campo), valor]
+        for campo, valor in despues.items()
+        if antes.get(campo) != valor
+    }
+
+
+class BufferAuditoria:
+    """
+    Acumula los registros en memoria y los inserta con un solo bulk_create cada
+    AUDITORIA_LOTE registros o, si no se llega al lote, AUDITORIA_INTERVALO_MS después
+    del primero. Un proceso que termina vacía lo pendiente con atexit.
+    """
+
+    def __init__(self):
+        self._registros = []
+        self._lock = threading.Lock()
+        self._temporizador = None
+
+    def agregar(self, registro):
+        with self._lock:
+            self._registros.append(registro)
+            lleno = len(self._registros) >= settings.AUDITORIA_LOTE
+            if not lleno and self._temporizador is None:
+                self._temporizador = threading.Timer(settings.AUDITORIA_INTERVALO_MS / 1000, self._vaciar_en_hilo)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+        if lleno:
+            self.vaciar()
+
+    def vaciar(self):
+        with self._lock:
+            registros, self._registros = self._registros, []
+            if self._temporizador is not None:
+                self._temporizador.cancel()
+                self._temporizador = None
+        if not registros:
+            return 0
+        try:
+            RegistroAuditoria.objects.bulk_create(registros)
+        except Exception as e:
+            logger.error(f"Error al guardar registros de auditoría - Registros: {len(registros)}, Error: {str(e)}")
+            return 0
+        logger.debug(f"Registros de auditoría guardados - Total: {len(registros)}")
+        return len(registros)
+
+    def _vaciar_en_hilo(self):
+        try:
+            self.vaciar()
+        finally:
+            # El hilo del temporizador no pasa por el ciclo de peticiones que cierra conexiones
+            connection.close()
+
+
+buffer = BufferAuditoria()
+atexit.register(buffer.vaciar)
+
+
+def vaciar():
+    return buffer.vaciar()
+
+
+def auditar(usuario, accion, modelo, objeto_id, cambios=None):
+    """
+    Registra la acción de `usuario` sobre el objeto `objeto_id` de `modelo` cuando la
+    transacción en curso confirma; si se revierte no queda rastro.
+    """
+    autenticado = usuario is not None and usuario.is_authenticated
+    registro = RegistroAuditoria(
+        fecha=timezone.now(),
+        usuario_id=usuario.pk if autenticado else None,
+        usuario_nombre=usuario.get_username() if autenticado else '',
+        accion=accion,
+        modelo=modelo._meta.label,
+        objeto_id=str(objeto_id),
+        cambios=cambios or {},
+    )
+    transaction.on_commit(lambda: buffer.agregar(registro))
+
+
+class AuditoriaMixin:
+    """Registra en la auditoría las altas y modificaciones de un ModelViewSet con el diff de campos."""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        instancia = serializer.instance
+        auditar(self.request.user, 'crear', type(instancia), instancia.pk, diferencias({}, instantanea(instancia)))
+
+    def perform_update(self, serializer):
+        antes = instantanea(serializer.instance)
+        super().perform_update(serializer)
+        instancia = serializer.instance
+        cambios = diferencias(antes, instantanea(instancia))
+        if cambios:
+            auditar(self.request.user, 'actualizar', type(instancia), instancia.pk, cambios)
+
+
+def purgar_antiguos(antiguedad):
+    """Borra los registros con más de `antiguedad` (timedelta)."""
+    borrados, _ = RegistroAuditoria.objects.filter(fecha__lt=timezone.now() - antiguedad).delete()
+    return borrados
+
+
+def _fusionar(registros):
+    """
+    Deja en el último registro el diff acumulado (primer valor anterior, último valor
+    nuevo) y borra el resto; los campos que volvieron a su valor original desaparecen.
+    """
+    cambios = {}
+    for registro in registros:
+        for campo, (antes, despues) in registro.cambios.items():
+            cambios.setdefault(campo, [antes, despues])[1] = despues
+    ultimo = registros[-1]
+    ultimo.cambios = {campo: valores for campo, valores in cambios.items() if valores[0] != valores[1]}
+    with transaction.atomic():
+        RegistroAuditoria.objects.filter(pk__in=[registro.pk for registro in registros[:-1]]).delete()
+        if ultimo.cambios:
+            ultimo.save(update_fields=['cambios'])
+        else:
+            ultimo.delete()
+    return len(registros) - 1 if ultimo.cambios else len(registros)
+
+
+def compactar(antiguedad):
+    """
+    Fusiona las actualizaciones de un mismo objeto hechas por el mismo usuario el mismo
+    día, para las de hace más de `antiguedad`. Devuelve cuántos registros se eliminaron.
+    """
+    anteriores = RegistroAuditoria.objects.filter(accion='actualizar', fecha__lt=timezone.now() - antiguedad)
+    grupos = (
+        anteriores.annotate(dia=TruncDate('fecha'))
+        .values('modelo', 'objeto_id', 'usuario_id', 'dia')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    eliminados = 0
+    for grupo in grupos.iterator():
+        registros = list(
+            anteriores.annotate(dia=TruncDate('fecha'))
+            .filter(modelo=grupo['modelo'], objeto_id=grupo['objeto_id'], usuario_id=grupo['usuario_id'],
+                    dia=grupo['dia'])
+            .order_by('fecha', 'id')
+        )
+        if len(registros) > 1:
+            eliminados += _fusionar(registros)
+    return eliminados
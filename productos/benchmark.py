@@ -0,0 +1,304 @@
+import contextlib
+import datetime
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) por el método del rango más cercano; `valores` debe estar ordenado."""
+    if not valores:
+        return None
+    indice = max(0, math.ceil(p / 100 * len(valores)) - 1)
+    return valores[indice]
+
+
+def resumen(latencias, errores=0, duracion=None):
+    """Estadísticas de una serie de latencias en segundos, expresadas en milisegundos."""
+    latencias = sorted(latencias)
+    total = len(latencias)
+    datos = {
+        'peticiones': total,
+        'errores': errores,
+        'tasa_error': round(errores / total, 4) if total else 0,
+        'p50_ms': None,
+        'p90_ms': None,
+        'p99_ms': None,
+        'max_ms': None,
+    }
+    if total:
+        datos.update({
+            'p50_ms': round(percentil(latencias, 50) * 1000, 2),
+            'p90_ms': round(percentil(latencias, 90) * 1000, 2),
+            'p99_ms': round(percentil(latencias, 99) * 1000, 2),
+            'max_ms': round(latencias[-1] * 1000, 2),
+        })
+    if duracion:
+        datos['duracion_s'] = round(duracion, 3)
+        datos['rps'] = round(total / duracion, 2)
+    return datos
+
+
+def peticion_http(metodo, url, headers=None, cuerpo=None, timeout=30):
+    """
+    Ejecuta una petición y devuelve (status, segundos). Los fallos de red cuentan como
+    status 0. `cuerpo` se envía como JSON salvo que ya venga codificado en bytes.
+    """
+    if cuerpo is None or isinstance(cuerpo, bytes):
+        datos = cuerpo
+    else:
+        datos = json.dumps(cuerpo).encode()
+    cabeceras = dict(headers or {})
+    if datos is not None:
+        cabeceras.setdefault('Content-Type', 'application/json')
+    req = urllib.request.Request(url, data=datos, method=metodo, headers=cabeceras)
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as respuesta:
+            respuesta.read()
+            status = respuesta.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return status, time.perf_counter() - inicio
+
+
+def carga_concurrente(url, total, concurrencia, headers=None):
+    """Lanza `total` GET contra `url` con `concurrencia` clientes simultáneos."""
+    latencias = []
+    errores = 0
+    lock = threading.Lock()
+
+    def una():
+        nonlocal errores
+        status, segundos = peticion_http('GET', url, headers=headers)
+        with lock:
+            latencias.append(segundos)
+            if status == 0 or status >= 400:
+                errores += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        for _ in range(total):
+            pool.submit(una)
+    return resumen(latencias, errores, time.perf_counter() - inicio)
+
+
+@contextlib.contextmanager
+def fechas_manuales(modelo):
+    """Desactiva auto_now/auto_now_add del modelo para poder sembrar fechas históricas."""
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def sembrar_datos(productos, movimientos, semilla=42, categorias=None, dias=730, lote=5000, salida=None):
+    """
+    Crea un catálogo y un historial de movimientos sintéticos y deterministas.
+    El stock final de cada producto coincide con la suma de sus movimientos.
+    """
+    from django.utils import timezone
+
+    from .models import Categoria, Inventario, Producto
+    from .rollups import reconstruir_rollups
+    from .snapshots import construir_snapshots
+    from .valoracion import reconstruir as reconstruir_valoracion
+
+    aleatorio = random.Random(semilla)
+    categorias = categorias or max(5, productos // 500)
+    log = salida or (lambda mensaje: None)
+
+    nuevas = Categoria.objects.bulk_create(
+        [Categoria(nombre=f"Categoría {i:04d}") for i in range(categorias)], batch_size=lote
+    )
+    categoria_ids = [c.pk for c in nuevas]
+    log(f"Categorías creadas: {categorias}")
+
+    producto_ids = []
+    categoria_de = {}
+    for inicio in range(0, productos, lote):
+        creados = Producto.objects.bulk_create([
+            Producto(
+                nombre=f"Producto {i:07d}",
+                descripcion=f"Descripción del producto sintético {i}",
+                precio=f"{aleatorio.uniform(1, 5000):.2f}",
+                categoria_id=aleatorio.choice(categoria_ids),
+                stock=0,
+            )
+            for i in range(inicio, min(inicio + lote, productos))
+        ])
+        producto_ids.extend(p.pk for p in creados)
+        categoria_de.update((p.pk, p.categoria_id) for p in creados)
+    log(f"Productos creados: {productos}")
+
+    stock = dict.fromkeys(producto_ids, 0)
+    ahora = timezone.now()
+    # Instantes ordenados para que el historial de cada producto sea cronológico
+    instantes = sorted(aleatorio.uniform(0, dias * 86400) for _ in range(movimientos))
+    with fechas_manuales(Inventario):
+        for inicio in range(0, movimientos, lote):
+            nuevos = []
+            for segundos in instantes[inicio:inicio + lote]:
+                producto_id = aleatorio.choice(producto_ids)
+                cantidad = aleatorio.randint(1, 50)
+                if stock[producto_id] < cantidad or aleatorio.random() < 0.45:
+                    tipo = 'entrada'
+                    stock[producto_id] += cantidad
+                else:
+                    tipo = 'salida'
+                    stock[producto_id] -= cantidad
+                fecha = ahora - datetime.timedelta(seconds=dias * 86400 - segundos)
+                nuevos.append(Inventario(
+                    producto_id=producto_id, categoria_id=categoria_de[producto_id], tipo=tipo, cantidad=cantidad,
+                    fecha_creacion=fecha, fecha_actualizacion=fecha,
+                ))
+            Inventario.objects.bulk_create(nuevos)
+    log(f"Movimientos creados: {movimientos}")
+
+    cambios = [Producto(pk=pk, stock=valor) for pk, valor in stock.items() if valor]
+    Producto.objects.bulk_update(cambios, ['stock'], batch_size=lote)
+    reconstruir_rollups()
+    construir_snapshots()
+    # bulk_create y bulk_update no aplican los deltas de la valoración incremental
+    reconstruir_valoracion()
+    log("Stock, acumulados diarios, snapshots y valoración actualizados")
+    return producto_ids
+
+
+class MedicionFallida(Exception):
+    """Una ejecución medida respondió con un status inesperado: su latencia no es la de la ruta."""
+
+
+def medir(funcion, repeticiones=5, calentamiento=1, esperados=range(200, 300)):
+    """
+    Ejecuta `funcion` varias veces y devuelve el resumen de latencias junto con el
+    número de consultas SQL de la última ejecución. `funcion` devuelve el status HTTP
+    (o None si no es una petición); cualquier status fuera de `esperados`, también en el
+    calentamiento, lanza MedicionFallida en lugar de medir una respuesta de error (un
+    429 del control de admisión tarda un milisegundo).
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    def ejecutar():
+        status = funcion()
+        if status is not None and status not in esperados:
+            raise MedicionFallida(f"Status inesperado: {status}")
+
+    for _ in range(calentamiento):
+        ejecutar()
+
+    latencias = []
+    for _ in range(repeticiones):
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            ejecutar()
+            latencias.append(time.perf_counter() - inicio)
+    datos = resumen(latencias)
+    datos['consultas'] = len(consultas.captured_queries)
+    return datos
+
+
+def exponente_escalado(puntos):
+    """
+    Pendiente log-log de la latencia frente al tamaño del dataset entre el primer y el
+    último punto: ~0 constante, ~1 lineal, >1 superlineal.
+    """
+    puntos = [(filas, ms) for filas, ms in puntos if filas and ms]
+    if len(puntos) < 2 or puntos[0][0] == puntos[-1][0]:
+        return None
+    (filas_a, ms_a), (filas_b, ms_b) = puntos[0], puntos[-1]
+    return round(math.log(ms_b / ms_a) / math.log(filas_b / filas_a), 3)
+
+
+def ruta_normalizada(path):
+    """Agrupa las rutas con identificadores: /api/productos/12/ -> /api/productos/{id}/."""
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path)
+
+
+def leer_diario(ruta, solo_lectura=False, limite=None):
+    """Entradas del diario de peticiones ordenadas por instante de llegada."""
+    entradas = []
+    with open(ruta, encoding='utf-8') as f:
+        for numero, linea in enumerate(f, 1):
+            if not linea.strip():
+                continue
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                raise ValueError(f"Línea {numero} del diario no es JSON válido")
+            if solo_lectura and entrada['m'] not in ('GET', 'HEAD', 'OPTIONS'):
+                continue
+            entradas.append(entrada)
+    # Varios workers escriben en el mismo archivo, así que el orden no está garantizado
+    entradas.sort(key=lambda entrada: entrada['t'])
+    return entradas[:limite] if limite else entradas
+
+
+def reproducir(entradas, enviar, velocidad=1.0, concurrencia=16):
+    """
+    Reproduce las entradas respetando sus intervalos originales divididos por
+    `velocidad` (0 = sin esperas) con hasta `concurrencia` peticiones en vuelo.
+    `enviar(entrada)` devuelve (status, segundos). El retraso mide cuánto esperó cada
+    petición tras su instante programado por falta de clientes libres.
+    """
+    por_ruta = {}
+    latencias = []
+    retrasos = []
+    errores = 0
+    lock = threading.Lock()
+
+    def una(entrada, programada):
+        nonlocal errores
+        retraso = time.perf_counter() - programada
+        status, segundos = enviar(entrada)
+        # Un 4xx que ya ocurrió en el tráfico original no es un fallo de la reproducción
+        fallo = status == 0 or status >= 500 or (status >= 400 and entrada.get('s', 0) < 400)
+        with lock:
+            latencias.append(segundos)
+            retrasos.append(max(retraso, 0))
+            datos = por_ruta.setdefault(f"{entrada['m']} {ruta_normalizada(entrada['p'])}", [[], 0])
+            datos[0].append(segundos)
+            if fallo:
+                errores += 1
+                datos[1] += 1
+
+    inicio = time.perf_counter()
+    origen = entradas[0]['t'] if entradas else 0
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        for entrada in entradas:
+            programada = time.perf_counter()
+            if velocidad:
+                programada = inicio + (entrada['t'] - origen) / velocidad
+                espera = programada - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+            pool.submit(una, entrada, programada)
+    duracion = time.perf_counter() - inicio
+
+    retrasos.sort()
+    return {
+        'total': resumen(latencias, errores, duracion),
+        'retraso_p99_ms': round(percentil(retrasos, 99) * 1000, 2) if retrasos else None,
+        'rutas': {
+            ruta: resumen(valores, errores_ruta, duracion)
+            for ruta, (valores, errores_ruta) in sorted(por_ruta.items())
+        },
+    }
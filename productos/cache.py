@@ -0,0 +1,117 @@
+"""
+Caché por objeto de la representación serializada de los productos, usada por la
+consulta múltiple (?ids= y multi-get). Cada producto se guarda en su propia clave;
+las modificaciones individuales borran solo esa clave y las masivas (borrados lógicos,
+importaciones) cambian la generación, lo que deja obsoletas todas las claves a la vez.
+
+La caché solo se usa si es compartida por todos los workers (CACHE_COMPARTIDA): con una
+caché en memoria por proceso, una escritura en un worker no invalidaría las copias de
+los demás, así que se lee siempre de la base de datos.
+
+Cualquier invalidación también avanza la versión del catálogo, con la que la
+instantánea compartida de catalogo.py sabe si sigue al día.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+CLAVE_GENERACION = 'productos:generacion'
+CLAVE_VERSION_CATALOGO = 'catalogo:version'
+# Parámetros por consulta id__in; SQLite antiguo admite 999
+TAMANO_TROZO = 500
+
+
+def _cache():
+    return caches[settings.MULTIGET_CACHE]
+
+
+def _generacion():
+    return _cache().get_or_set(CLAVE_GENERACION, 1, timeout=None)
+
+
+def _clave(generacion, pk):
+    return f"producto:{generacion}:{pk}"
+
+
+def version_catalogo():
+    # Empieza en milisegundos desde epoch: si la caché se vacía, la nueva serie no repite versiones ya usadas
+    return _cache().get_or_set(CLAVE_VERSION_CATALOGO, lambda: int(time.time() * 1000), timeout=None)
+
+
+def _avanzar_version_catalogo():
+    try:
+        _cache().incr(CLAVE_VERSION_CATALOGO)
+    except ValueError:
+        version_catalogo()
+
+
+def _borrar(ids):
+    if ids is None:
+        try:
+            _cache().incr(CLAVE_GENERACION)
+        except ValueError:
+            _cache().set(CLAVE_GENERACION, 2, timeout=None)
+    else:
+        generacion = _generacion()
+        _cache().delete_many([_clave(generacion, pk) for pk in ids])
+    _avanzar_version_catalogo()
+
+
+def invalidar_productos(ids=None):
+    """
+    Invalida los productos `ids` o, sin ids, todos. Se borra al momento y otra vez al
+    confirmar la transacción, para que una lectura concurrente no vuelva a guardar la
+    versión anterior.
+    """
+    ids = None if ids is None else list(ids)
+    _borrar(ids)
+    transaction.on_commit(lambda: _borrar(ids))
+
+
+def invalidar_catalogo():
+    """Deja obsoleta la instantánea del catálogo sin tocar la caché por objeto (p. ej., al renombrar una categoría)."""
+    _avanzar_version_catalogo()
+    transaction.on_commit(_avanzar_version_catalogo)
+
+
+def _leer(ids):
+    """{id: datos serializados} leídos de la base de datos con consultas id__in de TAMANO_TROZO ids."""
+    from .models import Producto
+    from .serializers import ProductoSerializer
+
+    leidos = {}
+    for inicio in range(0, len(ids), TAMANO_TROZO):
+        productos = Producto.objects.filter(id__in=ids[inicio:inicio + TAMANO_TROZO])
+        for datos in ProductoSerializer(productos, many=True).data:
+            leidos[datos['id']] = dict(datos)
+    return leidos
+
+
+def obtener_productos(ids):
+    """
+    {id: datos serializados} de los productos visibles entre `ids`. Si la instantánea del
+    catálogo está al día se leen de ella; si no, los que no están en la caché compartida se leen con
+    consultas id__in de TAMANO_TROZO ids y se guardan. Los que no existen simplemente no
+    aparecen en el resultado.
+    """
+    from .catalogo import instantanea
+
+    unicos = list(dict.fromkeys(ids))
+    catalogo = instantanea()
+    if catalogo is not None:
+        return catalogo.productos(unicos)
+    if not settings.CACHE_COMPARTIDA:
+        return _leer(unicos)
+    generacion = _generacion()
+    claves = {_clave(generacion, pk): pk for pk in unicos}
+    encontrados = {claves[clave]: datos for clave, datos in _cache().get_many(claves).items()}
+
+    nuevos = _leer([pk for pk in unicos if pk not in encontrados])
+    if nuevos:
+        _cache().set_many(
+            {_clave(generacion, pk): datos for pk, datos in nuevos.items()}, timeout=settings.MULTIGET_CACHE_SEGUNDOS
+        )
+    encontrados.update(nuevos)
+    return encontrados
@@ -0,0 +1,312 @@
+"""
+Instantánea de solo lectura del catálogo en un archivo mapeado en memoria. Todos los
+workers de la máquina mapean el mismo archivo (por defecto en /dev/shm), así que sus
+páginas están una sola vez en memoria sin importar cuántos workers haya: cada worker
+solo guarda vistas de numpy sobre el mapa, y los textos se decodifican al leerlos.
+
+El archivo lleva columnas de enteros ordenadas por id (categoría, precio en céntimos,
+stock y versión), tablas de textos (offsets + bytes UTF-8) para nombre, código y
+descripción, los nombres de las categorías y un índice de búsqueda con los nombres
+normalizados. Se identifica con la versión del catálogo de cache.py: si la versión
+avanzó, el primer worker que lo nota lo reconstruye (con un lock de archivo, a lo sumo
+una vez por CATALOGO_INSTANTANEA_INTERVALO_MS) y mientras tanto se usa la base de datos.
+Esa versión debe verla cada worker, así que sin caché compartida (CACHE_COMPARTIDA) la
+instantánea no se usa: un worker no sabría que otro modificó el catálogo.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import unicodedata
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .cache import version_catalogo
+from .models import Categoria, Producto
+
+logger = logging.getLogger(__name__)
+
+MAGIA = b'CATALOG1'
+ALINEACION = 64
+TAMANO_LOTE = 5000
+SEPARADOR = b'\x00'
+
+_actual = None
+_lock = threading.Lock()
+
+
+def normalizar(texto):
+    """Texto en minúsculas y sin tildes, para buscar sin distinguir 'cafe' de 'Café'."""
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def _textos(valores):
+    """(offsets, datos, nulos) de una columna de textos; los None quedan vacíos y marcados."""
+    codificados = [(valor or '').encode('utf-8') for valor in valores]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum([len(valor) for valor in codificados], out=offsets[1:])
+    datos = np.frombuffer(b''.join(codificados), dtype=np.uint8)
+    nulos = np.array([valor is None for valor in valores], dtype=np.uint8)
+    return offsets, datos, nulos
+
+
+class Instantanea:
+    """Vista sobre un archivo de catálogo ya escrito; no copia las columnas a memoria del proceso."""
+
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as archivo:
+            self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mapa[:len(MAGIA)] != MAGIA:
+            raise ValueError(f"{ruta} no es una instantánea del catálogo")
+        largo, = struct.unpack_from('<Q', self._mapa, len(MAGIA))
+        cabecera = json.loads(self._mapa[16:16 + largo])
+        self.version = cabecera['version']
+        self._inicio = _alinear(16 + largo)
+        self._offsets = {nombre: self._inicio + offset for nombre, (_, offset, _) in cabecera['columnas'].items()}
+        self._columnas = {
+            nombre: np.frombuffer(self._mapa, dtype=np.dtype(tipo), count=cantidad, offset=self._offsets[nombre])
+            for nombre, (tipo, _, cantidad) in cabecera['columnas'].items()
+        }
+        self.ids = self._columnas['id']
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _texto(self, columna, indice):
+        nulos = self._columnas.get(f'{columna}.nulos')
+        if nulos is not None and nulos[indice]:
+            return None
+        offsets = self._columnas[f'{columna}.offsets']
+        base = self._offsets[f'{columna}.datos']
+        return self._mapa[base + int(offsets[indice]):base + int(offsets[indice + 1])].decode('utf-8')
+
+    def _precio(self, indice):
+        return Decimal(int(self._columnas['precio'][indice])).scaleb(-2)
+
+    def _categoria(self, categoria_id):
+        ids = self._columnas['categoria.id']
+        posicion = int(np.searchsorted(ids, categoria_id))
+        if posicion < len(ids) and ids[posicion] == categoria_id:
+            return self._texto('categoria.nombre', posicion)
+        return None
+
+    def indices(self, ids):
+        """{id: posición} de los `ids` que están en la instantánea."""
+        buscados = np.asarray(ids, dtype=np.int64)
+        posiciones = np.searchsorted(self.ids, buscados)
+        validos = posiciones < len(self.ids)
+        validos[validos] = self.ids[posiciones[validos]] == buscados[validos]
+        return {int(pk): int(posicion) for pk, posicion in zip(buscados[validos], posiciones[validos])}
+
+    def producto(self, indice):
+        """El producto en `indice` con la misma forma que ProductoSerializer."""
+        columnas = self._columnas
+        return {
+            'id': int(self.ids[indice]),
+            'codigo': self._texto('codigo', indice),
+            'nombre': self._texto('nombre', indice),
+            'descripcion': self._texto('descripcion', indice),
+            'precio': str(self._precio(indice)),
+            'stock': int(columnas['stock'][indice]),
+            'categoria': int(columnas['categoria'][indice]),
+            'version': int(columnas['version'][indice]),
+        }
+
+    def productos(self, ids):
+        return {pk: self.producto(indice) for pk, indice in self.indices(ids).items()}
+
+    def filas(self, categoria_id=None):
+        """
+        Tuplas (id, codigo, nombre, descripcion, precio, stock, categoria_id, categoria) en
+        orden de id, como las de la exportación de productos.
+        """
+        columnas = self._columnas
+        if categoria_id is None:
+            indices = range(len(self))
+        else:
+            indices = np.flatnonzero(columnas['categoria'] == categoria_id)
+        nombres = {}
+        for indice in indices:
+            categoria = int(columnas['categoria'][indice])
+            if categoria not in nombres:
+                nombres[categoria] = self._categoria(categoria)
+            yield (
+                int(self.ids[indice]), self._texto('codigo', indice), self._texto('nombre', indice),
+                self._texto('descripcion', indice), self._precio(indice), int(columnas['stock'][indice]),
+                categoria, nombres[categoria],
+            )
+
+    def buscar(self, texto, limite=10):
+        """
+        Productos cuyo nombre o código contiene `texto` (sin distinguir mayúsculas ni
+        tildes), primero los que empiezan por él. Recorre el índice con mmap.find, en C,
+        sin decodificar los nombres que no coinciden.
+        """
+        buscado = normalizar(texto).encode('utf-8')
+        if not buscado or SEPARADOR in buscado:
+            return []
+        offsets = self._columnas['busqueda.offsets']
+        base = self._offsets['busqueda.datos']
+        fin = base + int(offsets[-1])
+        posicion = base
+        encontrados = []
+        while len(encontrados) < limite * 5:
+            posicion = self._mapa.find(buscado, posicion, fin)
+            if posicion < 0:
+                break
+            indice = int(np.searchsorted(offsets, posicion - base, side='right')) - 1
+            encontrados.append((posicion - base != offsets[indice], indice))
+            posicion = base + int(offsets[indice + 1])
+        encontrados.sort(key=lambda encontrado: encontrado[0])
+        return [self.producto(indice) for _, indice in encontrados[:limite]]
+
+
+def _alinear(posicion):
+    return -(-posicion // ALINEACION) * ALINEACION
+
+
+def _escribir(ruta, version, columnas):
+    """Escribe el archivo en uno temporal del mismo directorio y lo sustituye de forma atómica."""
+    disposicion = {}
+    desplazamiento = 0
+    for nombre, valores in columnas.items():
+        disposicion[nombre] = [valores.dtype.str, desplazamiento, len(valores)]
+        desplazamiento = _alinear(desplazamiento + valores.nbytes)
+    cabecera = json.dumps({'version': version, 'columnas': disposicion}).encode()
+    inicio = _alinear(16 + len(cabecera))
+
+    directorio = os.path.dirname(ruta)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, prefix='.catalogo-')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(MAGIA + struct.pack('<Q', len(cabecera)) + cabecera)
+            for nombre, valores in columnas.items():
+                archivo.seek(inicio + disposicion[nombre][1])
+                archivo.write(valores.tobytes())
+            archivo.truncate(inicio + desplazamiento)
+        # Los workers que tienen mapeado el archivo anterior lo siguen leyendo hasta que lo sueltan
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def construir(ruta, version):
+    """Lee el catálogo visible en lotes y escribe su instantánea con `version`."""
+    ids, categorias, precios, stocks, versiones = [], [], [], [], []
+    nombres, codigos, descripciones, busqueda = [], [], [], []
+    filas = Producto.objects.order_by('id').values_list(
+        'id', 'categoria_id', 'precio', 'stock', 'version', 'nombre', 'codigo', 'descripcion'
+    )
+    for pk, categoria_id, precio, stock, version_producto, nombre, codigo, descripcion in filas.iterator(
+            chunk_size=TAMANO_LOTE):
+        ids.append(pk)
+        categorias.append(categoria_id)
+        precios.append(int((precio * 100).to_integral_value()))
+        stocks.append(stock)
+        versiones.append(version_producto)
+        nombres.append(nombre)
+        codigos.append(codigo)
+        descripciones.append(descripcion)
+        # El separador final impide que una coincidencia abarque dos productos
+        busqueda.append(normalizar(f"{nombre} {codigo or ''}").replace('\x00', ' ') + '\x00')
+    categorias_visibles = list(Categoria.objects.order_by('id').values_list('id', 'nombre'))
+
+    columnas = {
+        'id': np.array(ids, dtype=np.int64),
+        'categoria': np.array(categorias, dtype=np.int64),
+        'precio': np.array(precios, dtype=np.int64),
+        'stock': np.array(stocks, dtype=np.int64),
+        'version': np.array(versiones, dtype=np.int64),
+        'categoria.id': np.array([pk for pk, _ in categorias_visibles], dtype=np.int64),
+    }
+    for nombre, valores in (('nombre', nombres), ('codigo', codigos), ('descripcion', descripciones),
+                            ('busqueda', busqueda), ('categoria.nombre', [n for _, n in categorias_visibles])):
+        offsets, datos, nulos = _textos(valores)
+        columnas[f'{nombre}.offsets'] = offsets
+        columnas[f'{nombre}.datos'] = datos
+        if nulos.any():
+            columnas[f'{nombre}.nulos'] = nulos
+    _escribir(ruta, version, columnas)
+    logger.info(f"Instantánea del catálogo generada - Versión: {version}, Productos: {len(ids)}, Ruta: {ruta}")
+
+
+def ruta_instantanea():
+    """Archivo de la instantánea; el nombre depende de la base de datos para no mezclar entornos."""
+    datos = connection.settings_dict
+    clave = hashlib.sha1(f"{datos.get('HOST')}:{datos.get('PORT')}/{datos.get('NAME')}".encode()).hexdigest()[:12]
+    return os.path.join(settings.CATALOGO_INSTANTANEA_DIR, f"catalogo-{clave}.bin")
+
+
+def _abrir(ruta):
+    try:
+        return Instantanea(ruta)
+    except (OSError, ValueError):
+        return None
+
+
+def _reconstruir(ruta, version):
+    """Reconstruye si ningún otro proceso lo está haciendo y no se hizo hace muy poco; si no, None."""
+    with open(f"{ruta}.lock", 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        try:
+            # Puede que otro proceso la haya reconstruido mientras se esperaba el lock
+            existente = _abrir(ruta)
+            if existente is not None and existente.version == version:
+                return existente
+            try:
+                edad_ms = (time.time() - os.path.getmtime(ruta)) * 1000
+            except OSError:
+                edad_ms = None
+            if edad_ms is not None and edad_ms < settings.CATALOGO_INSTANTANEA_INTERVALO_MS:
+                return None
+            construir(ruta, version)
+            return _abrir(ruta)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def instantanea():
+    """
+    Instantánea al día con la versión actual del catálogo, o None si está desactivada
+    (CATALOGO_INSTANTANEA_DIR vacío o caché no compartida) o todavía no está lista: quien
+    llama usa entonces la base de datos.
+    """
+    global _actual
+    if not settings.CATALOGO_INSTANTANEA_DIR or not settings.CACHE_COMPARTIDA:
+        return None
+    version = version_catalogo()
+    actual = _actual
+    if actual is not None and actual.version == version:
+        return actual
+    if connection.in_atomic_block:
+        # Dentro de una transacción se verían (y podrían quedar en la instantánea) cambios sin confirmar
+        return None
+    with _lock:
+        if _actual is not None and _actual.version == version:
+            return _actual
+        ruta = ruta_instantanea()
+        candidata = _abrir(ruta)
+        if candidata is None or candidata.version != version:
+            try:
+                os.makedirs(settings.CATALOGO_INSTANTANEA_DIR, exist_ok=True)
+                candidata = _reconstruir(ruta, version)
+            except OSError as e:
+                logger.error(f"No se pudo generar la instantánea del catálogo - Ruta: {ruta}, Error: {str(e)}")
+                return None
+        if candidata is not None:
+            _actual = candidata
+        return candidata
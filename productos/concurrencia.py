@@ -0,0 +1,91 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+class ConflictoVersion(Exception):
+    """El objeto cambió (o no existe en esa versión) desde que el cliente lo leyó."""
+
+
+def etag(version):
+    return f'"{version}"'
+
+
+def version_esperada(request, instancia=None):
+    """
+    Versión indicada en If-Match (acepta la forma débil W/"n" que deja el middleware de
+    compresión). Sin cabecera, o con '*', se usa la versión de `instancia` tal como se
+    leyó en esta misma petición. Lanza ConflictoVersion si la cabecera no es una versión.
+    """
+    cabecera = request.headers.get('If-Match', '').strip()
+    if not cabecera or cabecera == '*':
+        return instancia.version if instancia is not None else None
+    valor = cabecera.removeprefix('W/').strip('"')
+    if not valor.isdigit():
+        raise ConflictoVersion()
+    return int(valor)
+
+
+def guardar_con_version(serializer, version):
+    """
+    Reclama la versión con un UPDATE ... SET version = version + 1 WHERE id = pk AND
+    version = n y, dentro de la misma transacción, guarda el serializer. Si otra petición
+    se adelantó no se actualiza ninguna fila y se lanza ConflictoVersion, sin bloqueos
+    ni SELECT adicionales.
+    """
+    instancia = serializer.instance
+    with transaction.atomic():
+        reclamadas = type(instancia)._base_manager.filter(pk=instancia.pk, version=version).update(
+            version=F('version') + 1
+        )
+        if not reclamadas:
+            raise ConflictoVersion()
+        instancia.version = version + 1
+        serializer.save()
+
+
+def respuesta_conflicto():
+    return Response(
+        {'error': 'El registro fue modificado por otro usuario; recárguelo e intente de nuevo'},
+        status=status.HTTP_412_PRECONDITION_FAILED,
+    )
+
+
+class VersionadoMixin:
+    """
+    Concurrencia optimista para un ModelViewSet: las lecturas de detalle devuelven la
+    versión como ETag y las modificaciones solo se aplican si If-Match coincide con la
+    versión actual; en caso contrario responden 412.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag(response.data['version'])
+        return response
+
+    def update(self, request, *args, **kwargs):
+        try:
+            response = super().update(request, *args, **kwargs)
+        except ConflictoVersion:
+            logger.warning(f"Conflicto de versión - Usuario: {request.user.username}, "
+                           f"ID: {kwargs.get('pk')}, If-Match: {request.headers.get('If-Match')}")
+            return respuesta_conflicto()
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag(response.data['version'])
+        return response
+
+    def perform_update(self, serializer):
+        guardar_con_version(serializer, version_esperada(self.request, serializer.instance))
+
+    def filtrar_por_version(self, queryset):
+        """Restringe `queryset` a la versión de If-Match, si la petición la indica."""
+        if 'If-Match' not in self.request.headers:
+            return queryset
+        version = version_esperada(self.request)
+        return queryset if version is None else queryset.filter(version=version)
@@ -0,0 +1,189 @@
+import asyncio
+import collections
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import PronosticoStock
+
+logger = logging.getLogger(__name__)
+
+CANAL_POSTGRES = 'inventario_eventos'
+
+
+class Evento:
+    __slots__ = ('id', 'tipo', 'datos')
+
+    def __init__(self, id, tipo, datos):
+        self.id = id
+        self.tipo = tipo
+        self.datos = datos
+
+    def formatear(self):
+        """Representación en el formato text/event-stream."""
+        return f"id: {self.id}\nevent: {self.tipo}\ndata: {json.dumps(self.datos, ensure_ascii=False)}\n\n"
+
+
+class Broker:
+    """
+    Reparte los eventos del proceso entre las conexiones abiertas. Guarda los últimos
+    eventos para que un cliente que se reconecta con Last-Event-ID recupere lo perdido.
+    """
+
+    def __init__(self, historial=256, max_pendientes=1000):
+        self._lock = threading.Lock()
+        self._suscriptores = set()
+        self._historial = collections.deque(maxlen=historial)
+        self._max_pendientes = max_pendientes
+        self._ultimo_id = 0
+
+    def _siguiente_id(self):
+        # Microsegundos desde epoch: crecen en cada proceso y son comparables entre workers
+        self._ultimo_id = max(self._ultimo_id + 1, time.time_ns() // 1000)
+        return self._ultimo_id
+
+    def nuevo_id(self):
+        with self._lock:
+            return self._siguiente_id()
+
+    def publicar_local(self, tipo, datos, id=None):
+        with self._lock:
+            if id is None:
+                id = self._siguiente_id()
+            else:
+                self._ultimo_id = max(self._ultimo_id, id)
+            evento = Evento(id, tipo, datos)
+            self._historial.append(evento)
+            suscriptores = list(self._suscriptores)
+
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(self._entregar, cola, evento)
+            except RuntimeError:
+                # El loop de la conexión ya se cerró
+                self.cancelar((loop, cola))
+        return evento
+
+    @staticmethod
+    def _entregar(cola, evento):
+        try:
+            cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            logger.warning(f"Cola de eventos llena, evento descartado - ID: {evento.id}")
+
+    def suscribir(self, ultimo_id=None):
+        """Registra una conexión y devuelve su suscripción y los eventos posteriores a `ultimo_id`."""
+        suscripcion = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self._max_pendientes))
+        with self._lock:
+            self._suscriptores.add(suscripcion)
+            pendientes = [] if ultimo_id is None else [e for e in self._historial if e.id > ultimo_id]
+        return suscripcion, pendientes
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    @property
+    def conexiones(self):
+        return len(self._suscriptores)
+
+
+broker = Broker()
+
+_escucha_lock = threading.Lock()
+_escucha = None
+
+
+def _usa_postgres():
+    return settings.EVENTOS_TRANSPORTE == 'postgres'
+
+
+def publicar(tipo, datos):
+    """Publica un evento a todos los workers (vía NOTIFY) o solo a este proceso."""
+    if not _usa_postgres():
+        return broker.publicar_local(tipo, datos)
+
+    carga = json.dumps({'id': broker.nuevo_id(), 'tipo': tipo, 'datos': datos}, ensure_ascii=False)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CANAL_POSTGRES, carga])
+
+
+def _escuchar_postgres():
+    """Hilo que recibe los NOTIFY de todos los workers y los reparte en este proceso."""
+    import psycopg2
+
+    while True:
+        try:
+            if settings.EVENTOS_PG_DSN:
+                conexion = psycopg2.connect(settings.EVENTOS_PG_DSN)
+            else:
+                conexion = psycopg2.connect(**connection.get_connection_params())
+            conexion.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conexion.cursor() as cursor:
+                cursor.execute(f"LISTEN {CANAL_POSTGRES}")
+            logger.info("Escuchando eventos de inventario en PostgreSQL")
+
+            while True:
+                if select.select([conexion], [], [], 60) == ([], [], []):
+                    continue
+                conexion.poll()
+                while conexion.notifies:
+                    aviso = conexion.notifies.pop(0)
+                    evento = json.loads(aviso.payload)
+                    broker.publicar_local(evento['tipo'], evento['datos'], id=evento['id'])
+        except Exception as e:
+            logger.error(f"Error en la escucha de eventos de PostgreSQL, reintentando - Error: {str(e)}")
+            time.sleep(5)
+
+
+def iniciar_escucha():
+    """Arranca, una sola vez por proceso, la escucha de PostgreSQL si está configurada."""
+    global _escucha
+    if not _usa_postgres():
+        return
+    with _escucha_lock:
+        if _escucha is None:
+            _escucha = threading.Thread(target=_escuchar_postgres, name='eventos-postgres', daemon=True)
+            _escucha.start()
+
+
+def notificar_cambio_stock(producto, stock_anterior):
+    """
+    Programa, para después del commit, el evento de cambio de stock y, si el movimiento
+    lleva el producto a su punto de reorden o por debajo, el de stock bajo. Con el
+    transporte local y sin conexiones abiertas no consulta ni publica nada.
+    """
+    stock = producto.stock
+    if stock == stock_anterior:
+        return
+    if not _usa_postgres() and not broker.conexiones:
+        # Nadie escucha en este proceso; con 'postgres' pueden escuchar otros workers
+        return
+    # Mismo criterio que filtro_bajo_stock: sin demanda estimada rige el umbral fijo
+    umbral = PronosticoStock.objects.filter(producto_id=producto.pk, demanda_diaria__gt=0) \
+        .values_list('punto_reorden', flat=True).first()
+    if umbral is None:
+        umbral = settings.STOCK_BAJO_UMBRAL
+
+    datos = {
+        'producto': producto.pk,
+        'nombre': producto.nombre,
+        'stock': stock,
+        'stock_anterior': stock_anterior,
+        'umbral': umbral,
+    }
+
+    def enviar():
+        try:
+            publicar('stock', datos)
+            if stock_anterior > umbral >= stock:
+                publicar('stock_bajo', datos)
+        except Exception as e:
+            logger.error(f"Error al publicar evento de stock - Producto: {producto.pk}, Error: {str(e)}")
+
+    transaction.on_commit(enviar)
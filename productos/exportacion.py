@@ -0,0 +1,187 @@
+"""
+Exportaciones CSV y XLSX de productos e inventarios para hojas de cálculo. Cada
+exportación es una sola consulta .values_list() con los JOIN necesarios y los filtros
+en el WHERE, recorrida con .iterator(): las filas nunca se cargan todas en memoria.
+"""
+import csv
+import datetime
+import io
+import logging
+import tempfile
+
+from django.db.models import QuerySet
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Inventario, Producto
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ('csv', 'xlsx')
+FILAS_POR_BLOQUE = 500
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+COLUMNAS_PRODUCTOS = [
+    ('id', 'id'),
+    ('codigo', 'codigo'),
+    ('nombre', 'nombre'),
+    ('descripcion', 'descripcion'),
+    ('precio', 'precio'),
+    ('stock', 'stock'),
+    ('categoria_id', 'categoria_id'),
+    ('categoria', 'categoria__nombre'),
+]
+COLUMNAS_INVENTARIOS = [
+    ('id', 'id'),
+    ('fecha', 'fecha_creacion'),
+    ('tipo', 'tipo'),
+    ('producto_id', 'producto_id'),
+    ('producto', 'producto__nombre'),
+    ('categoria', 'producto__categoria__nombre'),
+    ('cantidad', 'cantidad'),
+    ('fecha_actualizacion', 'fecha_actualizacion'),
+]
+
+
+def _entero(params, nombre):
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    if not valor.isdigit():
+        raise ValueError(f"'{nombre}' debe ser un id numérico")
+    return int(valor)
+
+
+def _fecha(params, nombre):
+    valor = params.get(nombre)
+    if not valor:
+        return None
+    fecha = parse_date(valor)
+    if fecha is None:
+        raise ValueError(f"Fecha inválida en '{nombre}', use YYYY-MM-DD")
+    return fecha
+
+
+def consulta_productos(params):
+    """
+    Filas de productos filtradas por ?categoria=; ValueError si un filtro no es válido.
+    Salen de la instantánea del catálogo si está al día y, si no, de una consulta.
+    """
+    # catalogo carga numpy: se importa al primer uso para no alargar el arranque
+    from .catalogo import instantanea
+
+    categoria = _entero(params, 'categoria')
+    catalogo = instantanea()
+    if catalogo is not None:
+        return catalogo.filas(categoria)
+    productos = Producto.objects.order_by('id')
+    if categoria is not None:
+        productos = productos.filter(categoria_id=categoria)
+    return productos.values_list(*[campo for _, campo in COLUMNAS_PRODUCTOS])
+
+
+def consulta_inventarios(params):
+    """
+    Filas de movimientos filtradas por ?desde= y ?hasta= (fecha del movimiento, ambas
+    incluidas), ?categoria=, ?producto= y ?tipo=; ValueError si un filtro no es válido.
+    """
+    movimientos = Inventario.objects.order_by('id')
+    desde, hasta = _fecha(params, 'desde'), _fecha(params, 'hasta')
+    if desde is not None:
+        movimientos = movimientos.filter(
+            fecha_creacion__gte=timezone.make_aware(datetime.datetime.combine(desde, datetime.time.min))
+        )
+    if hasta is not None:
+        movimientos = movimientos.filter(
+            fecha_creacion__lt=timezone.make_aware(datetime.datetime.combine(hasta + datetime.timedelta(days=1),
+                                                                             datetime.time.min))
+        )
+    categoria = _entero(params, 'categoria')
+    if categoria is not None:
+        movimientos = movimientos.filter(producto__categoria_id=categoria)
+    producto = _entero(params, 'producto')
+    if producto is not None:
+        movimientos = movimientos.filter(producto_id=producto)
+    tipo = params.get('tipo')
+    if tipo:
+        if tipo not in dict(Inventario._meta.get_field('tipo').choices):
+            raise ValueError("'tipo' debe ser 'entrada' o 'salida'")
+        movimientos = movimientos.filter(tipo=tipo)
+    return movimientos.values_list(*[campo for _, campo in COLUMNAS_INVENTARIOS])
+
+
+def _local(valor):
+    # Las hojas de cálculo no tienen zona horaria: se exporta la hora local, sin desplazamiento
+    if isinstance(valor, datetime.datetime):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+def _csv(columnas, filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # BOM para que Excel detecte UTF-8 al abrir el archivo
+    buffer.write('\ufeff')
+    escritor.writerow([nombre for nombre, _ in columnas])
+    for indice, fila in enumerate(filas, start=1):
+        escritor.writerow([
+            valor.isoformat(sep=' ', timespec='seconds') if isinstance(valor, datetime.datetime) else valor
+            for valor in map(_local, fila)
+        ])
+        if indice % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _csv_registrando_errores(nombre, columnas, filas):
+    # La consulta se recorre mientras se envía, fuera del try de la vista
+    try:
+        yield from _csv(columnas, filas)
+    except Exception as e:
+        logger.error(f"Error al exportar {nombre} - Formato: csv, Error: {str(e)}")
+        raise
+
+
+def _xlsx(titulo, columnas, filas):
+    """
+    Libro en modo write-only de openpyxl: cada fila se serializa al escribirla y el
+    resultado va a un archivo temporal en disco, que se devuelve ya rebobinado.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(titulo)
+    encabezados = []
+    for nombre, _ in columnas:
+        celda = WriteOnlyCell(hoja, value=nombre)
+        celda.font = Font(bold=True)
+        encabezados.append(celda)
+    hoja.append(encabezados)
+    for fila in filas:
+        hoja.append([_local(valor) for valor in fila])
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def respuesta_exportacion(formato, nombre, columnas, consulta):
+    """
+    StreamingHttpResponse (CSV) o FileResponse (XLSX) con `consulta` recorrida por
+    bloques; `consulta` también puede ser un iterable de filas ya resuelto.
+    """
+    filas = consulta.iterator(chunk_size=2000) if isinstance(consulta, QuerySet) else consulta
+    if formato == 'xlsx':
+        return FileResponse(
+            _xlsx(nombre, columnas, filas), as_attachment=True, filename=f"{nombre}.xlsx", content_type=TIPO_XLSX
+        )
+    contenido = _csv_registrando_errores(nombre, columnas, filas)
+    response = StreamingHttpResponse(contenido, content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return response
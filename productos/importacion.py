@@ -0,0 +1,293 @@
+import csv
+import decimal
+import io
+import json
+import logging
+import time
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+
+from .cache import invalidar_productos
+from .models import Categoria, Producto
+from .valoracion import CAMPOS as CAMPOS_VALORACION, registrar_cambios
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 2000
+FORMATOS = ('csv', 'ndjson')
+# Campos que una importación sobrescribe en productos existentes; el stock solo se fija
+# al crear el producto porque después lo mantienen los movimientos de inventario.
+# Reimportar un código eliminado lógicamente lo restaura (eliminado_en vuelve a NULL).
+CAMPOS_ACTUALIZABLES = ['nombre', 'descripcion', 'precio', 'categoria', 'eliminado_en']
+
+_max_nombre = Producto._meta.get_field('nombre').max_length
+_max_codigo = Producto._meta.get_field('codigo').max_length
+_max_categoria = Categoria._meta.get_field('nombre').max_length
+_precio = Producto._meta.get_field('precio')
+
+
+def formato_de(nombre_archivo, formato=None):
+    """Formato explícito o deducido de la extensión del archivo."""
+    formato = (formato or nombre_archivo.rsplit('.', 1)[-1]).lower()
+    if formato in ('jsonl', 'json'):
+        formato = 'ndjson'
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}. Use {' o '.join(FORMATOS)}")
+    return formato
+
+
+def leer_filas(archivo, formato):
+    """
+    Recorre un archivo binario fila a fila sin cargarlo entero en memoria.
+    Produce (número de fila, dict) o (número de fila, mensaje de error) si la fila no se pudo leer.
+    """
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        if formato == 'csv':
+            # La fila 1 es la cabecera
+            for numero, fila in enumerate(csv.DictReader(texto), 2):
+                yield numero, fila
+        else:
+            for numero, linea in enumerate(texto, 1):
+                if not linea.strip():
+                    continue
+                try:
+                    fila = json.loads(linea)
+                except ValueError:
+                    yield numero, "JSON inválido"
+                    continue
+                yield numero, fila if isinstance(fila, dict) else "Se esperaba un objeto JSON"
+    finally:
+        # Sin detach() cerrar el envoltorio cerraría también el archivo subido
+        texto.detach()
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _validar(fila):
+    """Devuelve (datos normalizados, errores por campo)."""
+    errores = {}
+    nombre = _texto(fila.get('nombre'))
+    if not nombre:
+        errores['nombre'] = "Este campo es requerido."
+    elif len(nombre) > _max_nombre:
+        errores['nombre'] = f"Máximo {_max_nombre} caracteres."
+
+    codigo = _texto(fila.get('codigo')) or None
+    if codigo and len(codigo) > _max_codigo:
+        errores['codigo'] = f"Máximo {_max_codigo} caracteres."
+
+    categoria = _texto(fila.get('categoria'))
+    if not categoria:
+        errores['categoria'] = "Este campo es requerido."
+    elif len(categoria) > _max_categoria:
+        errores['categoria'] = f"Máximo {_max_categoria} caracteres."
+
+    precio = None
+    try:
+        precio = decimal.Decimal(_texto(fila.get('precio')))
+        signo, digitos, exponente = precio.as_tuple()
+        if not precio.is_finite() or -exponente > _precio.decimal_places or len(digitos) > _precio.max_digits:
+            raise decimal.InvalidOperation
+    except (decimal.InvalidOperation, TypeError):
+        errores['precio'] = (
+            f"Número con hasta {_precio.max_digits} dígitos y {_precio.decimal_places} decimales."
+        )
+
+    stock = 0
+    if _texto(fila.get('stock')):
+        try:
+            stock = int(_texto(fila.get('stock')))
+            if stock < 0:
+                raise ValueError
+        except ValueError:
+            errores['stock'] = "Entero mayor o igual que 0."
+
+    datos = {
+        'codigo': codigo,
+        'nombre': nombre,
+        'descripcion': _texto(fila.get('descripcion')) or None,
+        'precio': precio,
+        'stock': stock,
+        'categoria': categoria,
+    }
+    return datos, errores
+
+
+def _bulk_upsert(con_codigo, sin_codigo):
+    if con_codigo:
+        Producto.objects.bulk_create(
+            [Producto(**valores) for valores in con_codigo],
+            update_conflicts=True,
+            unique_fields=['codigo'],
+            update_fields=CAMPOS_ACTUALIZABLES,
+        )
+    if sin_codigo:
+        Producto.objects.bulk_create([Producto(**valores) for valores in sin_codigo])
+
+
+def _copiar_postgres(filas):
+    """
+    Carga el lote con COPY en una tabla temporal y lo vuelca con un solo
+    INSERT ... ON CONFLICT, evitando construir un modelo y un parámetro por valor.
+    Las filas sin código nunca entran en conflicto y siempre se insertan.
+    """
+    qn = connection.ops.quote_name
+    campos = [campo for campo in Producto._meta.concrete_fields if not campo.primary_key]
+    # Valores por defecto de las columnas que el archivo no trae
+    defectos = {campo.attname: campo.get_default() for campo in campos}
+    columnas = ', '.join(qn(campo.column) for campo in campos)
+    actualizar = ', '.join(
+        f"{qn(campo.column)} = EXCLUDED.{qn(campo.column)}"
+        for campo in campos if campo.name in CAMPOS_ACTUALIZABLES
+    )
+    tabla = qn(Producto._meta.db_table)
+    # Una fila reimportada cambia de versión, así que los editores con la anterior reciben 412
+    actualizar += f", {qn('version')} = {tabla}.{qn('version')} + 1"
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for valores in filas:
+        # None se escribe como campo vacío sin comillas, que COPY CSV interpreta como NULL
+        escritor.writerow([valores.get(campo.attname, defectos[campo.attname]) for campo in campos])
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE importacion_productos ON COMMIT DROP AS SELECT {columnas} FROM {tabla} WITH NO DATA"
+        )
+        cursor.copy_expert(f"COPY importacion_productos ({columnas}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {tabla} ({columnas}) SELECT {columnas} FROM importacion_productos "
+            f"ON CONFLICT ({qn('codigo')}) DO UPDATE SET {actualizar}"
+        )
+
+
+def _anteriores(codigos):
+    """Valores de valoración de los productos que el lote va a actualizar, bloqueados hasta el commit."""
+    if not codigos:
+        return {}
+    filas = Producto._base_manager.select_for_update().filter(codigo__in=codigos).values('codigo', *CAMPOS_VALORACION)
+    return {fila.pop('codigo'): fila for fila in filas}
+
+
+def _cambios_valoracion(filas, anteriores):
+    for _, valores in filas:
+        anterior = anteriores.get(valores['codigo']) if valores['codigo'] else None
+        # Un producto existente conserva su stock; el resto de columnas las fija el archivo
+        yield anterior, {
+            'precio': valores['precio'],
+            'stock': anterior['stock'] if anterior else valores['stock'],
+            'categoria_id': valores['categoria_id'],
+            'eliminado_en': None,
+        }
+
+
+class ImportadorCatalogo:
+    """
+    Inserta o actualiza productos por lotes. Los productos con `codigo` se actualizan si
+    ya existen (upsert sobre la restricción única); los que no lo tienen siempre se crean.
+    Las categorías se resuelven por nombre con un mapa en memoria. En PostgreSQL cada
+    lote se carga con COPY; en el resto de motores con bulk_create.
+    """
+
+    def __init__(self, tamano_lote=TAMANO_LOTE, crear_categorias=True):
+        self.tamano_lote = tamano_lote
+        self.crear_categorias = crear_categorias
+        self.categorias = {}
+        for pk, nombre in Categoria.objects.order_by('-id').values_list('id', 'nombre'):
+            # Con nombres repetidos gana la categoría más antigua
+            self.categorias[nombre] = pk
+        self.procesadas = 0
+        self.importadas = 0
+        self.categorias_creadas = 0
+        self.errores = []
+
+    def _resolver_categorias(self, nombres):
+        faltan = {nombre for nombre in nombres if nombre not in self.categorias}
+        if faltan and self.crear_categorias:
+            for categoria in Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in sorted(faltan)]):
+                self.categorias[categoria.nombre] = categoria.pk
+            self.categorias_creadas += len(faltan)
+
+    def _guardar(self, lote):
+        self._resolver_categorias({datos['categoria'] for _, datos in lote})
+
+        con_codigo = {}
+        sin_codigo = []
+        for numero, datos in lote:
+            categoria_id = self.categorias.get(datos['categoria'])
+            if categoria_id is None:
+                self.errores.append({'fila': numero, 'errores': {'categoria': f"No existe la categoría '{datos['categoria']}'."}})
+                continue
+            valores = dict(datos, categoria_id=categoria_id)
+            del valores['categoria']
+            if datos['codigo']:
+                # Un código repetido dentro del lote: gana la última fila
+                con_codigo[datos['codigo']] = (numero, valores)
+            else:
+                sin_codigo.append((numero, valores))
+
+        filas = list(con_codigo.values()) + sin_codigo
+        try:
+            with transaction.atomic():
+                anteriores = _anteriores([valores['codigo'] for _, valores in con_codigo.values()])
+                if connection.vendor == 'postgresql':
+                    _copiar_postgres([valores for _, valores in filas])
+                else:
+                    _bulk_upsert([valores for _, valores in con_codigo.values()], [valores for _, valores in sin_codigo])
+                    # Igual que en COPY: los productos reimportados cambian de versión
+                    Producto._base_manager.filter(codigo__in=list(anteriores)).update(version=F('version') + 1)
+                registrar_cambios(_cambios_valoracion(filas, anteriores))
+        except DatabaseError as e:
+            logger.error(f"Error al guardar lote de importación - Filas: {len(filas)}, Error: {str(e)}")
+            self.errores.extend({'fila': numero, 'errores': {'lote': str(e)}} for numero, _ in filas)
+            return
+        self.importadas += len(filas)
+
+    def importar(self, filas):
+        inicio = time.perf_counter()
+        lote = []
+        for numero, fila in filas:
+            self.procesadas += 1
+            if isinstance(fila, str):
+                self.errores.append({'fila': numero, 'errores': {'fila': fila}})
+                continue
+            datos, errores = _validar(fila)
+            if errores:
+                self.errores.append({'fila': numero, 'errores': errores})
+                continue
+            lote.append((numero, datos))
+            if len(lote) >= self.tamano_lote:
+                self._guardar(lote)
+                lote = []
+        if lote:
+            self._guardar(lote)
+        if self.importadas:
+            invalidar_productos()
+
+        duracion = time.perf_counter() - inicio
+        self.errores.sort(key=lambda error: error['fila'])
+        informe = {
+            'procesadas': self.procesadas,
+            'importadas': self.importadas,
+            'con_errores': len(self.errores),
+            'categorias_creadas': self.categorias_creadas,
+            'duracion_s': round(duracion, 3),
+            'filas_por_segundo': round(self.procesadas / duracion) if duracion else None,
+            'errores': self.errores,
+        }
+        logger.info(
+            f"Catálogo importado - Procesadas: {self.procesadas}, Importadas: {self.importadas}, "
+            f"Errores: {len(self.errores)}, Duración: {duracion:.2f}s"
+        )
+        return informe
+
+
+def importar_catalogo(archivo, formato, tamano_lote=TAMANO_LOTE, crear_categorias=True):
+    """Importa un archivo CSV o NDJSON y devuelve el informe con los errores por fila."""
+    importador = ImportadorCatalogo(tamano_lote, crear_categorias)
+    return importador.importar(leer_filas(archivo, formato))
@@ -0,0 +1,150 @@
+import collections
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.utils import timezone
+
+from .cache import invalidar_productos
+from .eventos import notificar_cambio_stock
+from .models import Inventario, MovimientoPendiente, Producto
+from .rollups import registrar_movimiento
+from .snapshots import rehacer_snapshots
+from .valoracion import registrar_cambios
+
+logger = logging.getLogger(__name__)
+
+CLAVE_PROFUNDIDAD = 'inventario:cola:profundidad'
+
+
+class ColaLlena(Exception):
+    """La cola de escritura diferida superó INVENTARIO_COLA_MAX movimientos pendientes."""
+
+
+def profundidad_cola():
+    return MovimientoPendiente.objects.filter(estado='pendiente').count()
+
+
+def profundidad_aproximada():
+    """
+    Movimientos pendientes según la caché, para no contar la cola en cada POST. El
+    conteo real se repite cada INVENTARIO_COLA_CONTEO_SEGUNDOS; entre tanto se suman
+    los encolados y cada lote aplicado lo descarta. Sin caché compartida
+    (CACHE_COMPARTIDA) cada proceso lleva su propio conteo: no ve lo que encolan los
+    demás workers ni los lotes que aplica drain_inventory_queue hasta el siguiente
+    conteo real, así que la cola puede pasarse de INVENTARIO_COLA_MAX en lo que encolan
+    los otros workers durante ese intervalo.
+    """
+    profundidad = cache.get(CLAVE_PROFUNDIDAD)
+    if profundidad is None:
+        profundidad = profundidad_cola()
+        cache.set(CLAVE_PROFUNDIDAD, profundidad, settings.INVENTARIO_COLA_CONTEO_SEGUNDOS)
+    return profundidad
+
+
+def encolar_movimiento(producto, tipo, cantidad):
+    """Guarda el movimiento validado para aplicarlo después; lanza ColaLlena si hay demasiados."""
+    if profundidad_aproximada() >= settings.INVENTARIO_COLA_MAX:
+        raise ColaLlena()
+    pendiente = MovimientoPendiente.objects.create(producto=producto, tipo=tipo, cantidad=cantidad)
+    try:
+        cache.incr(CLAVE_PROFUNDIDAD)
+    except ValueError:
+        pass  # La clave expiró: el próximo encolado vuelve a contar
+    return pendiente
+
+
+def aplicar_lote(tamano_lote=None):
+    """
+    Aplica en una sola transacción los siguientes `tamano_lote` movimientos pendientes.
+    Cada producto se bloquea una vez y su stock se actualiza con el neto del lote; las
+    salidas sin stock suficiente se rechazan en el orden de llegada, igual que en
+    Inventario.save. Devuelve el número de movimientos procesados.
+    """
+    tamano_lote = tamano_lote or settings.INVENTARIO_COLA_LOTE
+    with transaction.atomic():
+        pendientes = list(
+            MovimientoPendiente.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente').order_by('id')[:tamano_lote]
+        )
+        if not pendientes:
+            return 0
+
+        productos = Producto.objects.select_for_update(of=('self',)).in_bulk({p.producto_id for p in pendientes})
+        stock_anterior = {pk: producto.stock for pk, producto in productos.items()}
+        ahora = timezone.now()
+        aplicados = []
+        for pendiente in pendientes:
+            pendiente.procesado_en = ahora
+            producto = productos.get(pendiente.producto_id)
+            if producto is None:
+                pendiente.estado, pendiente.error = 'rechazado', "El producto fue eliminado."
+            elif pendiente.tipo == 'salida' and producto.stock < pendiente.cantidad:
+                pendiente.estado, pendiente.error = 'rechazado', "Stock insuficiente para realizar la salida."
+            else:
+                producto.stock += pendiente.cantidad if pendiente.tipo == 'entrada' else -pendiente.cantidad
+                pendiente.estado = 'aplicado'
+                aplicados.append(pendiente)
+
+        movimientos = Inventario.objects.bulk_create([
+            Inventario(producto_id=p.producto_id, categoria_id=productos[p.producto_id].categoria_id,
+                       tipo=p.tipo, cantidad=p.cantidad)
+            for p in aplicados
+        ])
+        for pendiente, movimiento in zip(aplicados, movimientos):
+            pendiente.inventario = movimiento
+        if movimientos:
+            # fecha_creacion es auto_now_add: bulk_create pone la hora de aplicación. El
+            # movimiento ocurrió al recibirse, y con esa fecha lo cuentan snapshots y acumulados.
+            Inventario.todos.filter(pk__in=[m.pk for m in movimientos]).update(fecha_creacion=Case(
+                *(When(pk=p.inventario.pk, then=Value(p.recibido_en)) for p in aplicados),
+                output_field=DateTimeField(),
+            ))
+        MovimientoPendiente.objects.bulk_update(pendientes, ['estado', 'error', 'inventario', 'procesado_en'])
+
+        cambiados = [producto for pk, producto in productos.items() if producto.stock != stock_anterior[pk]]
+        for producto in cambiados:
+            producto.version = F('version') + 1
+        Producto.objects.bulk_update(cambiados, ['stock', 'version'])
+        for producto in cambiados:
+            del producto.version
+        registrar_cambios(
+            ({'precio': p.precio, 'stock': stock_anterior[p.pk], 'categoria_id': p.categoria_id, 'eliminado_en': None},
+             {'precio': p.precio, 'stock': p.stock, 'categoria_id': p.categoria_id, 'eliminado_en': None})
+            for p in cambiados
+        )
+        invalidar_productos(producto.pk for producto in cambiados)
+
+        acumulados = collections.defaultdict(lambda: [0, 0])
+        for pendiente in aplicados:
+            acumulado = acumulados[(pendiente.producto_id, timezone.localtime(pendiente.recibido_en).date(), pendiente.tipo)]
+            acumulado[0] += pendiente.cantidad
+            acumulado[1] += 1
+        for (producto_id, fecha, tipo), (cantidad, total) in acumulados.items():
+            registrar_movimiento(producto_id, productos[producto_id].categoria_id, fecha, tipo, cantidad, total)
+        if aplicados:
+            # Los movimientos llevan la fecha en que se recibieron: si ese día ya tiene snapshot,
+            # se rehacen los de sus productos desde ahí
+            rehacer_snapshots(
+                {p.producto_id for p in aplicados},
+                min(timezone.localtime(p.recibido_en).date() for p in aplicados),
+            )
+        for producto in cambiados:
+            notificar_cambio_stock(producto, stock_anterior[producto.pk])
+        transaction.on_commit(lambda: cache.delete(CLAVE_PROFUNDIDAD))
+
+    logger.info(
+        f"Lote de movimientos aplicado - Procesados: {len(pendientes)}, Aplicados: {len(aplicados)}, "
+        f"Productos: {len(cambiados)}"
+    )
+    return len(pendientes)
+
+
+def purgar_procesados(antiguedad):
+    """Borra los tickets ya procesados hace más de `antiguedad` (timedelta)."""
+    borrados, _ = MovimientoPendiente.objects.exclude(estado='pendiente').filter(
+        procesado_en__lt=timezone.now() - antiguedad
+    ).delete()
+    return borrados
@@ -0,0 +1,151 @@
+"""
+Ejecución en proceso de varias peticiones a la API enviadas juntas a POST /api/batch/.
+Cada subpetición se resuelve contra las mismas URLs y se pasa directamente a su vista,
+sin volver a recorrer los middlewares ni autenticar: todas comparten el usuario ya
+autenticado de la petición del lote y la conexión a la base de datos del hilo. Sí pasa
+por lo que no debe saltarse: el control de admisión cobra cada subpetición como una
+petición propia y el diario de peticiones las registra una a una (no el lote).
+"""
+import asyncio
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+from django.db import transaction
+from django.http import HttpResponseServerError
+from django.urls import Resolver404, resolve
+
+from Management.middleware.admission import admitir, liberar
+from Management.middleware.logging_middleware import diario
+
+logger = logging.getLogger(__name__)
+
+METODOS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+# Cabeceras propias de la petición del lote que no deben heredar las subpeticiones
+CABECERAS_NO_HEREDADAS = ('HTTP_IF_', 'HTTP_ACCEPT_ENCODING', 'HTTP_CONTENT_')
+# Cabeceras de la respuesta que se devuelven junto al cuerpo
+CABECERAS_DEVUELTAS = ('ETag', 'Location', 'Retry-After')
+
+
+class PeticionInvalida(ValueError):
+    """La subpetición no tiene la forma {'method', 'path', 'body'?, 'headers'?} o apunta fuera de /api/."""
+
+
+def _validar(peticion, ruta_lote):
+    if not isinstance(peticion, dict):
+        raise PeticionInvalida("Cada petición debe ser un objeto con 'method' y 'path'")
+    metodo = str(peticion.get('method', '')).upper()
+    if metodo not in METODOS:
+        raise PeticionInvalida(f"Método no admitido: {peticion.get('method')!r}")
+    ruta = peticion.get('path')
+    if not isinstance(ruta, str) or not ruta.startswith('/api/'):
+        raise PeticionInvalida("La ruta debe empezar por /api/")
+    if urlsplit(ruta).path == ruta_lote:
+        raise PeticionInvalida("Un lote no puede contener otro lote")
+    cabeceras = peticion.get('headers') or {}
+    if not isinstance(cabeceras, dict):
+        raise PeticionInvalida("'headers' debe ser un objeto")
+    return metodo, ruta, peticion.get('body'), cabeceras
+
+
+def _subpeticion(padre, usuario, metodo, ruta, cuerpo, cabeceras):
+    entorno = {
+        clave: valor for clave, valor in padre.META.items()
+        if clave.startswith('HTTP_') and not clave.startswith(CABECERAS_NO_HEREDADAS)
+    }
+    entorno['REMOTE_ADDR'] = padre.META.get('REMOTE_ADDR', '')
+    for nombre, valor in cabeceras.items():
+        entorno['HTTP_' + nombre.upper().replace('-', '_')] = str(valor)
+    # django.test es costoso de importar; solo se carga si se usa el lote
+    from django.test import RequestFactory
+
+    datos = '' if cuerpo is None else json.dumps(cuerpo)
+    if metodo == 'GET':
+        sub = RequestFactory().generic(metodo, ruta, secure=padre.is_secure(), **entorno)
+    else:
+        sub = RequestFactory().generic(metodo, ruta, datos, content_type='application/json',
+                                       secure=padre.is_secure(), **entorno)
+    sub.session = getattr(padre, 'session', None)
+    sub.user = usuario
+    # DRF usa este usuario en lugar de volver a autenticar con el token o la sesión
+    sub._force_auth_user = usuario
+    return sub
+
+
+def _cuerpo(response):
+    contenido = b''.join(response.streaming_content) if response.streaming else response.content
+    if not contenido:
+        return None
+    if 'json' in response.get('Content-Type', ''):
+        return json.loads(contenido)
+    return contenido.decode(response.charset or 'utf-8', errors='replace')
+
+
+def _ejecutar(padre, usuario, peticion, ruta_lote):
+    inicio = time.perf_counter()
+    try:
+        metodo, ruta, cuerpo, cabeceras = _validar(peticion, ruta_lote)
+        coincidencia = resolve(urlsplit(ruta).path)
+        if asyncio.iscoroutinefunction(coincidencia.func):
+            raise PeticionInvalida("Las vistas asíncronas no se pueden incluir en un lote")
+    except PeticionInvalida as e:
+        return {'status': 400, 'body': {'error': str(e)}, 'duracion_ms': 0}
+    except Resolver404:
+        return {'status': 404, 'body': {'detail': 'No encontrado.'}, 'duracion_ms': 0}
+
+    sub = _subpeticion(padre, usuario, metodo, ruta, cuerpo, cabeceras)
+    sub.start_time = time.time()
+    journal = diario()
+    cuerpo_diario = journal.cuerpo(sub) if journal else None
+    try:
+        # El lote ya ocupa un hueco de concurrencia del proceso; cada subpetición paga su token
+        response = admitir(sub, coincidencia.url_name or '', concurrencia_global=False)
+        if response is None:
+            response = coincidencia.func(sub, *coincidencia.args, **coincidencia.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        resultado = {'status': response.status_code, 'body': _cuerpo(response)}
+        devueltas = {nombre: response[nombre] for nombre in CABECERAS_DEVUELTAS if response.has_header(nombre)}
+        if devueltas:
+            resultado['headers'] = devueltas
+        response.close()
+    except Exception as e:
+        logger.error(f"Error en subpetición del lote - Método: {metodo}, Ruta: {ruta}, Error: {str(e)}")
+        response = HttpResponseServerError()
+        resultado = {'status': 500, 'body': {'error': str(e)}}
+    finally:
+        liberar(sub)
+    if journal:
+        journal.registrar(sub, response, time.time() - sub.start_time, cuerpo_diario)
+    resultado['duracion_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    return resultado
+
+
+def ejecutar_lote(request, peticiones, atomico=False):
+    """
+    Ejecuta `peticiones` en orden con el usuario de `request` (petición DRF del lote) y
+    devuelve (resultados, revertido). Con `atomico` todas corren en una sola transacción
+    que se revierte si alguna responde con un error (status >= 400); las siguientes ya no
+    se ejecutan y se marcan con status 424.
+    """
+    padre, usuario = request._request, request.user
+    padre.journal_omitir = True
+    if not atomico:
+        return [_ejecutar(padre, usuario, peticion, padre.path) for peticion in peticiones], False
+
+    resultados = []
+    revertido = False
+    with transaction.atomic():
+        for peticion in peticiones:
+            resultado = _ejecutar(padre, usuario, peticion, padre.path)
+            resultados.append(resultado)
+            if resultado['status'] >= 400:
+                transaction.set_rollback(True)
+                revertido = True
+                break
+    resultados.extend(
+        {'status': 424, 'body': {'error': 'No ejecutada: una petición anterior del lote falló'}}
+        for _ in peticiones[len(resultados):]
+    )
+    return resultados, revertido
@@ -0,0 +1,38 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.archivo import TAMANO_LOTE, archivar_movimientos, limite_retencion
+from productos.snapshots import construir_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve los movimientos de inventario anteriores a la ventana de retención a la tabla "
+        "de archivo (particionada por mes en PostgreSQL) o a archivos NDJSON comprimidos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=settings.INVENTARIO_RETENCION_MESES,
+                            help="Meses completos que se conservan en Inventario además del actual")
+        parser.add_argument('--a-archivos', metavar='DIRECTORIO',
+                            help="Escribir cada mes en DIRECTORIO/inventario-AAAA-MM.ndjson.gz en vez de la tabla")
+        parser.add_argument('--batch-size', type=int, default=TAMANO_LOTE, help="Filas por lote y transacción")
+
+    def handle(self, *args, **options):
+        if options['meses'] < 0:
+            raise CommandError("--meses no puede ser negativo")
+        directorio = options['a_archivos']
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        # Los snapshots de los días que se archivan deben existir antes de que sus movimientos salgan de Inventario
+        construir_snapshots()
+        antes_de = limite_retencion(options['meses'])
+        movidos = archivar_movimientos(antes_de, options['batch_size'], directorio)
+        for mes, filas in movidos.items():
+            self.stdout.write(f"{mes}: {filas} movimientos")
+        self.stdout.write(self.style.SUCCESS(
+            f"Movimientos archivados anteriores a {antes_de:%Y-%m-%d}: {sum(movidos.values())}"
+        ))
@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.benchmark import carga_concurrente
+
+RUTAS = {
+    'productos': ('/api/productos/', '/api/async/productos/'),
+    'categorias': ('/api/categorias/', '/api/async/categorias/'),
+    'exportar_productos_json': ('/exportar_productos_json/', '/api/async/exportar_productos_json/'),
+    'exportar_inventarios_json': ('/exportar_inventarios_json/', '/api/async/exportar_inventarios_json/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el rendimiento con peticiones concurrentes del despliegue síncrono (WSGI) "
+        "y del asíncrono (ASGI). Levante ambos servidores sobre la misma máquina, p. ej.: "
+        "SERVIDOR_MODO=wsgi PORT=8000 gunicorn -c gunicorn.conf.py y "
+        "SERVIDOR_MODO=asgi PORT=8001 gunicorn -c gunicorn.conf.py"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync-url', default='http://127.0.0.1:8000', help="URL base del despliegue WSGI")
+        parser.add_argument('--async-url', default='http://127.0.0.1:8001', help="URL base del despliegue ASGI")
+        parser.add_argument('--rutas', default=','.join(RUTAS), help=f"Rutas a medir: {', '.join(RUTAS)}")
+        parser.add_argument('--concurrencia', default='1,8,32', help="Niveles de concurrencia separados por comas")
+        parser.add_argument('--peticiones', type=int, default=200, help="Peticiones por nivel de concurrencia")
+        parser.add_argument('--token', help="Access token JWT para las rutas de la API")
+        parser.add_argument('--output', help="Archivo JSON donde guardar los resultados")
+
+    def handle(self, *args, **options):
+        rutas = [r.strip() for r in options['rutas'].split(',') if r.strip()]
+        desconocidas = set(rutas) - set(RUTAS)
+        if desconocidas:
+            raise CommandError(f"Rutas desconocidas: {', '.join(sorted(desconocidas))}")
+        niveles = [int(n) for n in options['concurrencia'].split(',')]
+        headers = {'Authorization': f"Bearer {options['token']}"} if options['token'] else {}
+
+        resultados = []
+        for ruta in rutas:
+            ruta_sync, ruta_async = RUTAS[ruta]
+            for concurrencia in niveles:
+                for modo, url in (('wsgi', options['sync_url'] + ruta_sync), ('asgi', options['async_url'] + ruta_async)):
+                    datos = carga_concurrente(url, options['peticiones'], concurrencia, headers)
+                    datos.update({'ruta': ruta, 'modo': modo, 'concurrencia': concurrencia})
+                    resultados.append(datos)
+                    self.stdout.write(
+                        f"{ruta:<28} {modo:<5} c={concurrencia:<4} {datos['rps']:>9} req/s  "
+                        f"p50={datos['p50_ms']}ms  p99={datos['p99_ms']}ms  errores={datos['errores']}"
+                    )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from productos.snapshots import construir_snapshots
+
+
+class Command(BaseCommand):
+    help = "Genera de forma incremental los snapshots diarios de stock por producto"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasta', help="Último día a procesar (YYYY-MM-DD), por defecto ayer")
+        parser.add_argument('--rebuild', action='store_true', help="Borra y regenera todos los snapshots")
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options['hasta']:
+            hasta = parse_date(options['hasta'])
+            if hasta is None:
+                raise CommandError(f"Fecha inválida: {options['hasta']}")
+
+        total = construir_snapshots(hasta=hasta, reconstruir=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f"Snapshots generados: {total}"))
@@ -0,0 +1,29 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from productos.auditoria import compactar, purgar_antiguos, vaciar
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica la retención de la auditoría: borra los registros más antiguos que --dias "
+        "y fusiona las actualizaciones del mismo objeto y usuario de un mismo día"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.AUDITORIA_RETENCION_DIAS,
+                            help="Conservar solo los registros de los últimos N días")
+        parser.add_argument('--compactar-dias', type=int, default=30,
+                            help="Fusionar las actualizaciones de hace más de N días (negativo para no compactar)")
+
+    def handle(self, *args, **options):
+        vaciar()
+        borrados = purgar_antiguos(datetime.timedelta(days=options['dias']))
+        fusionados = 0
+        if options['compactar_dias'] >= 0:
+            fusionados = compactar(datetime.timedelta(days=options['compactar_dias']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Registros de auditoría borrados: {borrados}, eliminados al compactar: {fusionados}"
+        ))
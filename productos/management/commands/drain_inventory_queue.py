@@ -0,0 +1,39 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from productos.ingesta import aplicar_lote, profundidad_cola, purgar_procesados
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica por lotes los movimientos encolados en modo de escritura diferida "
+        "(INVENTARIO_ESCRITURA_DIFERIDA=1). Con --continuo queda esperando nuevos movimientos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.INVENTARIO_COLA_LOTE, help="Movimientos por transacción")
+        parser.add_argument('--continuo', action='store_true', help="No terminar cuando la cola se vacía")
+        parser.add_argument('--intervalo', type=float, default=0.5, help="Segundos de espera con la cola vacía")
+        parser.add_argument('--retener-horas', type=float, default=24,
+                            help="Horas que se conservan los tickets procesados para consultar su estado")
+
+    def handle(self, *args, **options):
+        retencion = datetime.timedelta(hours=options['retener_horas'])
+        total = 0
+        ultima_purga = 0
+        self.stdout.write(f"Movimientos pendientes: {profundidad_cola()}")
+        while True:
+            procesados = aplicar_lote(options['lote'])
+            total += procesados
+            if time.monotonic() - ultima_purga > 60:
+                purgar_procesados(retencion)
+                ultima_purga = time.monotonic()
+            if procesados:
+                continue
+            if not options['continuo']:
+                break
+            time.sleep(options['intervalo'])
+        self.stdout.write(self.style.SUCCESS(f"Movimientos procesados: {total}"))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from productos.pronosticos import TAMANO_LOTE, calcular_pronosticos
+
+
+class Command(BaseCommand):
+    help = "Calcula demanda diaria, días para agotarse y punto de reorden de todo el catálogo"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventana', type=int, help="Días de historial de salidas a considerar")
+        parser.add_argument('--plazo', type=int, help="Días de plazo de entrega del proveedor")
+        parser.add_argument('--factor', type=float, help="Factor de seguridad sobre la desviación de la demanda")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Productos por lote")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = calcular_pronosticos(
+            ventana=options['ventana'],
+            plazo=options['plazo'],
+            factor=options['factor'],
+            tamano_lote=options['lote'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Pronósticos calculados: {total} productos en {time.perf_counter() - inicio:.2f}s"
+        ))
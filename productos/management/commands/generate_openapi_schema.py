@@ -0,0 +1,29 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Management.schema import FORMATOS, generar_esquema, ruta_esquema, version_codigo
+
+
+class Command(BaseCommand):
+    help = "Genera el esquema OpenAPI de la versión actual del código para servirlo sin regenerarlo"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formato', choices=list(FORMATOS), action='append',
+                            help="Formatos a generar (por defecto todos)")
+
+    def handle(self, *args, **options):
+        os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+        version = version_codigo()
+        for formato in options['formato'] or FORMATOS:
+            ruta = ruta_esquema(formato, version)
+            if os.path.exists(ruta):
+                self.stdout.write(f"Esquema {formato} ya generado para la versión {version}: {ruta}")
+                continue
+            contenido = generar_esquema(formato)
+            temporal = f"{ruta}.tmp"
+            with open(temporal, 'wb') as f:
+                f.write(contenido)
+            os.replace(temporal, ruta)
+            self.stdout.write(self.style.SUCCESS(f"Esquema {formato} generado: {ruta} ({len(contenido)} bytes)"))
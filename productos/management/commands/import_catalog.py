@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.importacion import TAMANO_LOTE, formato_de, importar_catalogo
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa un catálogo de productos desde CSV o NDJSON (columnas codigo, nombre, "
+        "descripcion, precio, stock, categoria) insertando o actualizando por lotes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Archivo CSV o NDJSON")
+        parser.add_argument('--formato', choices=['csv', 'ndjson'], help="Por defecto se deduce de la extensión")
+        parser.add_argument('--batch-size', type=int, default=TAMANO_LOTE, help="Filas por lote")
+        parser.add_argument('--no-crear-categorias', action='store_true',
+                            help="Rechazar las filas con categorías inexistentes en vez de crearlas")
+        parser.add_argument('--errores', help="Archivo JSON donde guardar el informe completo de errores")
+
+    def handle(self, *args, **options):
+        try:
+            formato = formato_de(options['archivo'], options['formato'])
+            with open(options['archivo'], 'rb') as archivo:
+                informe = importar_catalogo(
+                    archivo, formato, options['batch_size'], not options['no_crear_categorias']
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in informe['errores'][:20]:
+            self.stdout.write(self.style.WARNING(f"Fila {error['fila']}: {error['errores']}"))
+        if informe['con_errores'] > 20:
+            self.stdout.write(self.style.WARNING(f"... y {informe['con_errores'] - 20} filas más con errores"))
+        if options['errores']:
+            with open(options['errores'], 'w', encoding='utf-8') as f:
+                json.dump(informe['errores'], f, indent=2, ensure_ascii=False)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Filas procesadas: {informe['procesadas']}, importadas: {informe['importadas']}, "
+            f"con errores: {informe['con_errores']}, categorías creadas: {informe['categorias_creadas']} "
+            f"({informe['filas_por_segundo']} filas/s)"
+        ))
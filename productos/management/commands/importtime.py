@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Se ejecuta en un intérprete nuevo para medir un arranque en frío real
+SCRIPT_ARRANQUE = """
+import json, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().reverse_dict
+urls = time.perf_counter()
+from django.test import Client
+status = Client().get(sys.argv[1]).status_code
+respuesta = time.perf_counter()
+print(json.dumps({
+    'status': status,
+    'setup_ms': (setup - inicio) * 1000,
+    'urls_ms': (urls - setup) * 1000,
+    'primera_respuesta_ms': (respuesta - urls) * 1000,
+}))
+"""
+
+
+def _modulos_mas_lentos(salida_importtime, limite):
+    """Módulos de primer nivel con mayor tiempo acumulado según -X importtime."""
+    modulos = []
+    for linea in salida_importtime.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, nombre = linea[len('import time:'):].split('|')
+        if not nombre.startswith('  '):
+            modulos.append((int(acumulado) / 1000, nombre.strip()))
+    return sorted(modulos, reverse=True)[:limite]
+
+
+class Command(BaseCommand):
+    help = "Mide el arranque en frío (importaciones y tiempo hasta la primera respuesta) y lo compara con un presupuesto"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/login/', help="Ruta de la primera petición")
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help="Presupuesto en ms hasta la primera respuesta (por defecto ARRANQUE_PRESUPUESTO_MS)")
+        parser.add_argument('--repeticiones', type=int, default=3, help="Arranques a medir; se usa la mediana")
+        parser.add_argument('--top', type=int, default=15, help="Módulos más lentos a mostrar")
+        parser.add_argument('--json', action='store_true', help="Salida en JSON")
+
+    def handle(self, *args, **options):
+        presupuesto = options['budget_ms'] or settings.ARRANQUE_PRESUPUESTO_MS
+        entorno = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'Management.settings'))
+
+        mediciones = []
+        importaciones = ''
+        for _ in range(max(1, options['repeticiones'])):
+            inicio = time.perf_counter()
+            proceso = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', SCRIPT_ARRANQUE, options['url']],
+                env=entorno, capture_output=True, text=True, cwd=settings.BASE_DIR,
+            )
+            total_ms = (time.perf_counter() - inicio) * 1000
+            if proceso.returncode != 0:
+                raise CommandError(f"El arranque falló:\n{proceso.stderr[-2000:]}")
+            datos = json.loads(proceso.stdout.strip().splitlines()[-1])
+            datos['total_ms'] = total_ms
+            mediciones.append(datos)
+            importaciones = proceso.stderr
+
+        mediciones.sort(key=lambda d: d['total_ms'])
+        mediana = mediciones[len(mediciones) // 2]
+        resultado = {
+            'url': options['url'],
+            'presupuesto_ms': presupuesto,
+            **{clave: round(valor, 1) if isinstance(valor, float) else valor for clave, valor in mediana.items()},
+            'modulos': [{'modulo': nombre, 'ms': round(ms, 1)} for ms, nombre in _modulos_mas_lentos(importaciones, options['top'])],
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, indent=2))
+        else:
+            self.stdout.write(f"Primera petición: GET {resultado['url']} -> {resultado['status']}")
+            self.stdout.write(f"  django.setup():      {resultado['setup_ms']:>8.1f} ms")
+            self.stdout.write(f"  carga de URLs:       {resultado['urls_ms']:>8.1f} ms")
+            self.stdout.write(f"  primera respuesta:   {resultado['primera_respuesta_ms']:>8.1f} ms")
+            self.stdout.write(f"  total (intérprete):  {resultado['total_ms']:>8.1f} ms  (presupuesto {presupuesto} ms)")
+            self.stdout.write("Módulos de primer nivel más lentos:")
+            for modulo in resultado['modulos']:
+                self.stdout.write(f"  {modulo['ms']:>8.1f} ms  {modulo['modulo']}")
+
+        if resultado['total_ms'] > presupuesto:
+            raise CommandError(
+                f"Arranque en frío de {resultado['total_ms']:.0f} ms supera el presupuesto de {presupuesto} ms"
+            )
@@ -0,0 +1,23 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from productos.purga import TAMANO_LOTE, purgar_eliminados
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra físicamente, por lotes acotados, las categorías y productos eliminados "
+        "lógicamente y todas las filas que dependen de ellos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=float, default=0,
+                            help="Purgar solo lo eliminado hace más de N días")
+        parser.add_argument('--batch-size', type=int, default=TAMANO_LOTE, help="Filas por lote y transacción")
+        parser.add_argument('--pausa-ms', type=int, default=0, help="Pausa entre lotes en milisegundos")
+
+    def handle(self, *args, **options):
+        antiguedad = datetime.timedelta(days=options['older_than_days']) if options['older_than_days'] else None
+        total = purgar_eliminados(antiguedad, options['batch_size'], options['pausa_ms'] / 1000)
+        self.stdout.write(self.style.SUCCESS(f"Filas purgadas: {total}"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from productos.rollups import reconstruir_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcula los acumulados diarios de movimientos a partir de Inventario"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Primer día a recalcular (YYYY-MM-DD), por defecto todo el histórico")
+        parser.add_argument('--hasta', help="Último día a recalcular (YYYY-MM-DD), por defecto hoy")
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for nombre in ('desde', 'hasta'):
+            if options[nombre]:
+                fechas[nombre] = parse_date(options[nombre])
+                if fechas[nombre] is None:
+                    raise CommandError(f"Fecha inválida: {options[nombre]}")
+
+        total = reconstruir_rollups(**fechas)
+        self.stdout.write(self.style.SUCCESS(f"Acumulados generados: {total}"))
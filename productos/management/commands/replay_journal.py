@@ -0,0 +1,95 @@
+import json
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.benchmark import leer_diario, peticion_http, reproducir
+
+
+class Command(BaseCommand):
+    help = (
+        "Reproduce contra un servidor local el diario de peticiones grabado con "
+        "REQUEST_JOURNAL_PATH, a N veces la velocidad original, e informa de rendimiento, "
+        "percentiles de latencia y tasa de error por ruta. Las credenciales del diario están "
+        "redactadas, así que los logins reproducidos fallan; use --token y --sessionid."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('journal', help="Archivo NDJSON del diario de peticiones")
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="URL base del servidor local")
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help="Multiplicador de velocidad (2 = el doble de rápido, 0 = sin esperas)")
+        parser.add_argument('--concurrencia', type=int, default=16, help="Peticiones simultáneas máximas")
+        parser.add_argument('--limite', type=int, help="Reproducir solo las primeras N peticiones")
+        parser.add_argument('--solo-lectura', action='store_true', help="Omitir POST/PUT/PATCH/DELETE")
+        parser.add_argument('--token', help="Access token JWT para las peticiones que usaron JWT")
+        parser.add_argument('--sessionid', help="Cookie de sesión para las peticiones que usaron sesión")
+        parser.add_argument('--csrftoken', help="Cookie CSRF para las escrituras con sesión")
+        parser.add_argument('--timeout', type=float, default=30, help="Timeout por petición en segundos")
+        parser.add_argument('--output', help="Archivo JSON donde guardar los resultados")
+
+    def handle(self, *args, **options):
+        if options['speed'] < 0:
+            raise CommandError("--speed no puede ser negativo")
+        try:
+            entradas = leer_diario(options['journal'], options['solo_lectura'], options['limite'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"No se pudo leer el diario: {e}")
+        if not entradas:
+            raise CommandError("El diario no contiene peticiones que reproducir")
+
+        base = options['url'].rstrip('/')
+        cookies = []
+        if options['sessionid']:
+            cookies.append(f"sessionid={options['sessionid']}")
+        if options['csrftoken']:
+            cookies.append(f"csrftoken={options['csrftoken']}")
+
+        def enviar(entrada):
+            headers = {}
+            if entrada.get('a') == 'jwt' and options['token']:
+                headers['Authorization'] = f"Bearer {options['token']}"
+            elif entrada.get('a') == 'session' and cookies:
+                headers['Cookie'] = '; '.join(cookies)
+                if options['csrftoken']:
+                    headers['X-CSRFToken'] = options['csrftoken']
+                    headers['Referer'] = base + '/'
+
+            cuerpo = entrada.get('b')
+            if cuerpo is not None:
+                headers['Content-Type'] = entrada['ct']
+                if entrada['ct'] == 'application/x-www-form-urlencoded':
+                    cuerpo = urlencode(cuerpo).encode()
+                else:
+                    cuerpo = json.dumps(cuerpo).encode()
+
+            url = base + entrada['p'] + (f"?{entrada['q']}" if entrada.get('q') else '')
+            return peticion_http(entrada['m'], url, headers, cuerpo, timeout=options['timeout'])
+
+        duracion_original = entradas[-1]['t'] - entradas[0]['t']
+        self.stdout.write(
+            f"Reproduciendo {len(entradas)} peticiones ({duracion_original:.1f} s originales) "
+            f"a {options['speed'] or 'máxima'}x con concurrencia {options['concurrencia']}"
+        )
+        resultado = reproducir(entradas, enviar, options['speed'], options['concurrencia'])
+
+        for ruta, datos in resultado['rutas'].items():
+            self.stdout.write(
+                f"{ruta:<45} {datos['peticiones']:>6}  {datos['rps']:>8} req/s  p50={datos['p50_ms']}ms  "
+                f"p90={datos['p90_ms']}ms  p99={datos['p99_ms']}ms  errores={datos['tasa_error']:.1%}"
+            )
+        total = resultado['total']
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {total['peticiones']} peticiones en {total['duracion_s']} s, {total['rps']} req/s, "
+            f"p50={total['p50_ms']}ms p99={total['p99_ms']}ms, errores={total['tasa_error']:.1%}, "
+            f"retraso p99 sobre el programa={resultado['retraso_p99_ms']}ms"
+        ))
+        if resultado['retraso_p99_ms'] and resultado['retraso_p99_ms'] > 100:
+            self.stdout.write(self.style.WARNING(
+                "El generador no mantuvo el ritmo: aumente --concurrencia o el servidor está saturado"
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(resultado, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
@@ -0,0 +1,252 @@
+import datetime
+import json
+import logging
+import platform
+import subprocess
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from productos.benchmark import MedicionFallida, exponente_escalado, medir, sembrar_datos
+from productos.models import Categoria, Inventario, Producto
+from productos.pronosticos import calcular_pronosticos
+
+
+def _status(response):
+    # Consumir el cuerpo para medir también las respuestas en streaming
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response.status_code
+
+
+def _casos(api, web, ids):
+    """Rutas medidas: nombre -> función que ejecuta la operación y devuelve su status."""
+    producto_id, categoria_id, inventario_id = ids
+    contador = iter(range(10 ** 9))
+
+    def crear_producto():
+        return api.post(reverse('producto-list'), {
+            'nombre': f"Producto benchmark {next(contador)}",
+            'descripcion': "Alta desde el benchmark",
+            'precio': '10.00',
+            'categoria': categoria_id,
+        }, format='json').status_code
+
+    def crear_inventario():
+        return api.post(reverse('inventario-list'), {
+            'tipo': 'entrada', 'producto': producto_id, 'cantidad': 1,
+        }, format='json').status_code
+
+    def guardar_inventario():
+        Inventario(tipo='entrada', producto_id=producto_id, cantidad=1).save()
+
+    casos = {
+        'inventario_save': guardar_inventario,
+        'initial_view': lambda: _status(web.get(reverse('initial'))),
+        'admin_dashboard': lambda: _status(web.get(reverse('admin_dashboard'))),
+        'empleado_dashboard': lambda: _status(web.get(reverse('empleado_dashboard'))),
+        'exportar_productos_pdf': lambda: _status(web.get(reverse('exportar_productos_pdf'))),
+        'exportar_inventarios_pdf': lambda: _status(web.get(reverse('exportar_inventarios_pdf'))),
+        'exportar_productos_json': lambda: _status(web.get(reverse('exportar_productos_json'))),
+        'exportar_inventarios_json': lambda: _status(web.get(reverse('exportar_inventarios_json'))),
+        'view_logs': lambda: _status(web.get(reverse('view_logs'))),
+        'categorias_create': lambda: api.post(
+            reverse('categoria-list'), {'nombre': f"Categoría benchmark {next(contador)}"}, format='json'
+        ).status_code,
+        'productos_create': crear_producto,
+        'inventarios_create': crear_inventario,
+        'analytics_movements_list': lambda: _status(api.get(
+            reverse('analytics-movements-list'), {'group_by': 'categoria', 'interval': 'month'}
+        )),
+    }
+    detalles = {
+        'categorias': ('categoria', categoria_id),
+        'productos': ('producto', producto_id),
+        'inventarios': ('inventario', inventario_id),
+        'pronosticos': ('pronosticostock', producto_id),
+    }
+    for nombre, (basename, pk) in detalles.items():
+        casos[f'{nombre}_list'] = lambda b=basename: _status(api.get(reverse(f'{b}-list')))
+        casos[f'{nombre}_retrieve'] = lambda b=basename, pk=pk: _status(api.get(reverse(f'{b}-detail', args=[pk])))
+    return dict(sorted(casos.items()))
+
+
+# Status que cuentan como respuesta correcta de un caso; el resto, 2xx
+ESPERADOS = {
+    'initial_view': {302},
+}
+
+
+def _tamanos(valor):
+    try:
+        return [tuple(int(n) for n in par.lower().split('x')) for par in valor.split(',') if par.strip()]
+    except ValueError:
+        raise CommandError("--sizes debe tener el formato PRODUCTOSxMOVIMIENTOS[,PRODUCTOSxMOVIMIENTOS...]")
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide las rutas clave (API, Inventario.save, dashboards, exportaciones y logs) sobre "
+        "datasets sintéticos de tamaño creciente en una base de datos de pruebas y guarda los "
+        "resultados en JSON para compararlos entre commits"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100x1000,1000x10000,5000x50000',
+                            help="Tamaños PRODUCTOSxMOVIMIENTOS separados por comas, de menor a mayor")
+        parser.add_argument('--casos', help="Casos a medir separados por comas (por defecto todos)")
+        parser.add_argument('--repeticiones', type=int, default=5, help="Mediciones por caso y tamaño")
+        parser.add_argument('--seed', type=int, default=42, help="Semilla de los datos sintéticos")
+        parser.add_argument('--output', help="Archivo JSON donde guardar los resultados")
+        parser.add_argument('--compare', help="Resultados JSON de referencia con los que comparar")
+        parser.add_argument('--umbral', type=float, default=0.2,
+                            help="Aumento relativo del p50 a partir del cual se considera regresión")
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help="Terminar con error si hay regresiones respecto a --compare")
+        parser.add_argument('--con-logs', action='store_true',
+                            help="Mantener el logging durante las mediciones (por defecto se silencia)")
+        parser.add_argument('--motor-sesion', choices=['cached_db', 'signed_cookies', 'cache', 'db'],
+                            help="Motor de sesiones de las vistas HTML durante la medición (por defecto SESION_MOTOR)")
+
+    def handle(self, *args, **options):
+        tamanos = _tamanos(options['sizes'])
+        casos_pedidos = [c.strip() for c in (options['casos'] or '').split(',') if c.strip()]
+
+        resultados = []
+        if not options['con_logs']:
+            logging.disable(logging.CRITICAL)
+        setup_test_environment()
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        if options['motor_sesion']:
+            # SessionMiddleware lee el motor al crearse, es decir, con cada Client nuevo
+            settings.SESSION_ENGINE = f"django.contrib.sessions.backends.{options['motor_sesion']}"
+        try:
+            # Sin control de admisión: las exportaciones comparten un cubo de 0.2 peticiones/s
+            # y se medirían los 429, no la ruta
+            with override_settings(ADMISION_ACTIVA=False):
+                for productos, movimientos in tamanos:
+                    call_command('flush', interactive=False, verbosity=0)
+                    resultados.extend(self._medir_tamano(productos, movimientos, casos_pedidos, options))
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+            logging.disable(logging.NOTSET)
+
+        informe = {
+            'meta': {
+                'commit': _commit(),
+                'fecha': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'base_datos': connection.vendor,
+                'sesiones': settings.SESSION_ENGINE.rsplit('.', 1)[-1],
+                'repeticiones': options['repeticiones'],
+                'seed': options['seed'],
+            },
+            'resultados': resultados,
+            'escalado': self._escalado(resultados),
+        }
+
+        self.stdout.write("Exponente de escalado (pendiente log-log del p50 frente al tamaño):")
+        for caso, exponente in informe['escalado'].items():
+            self.stdout.write(f"  {caso:<28} {exponente}")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(informe, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+        if options['compare']:
+            regresiones = self._comparar(resultados, options['compare'], options['umbral'])
+            if regresiones and options['fail_on_regression']:
+                raise CommandError(f"{regresiones} regresiones de rendimiento respecto a {options['compare']}")
+
+    def _medir_tamano(self, productos, movimientos, casos_pedidos, options):
+        sembrar_datos(productos, movimientos, semilla=options['seed'])
+        calcular_pronosticos()
+
+        admin = User.objects.create_user('benchmark_admin', password='benchmark')
+        admin.profile.role = 'admin'
+        admin.profile.save()
+        api = APIClient()
+        api.force_authenticate(admin)
+        web = Client()
+        # Login real (no force_login) para que la sesión lleve el nombre y el rol como en producción
+        web.post(reverse('login'), {'username': 'benchmark_admin', 'password': 'benchmark'})
+
+        ids = (
+            Producto.objects.order_by('id').values_list('id', flat=True).first(),
+            Categoria.objects.order_by('id').values_list('id', flat=True).first(),
+            Inventario.objects.order_by('id').values_list('id', flat=True).first(),
+        )
+        casos = _casos(api, web, ids)
+        desconocidos = set(casos_pedidos) - set(casos)
+        if desconocidos:
+            raise CommandError(f"Casos desconocidos: {', '.join(sorted(desconocidos))}")
+
+        resultados = []
+        for caso, funcion in casos.items():
+            if casos_pedidos and caso not in casos_pedidos:
+                continue
+            try:
+                datos = medir(funcion, options['repeticiones'], esperados=ESPERADOS.get(caso, range(200, 300)))
+            except MedicionFallida as e:
+                raise CommandError(f"El caso {caso} falló con {productos}x{movimientos}: {e}")
+            datos.update({'caso': caso, 'productos': productos, 'movimientos': movimientos})
+            resultados.append(datos)
+            self.stdout.write(
+                f"{productos:>7}x{movimientos:<9} {caso:<28} p50={datos['p50_ms']}ms  "
+                f"p90={datos['p90_ms']}ms  consultas={datos['consultas']}"
+            )
+        return resultados
+
+    @staticmethod
+    def _escalado(resultados):
+        por_caso = {}
+        for datos in resultados:
+            por_caso.setdefault(datos['caso'], []).append(
+                (datos['productos'] + datos['movimientos'], datos['p50_ms'])
+            )
+        return {caso: exponente_escalado(puntos) for caso, puntos in sorted(por_caso.items())}
+
+    def _comparar(self, resultados, ruta, umbral):
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                referencia = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"No se pudo leer {ruta}: {e}")
+
+        anteriores = {(d['caso'], d['productos'], d['movimientos']): d for d in referencia.get('resultados', [])}
+        regresiones = 0
+        self.stdout.write(f"Comparación con {ruta} (commit {referencia.get('meta', {}).get('commit')}):")
+        for datos in resultados:
+            anterior = anteriores.get((datos['caso'], datos['productos'], datos['movimientos']))
+            if not anterior or not anterior['p50_ms'] or datos['p50_ms'] is None:
+                continue
+            cambio = datos['p50_ms'] / anterior['p50_ms'] - 1
+            linea = (
+                f"  {datos['productos']:>7}x{datos['movimientos']:<9} {datos['caso']:<28} "
+                f"{anterior['p50_ms']}ms -> {datos['p50_ms']}ms ({cambio:+.0%})"
+            )
+            if cambio > umbral:
+                regresiones += 1
+                self.stdout.write(self.style.ERROR(linea + "  REGRESIÓN"))
+            else:
+                self.stdout.write(linea)
+        return regresiones
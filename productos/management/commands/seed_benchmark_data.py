@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from productos.benchmark import sembrar_datos
+
+
+class Command(BaseCommand):
+    help = (
+        "Siembra un catálogo y un historial de movimientos sintéticos y reproducibles "
+        "(misma semilla, mismos datos) para pruebas de rendimiento"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000, help="Número de productos")
+        parser.add_argument('--movements', type=int, default=10000, help="Número de movimientos de inventario")
+        parser.add_argument('--categories', type=int, default=None,
+                            help="Número de categorías (por defecto una por cada 500 productos, mínimo 5)")
+        parser.add_argument('--days', type=int, default=730, help="Días de historial que abarcan los movimientos")
+        parser.add_argument('--seed', type=int, default=42, help="Semilla del generador aleatorio")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Filas por inserción")
+
+    def handle(self, *args, **options):
+        if options['products'] < 1:
+            raise CommandError("--products debe ser al menos 1")
+        if options['movements'] < 0:
+            raise CommandError("--movements no puede ser negativo")
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            sembrar_datos(
+                options['products'],
+                options['movements'],
+                semilla=options['seed'],
+                categorias=options['categories'],
+                dias=options['days'],
+                lote=options['batch_size'],
+                salida=self.stdout.write,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Datos de benchmark sembrados en {time.perf_counter() - inicio:.1f} s"
+        ))
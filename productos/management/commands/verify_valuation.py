@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from productos.valoracion import verificar
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula la valoración de inventario por categoría desde Producto y la compara con la "
+        "mantenida de forma incremental; pensado para ejecutarse cada noche"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true',
+                            help="Reescribir las categorías con diferencias en lugar de solo reportarlas")
+
+    def handle(self, *args, **options):
+        diferencias = verificar(corregir=options['corregir'])
+        for diferencia in diferencias:
+            (valor, unidades, productos), (actual, actuales, contados) = diferencia['esperado'], diferencia['actual']
+            self.stdout.write(
+                f"Categoría {diferencia['categoria']}: valor {actual} (esperado {valor}), "
+                f"unidades {actuales} (esperado {unidades}), productos {contados} (esperado {productos})"
+            )
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("La valoración de inventario coincide con los productos"))
+        elif options['corregir']:
+            self.stdout.write(self.style.SUCCESS(f"Categorías corregidas: {len(diferencias)}"))
+        else:
+            # Código de salida distinto de cero para que la tarea programada lo notifique
+            raise CommandError(f"Desviación en {len(diferencias)} categorías; ejecute con --corregir")
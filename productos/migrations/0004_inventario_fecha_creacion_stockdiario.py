@@ -0,0 +1,44 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copiar_fecha_creacion(apps, schema_editor):
+    # Para los movimientos existentes la mejor aproximación es su última actualización
+    Inventario = apps.get_model('productos', 'Inventario')
+    Inventario.objects.update(fecha_creacion=models.F('fecha_actualizacion'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_producto_stock_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventario',
+            name='fecha_creacion',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copiar_fecha_creacion, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventario',
+            index=models.Index(fields=['producto', 'fecha_creacion'], name='productos_i_product_eedc0f_idx'),
+        ),
+        migrations.CreateModel(
+            name='StockDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_diario', to='productos.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('producto', 'fecha'), name='stock_diario_producto_fecha')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_inventario_fecha_creacion_stockdiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('salida', 'Salida')], max_length=10)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('movimientos', models.IntegerField(default=0)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_diarios', to='productos.categoria')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_diarios', to='productos.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha', 'categoria'], name='productos_m_fecha_794cb4_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'fecha', 'tipo'), name='movimiento_diario_producto_fecha_tipo')],
+            },
+        ),
+    ]
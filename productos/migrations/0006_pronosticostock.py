@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_movimientodiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoStock',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pronostico', serialize=False, to='productos.producto')),
+                ('demanda_diaria', models.FloatField(default=0)),
+                ('desviacion_diaria', models.FloatField(default=0)),
+                ('dias_para_agotarse', models.FloatField(null=True)),
+                ('punto_reorden', models.IntegerField(default=0)),
+                ('calculado_en', models.DateTimeField()),
+            ],
+        ),
+    ]
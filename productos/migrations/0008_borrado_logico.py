@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_producto_codigo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='eliminado_en',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='eliminado_en',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
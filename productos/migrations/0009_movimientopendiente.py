@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:22
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0008_borrado_logico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoPendiente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('salida', 'Salida')], max_length=10)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('aplicado', 'Aplicado'), ('rechazado', 'Rechazado')], default='pendiente', max_length=10)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('recibido_en', models.DateTimeField(auto_now_add=True)),
+                ('procesado_en', models.DateTimeField(blank=True, null=True)),
+                ('inventario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='productos.inventario')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_pendientes', to='productos.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'id'], name='productos_m_estado_bc3269_idx')],
+            },
+        ),
+    ]
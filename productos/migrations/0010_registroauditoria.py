@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:23
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_movimientopendiente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(db_index=True)),
+                ('usuario_nombre', models.CharField(blank=True, max_length=150)),
+                ('accion', models.CharField(choices=[('crear', 'Crear'), ('actualizar', 'Actualizar'), ('eliminar', 'Eliminar')], max_length=10)),
+                ('modelo', models.CharField(max_length=100)),
+                ('objeto_id', models.CharField(max_length=64)),
+                ('cambios', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['modelo', 'objeto_id', 'fecha'], name='productos_r_modelo_2f4405_idx'), models.Index(fields=['usuario', 'fecha'], name='productos_r_usuario_0dda0e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_tabla(apps, schema_editor):
+    """
+    En PostgreSQL la tabla de archivo es particionada por rango mensual de fecha_creacion;
+    la clave primaria debe incluir la columna de partición. En el resto de motores es una
+    tabla normal creada por Django.
+    """
+    modelo = apps.get_model('productos', 'InventarioArchivado')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(modelo)
+        return
+    tabla = schema_editor.quote_name(modelo._meta.db_table)
+    schema_editor.execute(f"""
+        CREATE TABLE {tabla} (
+            "id" bigint NOT NULL,
+            "tipo" varchar(10) NOT NULL,
+            "producto_id" bigint NOT NULL,
+            "cantidad" integer NOT NULL,
+            "fecha_actualizacion" timestamp with time zone NOT NULL,
+            "fecha_creacion" timestamp with time zone NOT NULL,
+            "archivado_en" timestamp with time zone NOT NULL,
+            PRIMARY KEY ("id", "fecha_creacion")
+        ) PARTITION BY RANGE ("fecha_creacion")
+    """)
+    # Los índices del padre se crean en cada partición
+    for indice in modelo._meta.indexes:
+        schema_editor.add_index(modelo, indice)
+
+
+def borrar_tabla(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('productos', 'InventarioArchivado'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0011_version'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='InventarioArchivado',
+                    fields=[
+                        ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                        ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('salida', 'Salida')], max_length=10)),
+                        ('cantidad', models.IntegerField(default=0)),
+                        ('fecha_actualizacion', models.DateTimeField()),
+                        ('fecha_creacion', models.DateTimeField()),
+                        ('archivado_en', models.DateTimeField(auto_now_add=True)),
+                        ('producto', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_archivados', to='productos.producto')),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['producto', 'fecha_creacion'], name='productos_i_product_b12a74_idx'), models.Index(fields=['fecha_creacion'], name='productos_i_fecha_c_6c3e73_idx')],
+                    },
+                ),
+            ],
+        ),
+        # Después del estado, para que crear_tabla y borrar_tabla vean el modelo
+        migrations.RunPython(crear_tabla, borrar_tabla),
+        migrations.CreateModel(
+            name='MesArchivado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('destino', models.CharField(max_length=255)),
+                ('filas', models.IntegerField(default=0)),
+                ('hasta', models.DateTimeField()),
+                ('archivado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('mes', 'destino'), name='mes_archivado_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def calcular_valoracion(apps, schema_editor):
+    # Punto de partida del mantenimiento incremental: la valoración actual de cada categoría
+    Producto = apps.get_model('productos', 'Producto')
+    ValoracionCategoria = apps.get_model('productos', 'ValoracionCategoria')
+    filas = Producto.objects.filter(eliminado_en__isnull=True).values('categoria_id').annotate(
+        valor=models.Sum(models.F('precio') * models.F('stock'), output_field=models.DecimalField(max_digits=20, decimal_places=2)),
+        unidades=models.Sum('stock'),
+        total=models.Count('id'),
+    ).order_by()
+    ValoracionCategoria.objects.bulk_create([
+        ValoracionCategoria(categoria_id=fila['categoria_id'], valor=fila['valor'] or 0,
+                            unidades=fila['unidades'] or 0, productos=fila['total'])
+        for fila in filas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0012_archivo_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValoracionCategoria',
+            fields=[
+                ('categoria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valoracion', serialize=False, to='productos.categoria')),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('unidades', models.BigIntegerField(default=0)),
+                ('productos', models.IntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(calcular_valoracion, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def copiar_categoria(apps, schema_editor):
+    # La categoría en el momento de cada movimiento es la que guardó su acumulado diario;
+    # sin acumulado, la actual del producto
+    Inventario = apps.get_model('productos', 'Inventario')
+    MovimientoDiario = apps.get_model('productos', 'MovimientoDiario')
+    Producto = apps.get_model('productos', 'Producto')
+    del_dia = MovimientoDiario.objects.filter(
+        producto=models.OuterRef('producto'), tipo=models.OuterRef('tipo'),
+        fecha=TruncDate(models.ExpressionWrapper(
+            models.OuterRef('fecha_creacion'), output_field=models.DateTimeField()
+        )),
+    ).values('categoria')[:1]
+    actual = Producto.objects.filter(pk=models.OuterRef('producto')).values('categoria')[:1]
+    Inventario.objects.update(categoria=Coalesce(models.Subquery(del_dia), models.Subquery(actual)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0013_valoracion_categoria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventario',
+            name='categoria',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_inventario', to='productos.categoria'),
+        ),
+        migrations.RunPython(copiar_categoria, migrations.RunPython.noop),
+    ]
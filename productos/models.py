@@ -1,7 +1,61 @@
-from django.db import models
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+
+class EliminablesQuerySet(models.QuerySet):
+    def eliminar(self):
+        """Borrado lógico con un único UPDATE; `manage.py purge_deleted` borra las filas después."""
+        from .cache import invalidar_productos
+        from .valoracion import retirar
+
+        if self.model is Producto:
+            # Los productos eliminados dejan de contar en la valoración de su categoría: el
+            # instante del borrado identifica las filas de este UPDATE y su aporte se resta
+            # agregado en la base de datos, sin bloquear ni leer antes los productos
+            with transaction.atomic():
+                ahora = timezone.now()
+                eliminados = self.filter(eliminado_en__isnull=True).update(
+                    eliminado_en=ahora, version=models.F('version') + 1
+                )
+                if eliminados:
+                    retirar(Producto._base_manager.filter(eliminado_en=ahora))
+        else:
+            eliminados = self.update(eliminado_en=timezone.now(), version=models.F('version') + 1)
+        if eliminados:
+            # Borrar una categoría oculta todos sus productos: se invalida la caché completa
+            invalidar_productos()
+        return eliminados
+
+
+class CategoriaManager(models.Manager.from_queryset(EliminablesQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(eliminado_en__isnull=True)
+
+
+class ProductoManager(models.Manager.from_queryset(EliminablesQuerySet)):
+    # Los productos de una categoría eliminada quedan ocultos sin tener que marcarlos uno a uno
+    def get_queryset(self):
+        return super().get_queryset().filter(eliminado_en__isnull=True, categoria__eliminado_en__isnull=True)
+
+
+class InventarioManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(
+            producto__eliminado_en__isnull=True, producto__categoria__eliminado_en__isnull=True
+        )
+
 
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100)
+    eliminado_en = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Control de concurrencia optimista: se expone como ETag y se compara con If-Match
+    version = models.PositiveIntegerField(default=1)
+
+    objects = CategoriaManager()
+    todos = models.Manager()
 
     def __str__(self):
         return self.nombre
@@ -12,34 +66,318 @@ class Producto(models.Model):
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='productos')
     stock = models.IntegerField(default=0)
+    # Código del proveedor (SKU); clave de las importaciones masivas
+    codigo = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    eliminado_en = models.DateTimeField(null=True, blank=True, db_index=True)
+    version = models.PositiveIntegerField(default=1)
+
+    objects = ProductoManager()
+    todos = models.Manager()
 
     def __str__(self):
         return self.nombre
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        from .valoracion import CAMPOS
+
+        instancia = super().from_db(db, field_names, values)
+        # Valores leídos de las columnas de la valoración: el punto de partida de la próxima
+        # escritura de esta instancia, sin volver a leer la fila al guardar
+        if all(campo in instancia.__dict__ for campo in CAMPOS):
+            instancia._valoracion_leida = {campo: instancia.__dict__[campo] for campo in CAMPOS}
+        return instancia
+
+    def save(self, *args, **kwargs):
+        """
+        Guarda y aplica a la valoración la diferencia con los valores leídos de la base de
+        datos (from_db), sin bloquear ni releer la fila. Las ediciones por la API reclaman
+        antes la versión, así que esos valores son los vigentes; solo una instancia creada
+        a mano con pk, sin leerla, obliga a una consulta.
+        """
+        from .valoracion import CAMPOS, registrar_cambios
+
+        update_fields = kwargs.get('update_fields')
+        guardados = set(CAMPOS) if update_fields is None else {
+            self._meta.get_field(nombre).attname for nombre in update_fields
+        }
+        if not guardados & set(CAMPOS):
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            anterior = None
+            if not self._state.adding:
+                anterior = getattr(self, '_valoracion_leida', None)
+                if anterior is None:
+                    anterior = Producto._base_manager.select_for_update().filter(pk=self.pk).values(*CAMPOS).first()
+            super().save(*args, **kwargs)
+            # Las columnas que no se guardan conservan el valor que tienen en la base de datos
+            nuevo = {
+                campo: getattr(self, campo) if campo in guardados or anterior is None else anterior[campo]
+                for campo in CAMPOS
+            }
+            registrar_cambios([(anterior, nuevo)])
+            self._valoracion_leida = nuevo
+
+class ValoracionCategoria(models.Model):
+    """
+    Valor del stock (precio × stock) de los productos no eliminados de una categoría,
+    mantenido por productos/valoracion.py en la misma transacción que cada escritura.
+    """
+    categoria = models.OneToOneField(Categoria, on_delete=models.CASCADE, primary_key=True, related_name='valoracion')
+    valor = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    unidades = models.BigIntegerField(default=0)
+    productos = models.IntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.categoria_id} - {self.valor}"
+
+# Columnas de Inventario que determinan su efecto en el stock y en los acumulados
+CAMPOS_MOVIMIENTO = ('producto_id', 'categoria_id', 'tipo', 'cantidad')
+
 class Inventario(models.Model):
     tipo = models.CharField(max_length=10, choices=[('entrada', 'Entrada'), ('salida', 'Salida')])
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    # Categoría del producto en el momento del movimiento: la que usan los acumulados
+    # diarios al registrarlo y al reconstruirlos. Nula en los movimientos anteriores a ella.
+    categoria = models.ForeignKey(
+        Categoria, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_inventario'
+    )
     cantidad = models.IntegerField(default=0)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+    # Fecha inmutable del movimiento; fecha_actualizacion cambia con cada edición
+    fecha_creacion = models.DateTimeField(auto_now_add=True, db_index=True)
+    version = models.PositiveIntegerField(default=1)
+
+    objects = InventarioManager()
+    todos = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha_creacion']),
+        ]
 
     def __str__(self):
         return f"{self.producto.nombre} - {self.cantidad} - {self.tipo} - {self.fecha_actualizacion.strftime('%d-%m-%Y %H:%M')}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Movimiento tal como está guardado: al editarlo, save aplica al stock la diferencia
+        # con él sin volver a leer la fila
+        if all(campo in instancia.__dict__ for campo in CAMPOS_MOVIMIENTO):
+            instancia._guardado = {campo: instancia.__dict__[campo] for campo in CAMPOS_MOVIMIENTO}
+        return instancia
+
+    @staticmethod
+    def efecto(tipo, cantidad):
+        """Cambio que un movimiento produce en el stock de su producto."""
+        return cantidad if tipo == 'entrada' else -cantidad
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            anterior = Inventario.objects.get(pk=self.pk)
-            if anterior.tipo == 'entrada':
-                self.producto.stock += anterior.cantidad
-            elif anterior.tipo == 'salida':
-                self.producto.stock -= anterior.cantidad
-
-        if self.pk is None:
-            if self.tipo == 'entrada':
-                self.producto.stock += self.cantidad
-            elif self.tipo == 'salida':
-                if self.producto.stock >= self.cantidad:
-                    self.producto.stock -= self.cantidad
-                else:
-                    raise ValueError("Stock insuficiente para realizar la salida.")
-        self.producto.save()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        """
+        Guarda el movimiento y aplica al stock su efecto con un UPDATE relativo. Al editar,
+        el efecto es la diferencia con el movimiento leído de la base de datos (from_db):
+        las ediciones por la API reclaman antes la versión, así que es el vigente; solo
+        una instancia creada a mano con pk, sin leerla, obliga a una consulta.
+        """
+        from .eventos import notificar_cambio_stock
+        from .rollups import registrar_movimiento
+        from .snapshots import rehacer_snapshots
+
+        with transaction.atomic():
+            anterior = None
+            if not self._state.adding:
+                anterior = getattr(self, '_guardado', None)
+                if anterior is None:
+                    anterior = Inventario._base_manager.filter(pk=self.pk).values(*CAMPOS_MOVIMIENTO).first()
+
+            mismo_producto = anterior is not None and anterior['producto_id'] == self.producto_id
+            diferencia = self.efecto(self.tipo, self.cantidad)
+            if mismo_producto:
+                diferencia -= self.efecto(anterior['tipo'], anterior['cantidad'])
+            if diferencia < 0 and self.producto.stock < -diferencia:
+                raise ValueError("Stock insuficiente para realizar la salida.")
+            if anterior is not None and not mismo_producto:
+                # El movimiento pasa a otro producto: se deshace en el anterior
+                producto_anterior = Producto._base_manager.get(pk=anterior['producto_id'])
+                self._ajustar_stock(producto_anterior, -self.efecto(anterior['tipo'], anterior['cantidad']))
+            stock_anterior = self.producto.stock
+            self._ajustar_stock(self.producto, diferencia)
+
+            if anterior is None or not mismo_producto:
+                self.categoria_id = self.producto.categoria_id
+            super().save(*args, **kwargs)
+            self._guardado = {campo: getattr(self, campo) for campo in CAMPOS_MOVIMIENTO}
+
+            fecha = timezone.localtime(self.fecha_creacion).date()
+            if anterior is not None:
+                registrar_movimiento(anterior['producto_id'], anterior['categoria_id'], fecha,
+                                     anterior['tipo'], -anterior['cantidad'], -1)
+            registrar_movimiento(self.producto_id, self.categoria_id, fecha, self.tipo, self.cantidad)
+            if anterior is not None:
+                # Los snapshots desde el día del movimiento ya no reflejan la edición
+                rehacer_snapshots({anterior['producto_id'], self.producto_id}, fecha)
+            notificar_cambio_stock(self.producto, stock_anterior)
+
+    @staticmethod
+    def _ajustar_stock(producto, diferencia):
+        """
+        Suma `diferencia` al stock con un solo UPDATE relativo, junto con la versión, sin
+        bloquear ni releer el producto: el resto del producto pudo cambiar desde que se
+        leyó, así que la valoración toma precio y categoría de la fila (registrar_stock).
+        El stock es parte de la representación, así que el ETag anterior deja de valer.
+        """
+        from .cache import invalidar_productos
+        from .valoracion import registrar_stock
+
+        if not diferencia:
+            return
+        filas = Producto._base_manager.filter(pk=producto.pk)
+        if diferencia < 0:
+            # El stock en memoria puede ir por detrás de otra salida concurrente
+            filas = filas.filter(stock__gte=-diferencia)
+        if not filas.update(stock=models.F('stock') + diferencia, version=models.F('version') + 1):
+            raise ValueError("Stock insuficiente para realizar la salida.")
+        producto.stock += diferencia
+        producto.__dict__.pop('version', None)  # diferida: se vuelve a leer solo si se usa
+        registrar_stock(producto.pk, diferencia)
+        if getattr(producto, '_valoracion_leida', None) is not None:
+            producto._valoracion_leida['stock'] = producto.stock
+        invalidar_productos([producto.pk])
+
+class InventarioArchivado(models.Model):
+    """
+    Movimientos sacados de Inventario por `manage.py archive_inventory` al superar la
+    retención. En PostgreSQL la tabla está particionada por mes de fecha_creacion (ver
+    la migración 0012); en SQLite es una tabla normal. Conserva el id original.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    tipo = models.CharField(max_length=10, choices=[('entrada', 'Entrada'), ('salida', 'Salida')])
+    # Sin restricción en la base de datos para no encarecer las escrituras del archivo;
+    # purge_deleted borra estas filas junto con el producto
+    producto = models.ForeignKey(
+        Producto, on_delete=models.CASCADE, db_constraint=False, related_name='movimientos_archivados'
+    )
+    cantidad = models.IntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField()
+    fecha_creacion = models.DateTimeField()
+    archivado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha_creacion']),
+            models.Index(fields=['fecha_creacion']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} - {self.cantidad} - {self.tipo} - {self.fecha_creacion:%d-%m-%Y %H:%M} (archivado)"
+
+class MesArchivado(models.Model):
+    """Registro de cada mes archivado: hasta qué instante y dónde quedaron sus movimientos."""
+    mes = models.DateField()
+    # 'tabla' (InventarioArchivado) o la ruta del NDJSON comprimido
+    destino = models.CharField(max_length=255)
+    filas = models.IntegerField(default=0)
+    hasta = models.DateTimeField()
+    archivado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mes', 'destino'], name='mes_archivado_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m} - {self.destino} - {self.filas}"
+
+class StockDiario(models.Model):
+    """Stock acumulado de un producto al cierre de un día con movimientos."""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='stock_diario')
+    fecha = models.DateField()
+    stock = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha'], name='stock_diario_producto_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} - {self.fecha} - {self.stock}"
+
+class MovimientoDiario(models.Model):
+    """Acumulado diario de movimientos por producto y tipo, base de las analíticas."""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos_diarios')
+    # Categoría del primer movimiento del día (Inventario.categoria), para agrupar sin unir con Producto
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='movimientos_diarios')
+    fecha = models.DateField()
+    tipo = models.CharField(max_length=10, choices=[('entrada', 'Entrada'), ('salida', 'Salida')])
+    cantidad = models.IntegerField(default=0)
+    movimientos = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'fecha', 'tipo'], name='movimiento_diario_producto_fecha_tipo'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha', 'categoria']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} - {self.fecha} - {self.tipo} - {self.cantidad}"
+
+class PronosticoStock(models.Model):
+    """Demanda estimada y punto de reorden de un producto, calculados por lotes."""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='pronostico')
+    demanda_diaria = models.FloatField(default=0)
+    desviacion_diaria = models.FloatField(default=0)
+    dias_para_agotarse = models.FloatField(null=True)
+    punto_reorden = models.IntegerField(default=0)
+    calculado_en = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.producto_id} - Reorden: {self.punto_reorden}"
+
+class MovimientoPendiente(models.Model):
+    """Movimiento recibido en modo de escritura diferida, a la espera de que lo aplique el worker."""
+    ESTADOS = [('pendiente', 'Pendiente'), ('aplicado', 'Aplicado'), ('rechazado', 'Rechazado')]
+
+    ticket = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    tipo = models.CharField(max_length=10, choices=[('entrada', 'Entrada'), ('salida', 'Salida')])
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos_pendientes')
+    cantidad = models.IntegerField(default=0)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
+    error = models.TextField(null=True, blank=True)
+    inventario = models.ForeignKey(Inventario, on_delete=models.SET_NULL, null=True, blank=True)
+    recibido_en = models.DateTimeField(auto_now_add=True)
+    procesado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.ticket} - {self.tipo} - {self.cantidad} - {self.estado}"
+
+class RegistroAuditoria(models.Model):
+    """Alta, modificación o baja de un objeto con el diff de sus campos."""
+    ACCIONES = [('crear', 'Crear'), ('actualizar', 'Actualizar'), ('eliminar', 'Eliminar')]
+
+    fecha = models.DateTimeField(db_index=True)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    # Se conserva aunque el usuario se borre
+    usuario_nombre = models.CharField(max_length=150, blank=True)
+    accion = models.CharField(max_length=10, choices=ACCIONES)
+    modelo = models.CharField(max_length=100)
+    objeto_id = models.CharField(max_length=64)
+    # {campo: [valor anterior, valor nuevo]}
+    cambios = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id', 'fecha']),
+            models.Index(fields=['usuario', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha:%d-%m-%Y %H:%M} - {self.usuario_nombre} - {self.accion} {self.modelo} {self.objeto_id}"
@@ -0,0 +1,175 @@
+"""
+Maquetación de reportes tabulares en PDF sin estado compartido, para poder repartir el
+trabajo entre procesos: cada trozo de filas se convierte en los content streams de sus
+páginas y EscritorPDF los une, en orden, en un único documento que se emite a medida
+que llegan. Este módulo no importa Django para que los procesos hijos arranquen rápido.
+"""
+import zlib
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+ANCHO_PAGINA, ALTO_PAGINA = letter
+MARGEN = 36
+ALTO_TITULO = 28
+ALTO_FILA = 16
+TAMANO_FUENTE = 9
+RELLENO = 4
+FILAS_POR_PAGINA = int((ALTO_PAGINA - 2 * MARGEN - ALTO_TITULO - ALTO_FILA - 14) // ALTO_FILA)
+ELIPSIS = '…'
+# F1 y F2 son las fuentes estándar que todo lector trae, sin incrustar
+FUENTES = {'F1': 'Helvetica', 'F2': 'Helvetica-Bold'}
+
+
+class _Anchos(dict):
+    """Ancho de cada carácter en puntos para un tamaño de fuente 1, medido una sola vez."""
+
+    def __init__(self, fuente):
+        super().__init__()
+        self.fuente = fuente
+        self.maximo = max(self[chr(codigo)] for codigo in range(32, 256))
+
+    def __missing__(self, caracter):
+        ancho = self[caracter] = stringWidth(caracter, self.fuente, 1)
+        return ancho
+
+
+_ANCHOS = {fuente: _Anchos(fuente) for fuente in FUENTES.values()}
+
+
+def ancho_texto(texto, fuente='Helvetica', tamano=TAMANO_FUENTE):
+    anchos = _ANCHOS[fuente]
+    return sum(map(anchos.__getitem__, texto)) * tamano
+
+
+def truncar(texto, ancho, fuente='Helvetica', tamano=TAMANO_FUENTE):
+    """`texto` recortado con '…' para que ocupe como mucho `ancho` puntos."""
+    # La mayoría de las celdas son cortas: si ni con el carácter más ancho se pasan, no se miden
+    if len(texto) * _ANCHOS[fuente].maximo * tamano <= ancho or ancho_texto(texto, fuente, tamano) <= ancho:
+        return texto
+    disponible = ancho - ancho_texto(ELIPSIS, fuente, tamano)
+    anchos = _ANCHOS[fuente]
+    acumulado = 0
+    for indice, caracter in enumerate(texto):
+        acumulado += anchos[caracter] * tamano
+        if acumulado > disponible:
+            return texto[:indice].rstrip() + ELIPSIS
+    return texto
+
+
+def _literal(texto):
+    codificado = texto.encode('cp1252', errors='replace')
+    return b'(' + codificado.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _texto(operaciones, fuente, x, y, texto):
+    operaciones.append(b'BT /%s %d Tf %.2f %.2f Td %s Tj ET' % (
+        fuente.encode(), TAMANO_FUENTE, x, y, _literal(texto)
+    ))
+
+
+def _celdas(operaciones, columnas, valores, y, fuente):
+    x = MARGEN
+    nombre_fuente = FUENTES[fuente]
+    for (_, ancho, alineacion), valor in zip(columnas, valores):
+        texto = truncar(str(valor), ancho - 2 * RELLENO, nombre_fuente)
+        if alineacion == 'derecha':
+            posicion = x + ancho - RELLENO - ancho_texto(texto, nombre_fuente)
+        else:
+            posicion = x + RELLENO
+        _texto(operaciones, fuente, posicion, y + 5, texto)
+        x += ancho
+
+
+def pagina(titulo, columnas, filas, numero):
+    """Content stream (sin comprimir) de una página con el título, la cabecera y `filas`."""
+    ancho_tabla = sum(ancho for _, ancho, _ in columnas)
+    operaciones = []
+    y = ALTO_PAGINA - MARGEN - 14
+    operaciones.append(b'BT /F2 14 Tf %.2f %.2f Td %s Tj ET' % (MARGEN, y, _literal(titulo)))
+    _texto(operaciones, 'F1', ANCHO_PAGINA - MARGEN - 60, y, f"Página {numero}")
+
+    y -= ALTO_TITULO
+    operaciones.append(b'0.85 g %.2f %.2f %.2f %d re f 0 g' % (MARGEN, y, ancho_tabla, ALTO_FILA))
+    _celdas(operaciones, columnas, [nombre for nombre, _, _ in columnas], y, 'F2')
+    for indice, fila in enumerate(filas):
+        y -= ALTO_FILA
+        if indice % 2:
+            operaciones.append(b'0.95 g %.2f %.2f %.2f %d re f 0 g' % (MARGEN, y, ancho_tabla, ALTO_FILA))
+        _celdas(operaciones, columnas, fila, y, 'F1')
+    # Marco de la tabla y separadores de columna
+    alto_tabla = ALTO_PAGINA - MARGEN - 14 - ALTO_TITULO + ALTO_FILA - y
+    operaciones.append(b'0.5 w %.2f %.2f %.2f %.2f re S' % (MARGEN, y, ancho_tabla, alto_tabla))
+    x = MARGEN
+    for _, ancho, _ in columnas[:-1]:
+        x += ancho
+        operaciones.append(b'%.2f %.2f m %.2f %.2f l S' % (x, y, x, y + alto_tabla))
+    return b'\n'.join(operaciones)
+
+
+def renderizar_trozo(titulo, columnas, filas, primera_pagina, filas_por_pagina=FILAS_POR_PAGINA):
+    """Content streams comprimidos de las páginas de `filas`, numeradas desde `primera_pagina`."""
+    return [
+        zlib.compress(pagina(titulo, columnas, filas[inicio:inicio + filas_por_pagina], primera_pagina + n))
+        for n, inicio in enumerate(range(0, max(len(filas), 1), filas_por_pagina))
+    ]
+
+
+class EscritorPDF:
+    """
+    Escribe un PDF incrementalmente: la cabecera, cada página en cuanto se tiene su
+    content stream y, al final, el árbol de páginas y la tabla xref. Solo guarda en
+    memoria los desplazamientos de los objetos.
+    """
+    CATALOGO, PAGINAS = 1, 2
+
+    def __init__(self):
+        self._posicion = 0
+        self._desplazamientos = {}
+        self._siguiente = 3 + len(FUENTES)
+        self._paginas = []
+
+    def _emitir(self, datos):
+        self._posicion += len(datos)
+        return datos
+
+    def _objeto(self, numero, cuerpo):
+        self._desplazamientos[numero] = self._posicion
+        return self._emitir(b'%d 0 obj\n%s\nendobj\n' % (numero, cuerpo))
+
+    def cabecera(self):
+        partes = [
+            self._emitir(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'),
+            self._objeto(self.CATALOGO, b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGINAS),
+        ]
+        for numero, fuente in enumerate(FUENTES.values(), start=3):
+            partes.append(self._objeto(
+                numero, b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % fuente.encode()
+            ))
+        return b''.join(partes)
+
+    def pagina(self, contenido):
+        contenido_id, pagina_id = self._siguiente, self._siguiente + 1
+        self._siguiente += 2
+        self._paginas.append(pagina_id)
+        fuentes = b' '.join(b'/%s %d 0 R' % (nombre.encode(), numero) for numero, nombre in enumerate(FUENTES, start=3))
+        return self._objeto(
+            contenido_id,
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(contenido), contenido),
+        ) + self._objeto(
+            pagina_id,
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources << /Font << %s >> >> /Contents %d 0 R >>'
+            % (self.PAGINAS, ANCHO_PAGINA, ALTO_PAGINA, fuentes, contenido_id),
+        )
+
+    def cierre(self):
+        hijos = b' '.join(b'%d 0 R' % numero for numero in self._paginas)
+        partes = [self._objeto(
+            self.PAGINAS, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (hijos, len(self._paginas))
+        )]
+        inicio_xref = self._posicion
+        partes.append(b'xref\n0 %d\n0000000000 65535 f \n' % self._siguiente)
+        partes.extend(b'%010d 00000 n \n' % self._desplazamientos[numero] for numero in range(1, self._siguiente))
+        partes.append(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                      % (self._siguiente, self.CATALOGO, inicio_xref))
+        return b''.join(partes)
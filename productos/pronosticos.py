@@ -0,0 +1,99 @@
+import datetime
+import logging
+import math
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import MovimientoDiario, Producto, PronosticoStock
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 5000
+
+
+def filtro_bajo_stock():
+    """
+    Productos en o por debajo de su punto de reorden, o del umbral fijo si no tienen
+    pronóstico o su demanda estimada es cero (su punto de reorden también lo es).
+    """
+    return Q(pronostico__demanda_diaria__gt=0, pronostico__punto_reorden__gte=F('stock')) | (
+        (Q(pronostico__isnull=True) | Q(pronostico__demanda_diaria__lte=0))
+        & Q(stock__lte=settings.STOCK_BAJO_UMBRAL)
+    )
+
+
+def _calcular_lote(np, ids, stock, inicio, hoy, ventana, plazo, factor):
+    """Demanda, días para agotarse y punto de reorden de un lote de productos ordenado por id."""
+    salidas = MovimientoDiario.objects.filter(
+        tipo='salida', fecha__gte=inicio, fecha__lt=hoy,
+        producto_id__gte=int(ids[0]), producto_id__lte=int(ids[-1]),
+    ).values_list('producto_id', 'fecha', 'cantidad')
+
+    demanda = np.zeros((len(ids), ventana))
+    filas = list(salidas)
+    if filas:
+        producto_ids, fechas, cantidades = zip(*filas)
+        producto_ids = np.array(producto_ids, dtype=np.int64)
+        posicion = np.searchsorted(ids, producto_ids)
+        dia = (np.array(fechas, dtype='datetime64[D]') - np.datetime64(inicio, 'D')).astype(np.int64)
+        # Los ids que no pertenecen al lote (p. ej. productos eliminados) se descartan
+        validos = (posicion < len(ids)) & (ids[np.minimum(posicion, len(ids) - 1)] == producto_ids)
+        np.add.at(demanda, (posicion[validos], dia[validos]), np.array(cantidades, dtype=np.float64)[validos])
+
+    media = demanda.mean(axis=1)
+    desviacion = demanda.std(axis=1)
+    punto_reorden = np.ceil(media * plazo + factor * desviacion * math.sqrt(plazo)).astype(np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dias = np.where(media > 0, np.maximum(stock, 0) / media, np.nan)
+    return media, desviacion, dias, punto_reorden
+
+
+def calcular_pronosticos(ventana=None, plazo=None, factor=None, hoy=None, tamano_lote=TAMANO_LOTE):
+    """
+    Recalcula el pronóstico de todo el catálogo a partir de las salidas diarias de los
+    últimos `ventana` días. Cada lote de productos se resuelve con operaciones vectoriales.
+    """
+    import numpy as np
+
+    ventana = ventana or settings.PRONOSTICO_VENTANA_DIAS
+    plazo = plazo or settings.PRONOSTICO_PLAZO_ENTREGA_DIAS
+    factor = settings.PRONOSTICO_FACTOR_SEGURIDAD if factor is None else factor
+    hoy = hoy or timezone.localdate()
+    inicio = hoy - datetime.timedelta(days=ventana)
+    ahora = timezone.now()
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Producto.objects.filter(id__gt=ultimo_id).order_by('id').values_list('id', 'stock')[:tamano_lote]
+        )
+        if not lote:
+            break
+        ids = np.array([fila[0] for fila in lote], dtype=np.int64)
+        stock = np.array([fila[1] for fila in lote], dtype=np.float64)
+        media, desviacion, dias, punto_reorden = _calcular_lote(np, ids, stock, inicio, hoy, ventana, plazo, factor)
+
+        PronosticoStock.objects.bulk_create(
+            [
+                PronosticoStock(
+                    producto_id=int(ids[i]),
+                    demanda_diaria=float(media[i]),
+                    desviacion_diaria=float(desviacion[i]),
+                    dias_para_agotarse=None if np.isnan(dias[i]) else float(dias[i]),
+                    punto_reorden=int(punto_reorden[i]),
+                    calculado_en=ahora,
+                )
+                for i in range(len(ids))
+            ],
+            update_conflicts=True,
+            unique_fields=['producto'],
+            update_fields=['demanda_diaria', 'desviacion_diaria', 'dias_para_agotarse', 'punto_reorden', 'calculado_en'],
+        )
+        total += len(ids)
+        ultimo_id = int(ids[-1])
+
+    logger.info(f"Pronósticos de stock calculados - Productos: {total}, Ventana: {ventana} días, Plazo: {plazo} días")
+    return total
@@ -0,0 +1,60 @@
+import logging
+import time
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Categoria, Producto
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 1000
+
+
+def _dependientes(modelo):
+    """Relaciones inversas que el borrado de `modelo` debe resolver (CASCADE o SET_NULL)."""
+    return [
+        relacion for relacion in modelo._meta.related_objects
+        if relacion.on_delete in (models.CASCADE, models.SET_NULL)
+    ]
+
+
+def _purgar(modelo, queryset, lote, pausa):
+    """
+    Borra las filas de `queryset` y, antes, las que dependen de ellas, en lotes de
+    `lote` filas. Cada lote es una transacción corta con DELETE directos, sin cargar
+    objetos ni lanzar señales, así que los bloqueos duran lo que tarda un lote.
+    """
+    total = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:lote])
+        if not ids:
+            return total
+        for relacion in _dependientes(modelo):
+            hijos = relacion.related_model._base_manager.filter(**{f"{relacion.field.name}__in": ids})
+            if relacion.on_delete is models.SET_NULL:
+                hijos.update(**{relacion.field.name: None})
+            else:
+                total += _purgar(relacion.related_model, hijos, lote, pausa)
+        with transaction.atomic():
+            total += modelo._base_manager.filter(pk__in=ids)._raw_delete(modelo._base_manager.db)
+        if pausa:
+            # Deja respirar a las escrituras concurrentes entre lotes
+            time.sleep(pausa)
+
+
+def purgar_eliminados(antiguedad=None, lote=TAMANO_LOTE, pausa=0):
+    """
+    Borra físicamente los productos y categorías eliminados lógicamente hace más de
+    `antiguedad` (timedelta), con todo lo que depende de ellos. Devuelve las filas borradas.
+    """
+    limite = timezone.now() - antiguedad if antiguedad else timezone.now()
+    productos = _purgar(
+        Producto, Producto._base_manager.filter(eliminado_en__lte=limite), lote, pausa
+    )
+    categorias = _purgar(
+        Categoria, Categoria._base_manager.filter(eliminado_en__lte=limite), lote, pausa
+    )
+    logger.warning(f"Purga de eliminados - Filas borradas por productos: {productos}, por categorías: {categorias}")
+    return productos + categorias
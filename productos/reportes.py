@@ -0,0 +1,127 @@
+import atexit
+import collections
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .pdf import FILAS_POR_PAGINA, EscritorPDF, renderizar_trozo
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _procesos():
+    return settings.REPORTES_PDF_PROCESOS or os.cpu_count() or 1
+
+
+def _pool_de_procesos():
+    """
+    Pool compartido por las peticiones del worker; 'spawn' evita heredar conexiones e
+    hilos. Se cierra al salir el proceso (atexit y el worker_exit de gunicorn.conf.py).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(_procesos(), mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(cerrar_pool)
+        return _pool
+
+
+def cerrar_pool():
+    """Termina los procesos del pool, si se llegó a crear, cancelando los trozos pendientes."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+        logger.info("Pool de procesos de los reportes PDF cerrado")
+
+
+def _trozos(filas, tamano):
+    trozo = []
+    for fila in filas:
+        trozo.append(fila)
+        if len(trozo) == tamano:
+            yield trozo
+            trozo = []
+    if trozo:
+        yield trozo
+
+
+def paginas_pdf(titulo, columnas, filas):
+    """
+    Content streams de las páginas en orden. Las filas se agrupan en trozos de
+    REPORTES_PDF_PAGINAS_POR_TROZO páginas que se maquetan en paralelo, con como mucho
+    dos trozos por proceso en vuelo, así que la memoria no depende del total de filas.
+    Un reporte que cabe en un trozo, o REPORTES_PDF_PROCESOS = 1, se maqueta aquí mismo.
+    """
+    paginas_por_trozo = settings.REPORTES_PDF_PAGINAS_POR_TROZO
+    trozos = _trozos(filas, FILAS_POR_PAGINA * paginas_por_trozo)
+    primeros = list(itertools.islice(trozos, 2))
+    if not primeros:
+        # Reporte vacío: una página con la cabecera de la tabla
+        yield from renderizar_trozo(titulo, columnas, [], 1)
+        return
+
+    paralelo = len(primeros) > 1 and _procesos() > 1
+    pool = _pool_de_procesos() if paralelo else None
+    en_vuelo = collections.deque()
+    for indice, trozo in enumerate(itertools.chain(primeros, trozos)):
+        primera_pagina = 1 + indice * paginas_por_trozo
+        if not paralelo:
+            yield from renderizar_trozo(titulo, columnas, trozo, primera_pagina)
+            continue
+        if len(en_vuelo) >= 2 * _procesos():
+            yield from en_vuelo.popleft().result()
+        en_vuelo.append(pool.submit(renderizar_trozo, titulo, columnas, trozo, primera_pagina))
+    while en_vuelo:
+        yield from en_vuelo.popleft().result()
+
+
+def reporte_pdf(titulo, columnas, filas):
+    """Bytes del PDF a medida que se generan las páginas."""
+    escritor = EscritorPDF()
+    yield escritor.cabecera()
+    for contenido in paginas_pdf(titulo, columnas, filas):
+        yield escritor.pagina(contenido)
+    yield escritor.cierre()
+
+
+def respuesta_pdf(titulo, columnas, filas, nombre_archivo, al_terminar=None, al_fallar=None):
+    """
+    StreamingHttpResponse con el reporte; `filas` debe ser un iterable perezoso
+    (QuerySet.iterator()) de tuplas ya formateadas. `al_terminar(total)` se llama con el
+    número de filas emitidas, sin volver a consultar la base de datos. Los errores al
+    maquetar ocurren ya fuera de la vista, mientras se envía: se pasan a `al_fallar(error)`
+    (o se registran aquí) y el envío se corta.
+    """
+    contador = [0]
+
+    def contar(iterable):
+        for fila in iterable:
+            contador[0] += 1
+            yield fila
+
+    def contenido():
+        try:
+            yield from reporte_pdf(titulo, columnas, contar(filas))
+        except Exception as e:
+            if al_fallar is not None:
+                al_fallar(e)
+            else:
+                logger.error(f"Error al generar PDF - Archivo: {nombre_archivo}, Filas: {contador[0]}, Error: {str(e)}")
+            raise
+        if al_terminar is not None:
+            al_terminar(contador[0])
+
+    response = StreamingHttpResponse(contenido(), content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{nombre_archivo}"'
+    return response
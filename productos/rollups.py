@@ -0,0 +1,153 @@
+import datetime
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Inventario, MovimientoDiario
+from .snapshots import inicio_dia
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 1000
+
+INTERVALOS = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+AGRUPACIONES = {
+    'producto': ('producto_id', 'producto__nombre'),
+    'categoria': ('categoria_id', 'categoria__nombre'),
+    'total': (),
+}
+
+
+def registrar_movimiento(producto_id, categoria_id, fecha, tipo, cantidad, movimientos=1):
+    """
+    Suma un movimiento (o lo resta, con valores negativos) al acumulado de su día. La
+    fila del día conserva la categoría del primer movimiento que la crea.
+    """
+    filtro = MovimientoDiario.objects.filter(producto_id=producto_id, fecha=fecha, tipo=tipo)
+    incremento = {'cantidad': F('cantidad') + cantidad, 'movimientos': F('movimientos') + movimientos}
+    if filtro.update(**incremento):
+        return
+    try:
+        with transaction.atomic():
+            MovimientoDiario.objects.create(
+                producto_id=producto_id, categoria_id=categoria_id, fecha=fecha,
+                tipo=tipo, cantidad=cantidad, movimientos=movimientos,
+            )
+    except IntegrityError:
+        # Otra petición creó la fila del día entre el UPDATE y el INSERT
+        filtro.update(**incremento)
+
+
+def descontar_movimiento(movimiento):
+    """Quita del acumulado de su día un movimiento eliminado."""
+    MovimientoDiario.objects.filter(
+        producto_id=movimiento.producto_id, tipo=movimiento.tipo,
+        fecha=timezone.localtime(movimiento.fecha_creacion).date(),
+    ).update(cantidad=F('cantidad') - movimiento.cantidad, movimientos=F('movimientos') - 1)
+
+
+def reconstruir_rollups(desde=None, hasta=None):
+    """
+    Recalcula desde Inventario los acumulados de los días en [desde, hasta]. Los días
+    ya archivados (anteriores al horizonte del archivo) no se tocan: sus movimientos
+    ya no están en Inventario. Como registrar_movimiento, cada día toma la categoría de
+    su primer movimiento; la actual del producto solo si el movimiento no la guardó.
+    """
+    from .archivo import horizonte_archivo
+
+    horizonte = horizonte_archivo()
+    if horizonte is not None and (desde is None or desde < horizonte):
+        desde = horizonte
+    movimientos = Inventario.objects.all()
+    acumulados = MovimientoDiario.objects.all()
+    if desde:
+        movimientos = movimientos.filter(fecha_creacion__gte=inicio_dia(desde))
+        acumulados = acumulados.filter(fecha__gte=desde)
+    if hasta:
+        movimientos = movimientos.filter(fecha_creacion__lt=inicio_dia(hasta + datetime.timedelta(days=1)))
+        acumulados = acumulados.filter(fecha__lte=hasta)
+
+    por_dia = movimientos.annotate(
+        dia=TruncDate('fecha_creacion'), categoria_movimiento=Coalesce('categoria_id', 'producto__categoria_id'),
+    ).values('producto_id', 'dia', 'tipo', 'categoria_movimiento') \
+        .annotate(total=Sum('cantidad'), n=Count('id'), primero=Min('id')) \
+        .order_by('producto_id', 'dia', 'tipo', 'primero')
+
+    total = 0
+    with transaction.atomic():
+        acumulados.delete()
+        lote = []
+        for fila in por_dia.iterator(chunk_size=TAMANO_LOTE):
+            clave = (fila['producto_id'], fila['dia'], fila['tipo'])
+            if lote and (lote[-1].producto_id, lote[-1].fecha, lote[-1].tipo) == clave:
+                # El producto cambió de categoría ese día: la fila se queda con la primera
+                lote[-1].cantidad += fila['total']
+                lote[-1].movimientos += fila['n']
+                continue
+            if len(lote) >= TAMANO_LOTE:
+                MovimientoDiario.objects.bulk_create(lote)
+                total += len(lote)
+                lote = []
+            lote.append(MovimientoDiario(
+                producto_id=fila['producto_id'], categoria_id=fila['categoria_movimiento'],
+                fecha=fila['dia'], tipo=fila['tipo'], cantidad=fila['total'], movimientos=fila['n'],
+            ))
+        if lote:
+            MovimientoDiario.objects.bulk_create(lote)
+            total += len(lote)
+
+    logger.info(f"Acumulados de movimientos reconstruidos - Desde: {desde}, Hasta: {hasta}, Filas: {total}")
+    return total
+
+
+def serie_movimientos(agrupar_por='categoria', intervalo='day', desde=None, hasta=None,
+                      tipo=None, producto_id=None, categoria_id=None):
+    """Serie temporal de entradas y salidas leída únicamente de los acumulados diarios."""
+    if intervalo not in INTERVALOS:
+        raise ValueError(f"Intervalo inválido: {intervalo}")
+    if agrupar_por not in AGRUPACIONES:
+        raise ValueError(f"Agrupación inválida: {agrupar_por}")
+
+    acumulados = MovimientoDiario.objects.all()
+    if desde:
+        acumulados = acumulados.filter(fecha__gte=desde)
+    if hasta:
+        acumulados = acumulados.filter(fecha__lte=hasta)
+    if tipo:
+        acumulados = acumulados.filter(tipo=tipo)
+    if producto_id:
+        acumulados = acumulados.filter(producto_id=producto_id)
+    if categoria_id:
+        acumulados = acumulados.filter(categoria_id=categoria_id)
+
+    truncar = INTERVALOS[intervalo]
+    periodo = truncar('fecha') if truncar else F('fecha')
+    campos = AGRUPACIONES[agrupar_por]
+
+    filas = acumulados.annotate(periodo=periodo).values('periodo', *campos).annotate(
+        entradas=Sum('cantidad', filter=Q(tipo='entrada'), default=0),
+        salidas=Sum('cantidad', filter=Q(tipo='salida'), default=0),
+        movimientos=Sum('movimientos'),
+    ).order_by('periodo', *campos)
+
+    resultado = []
+    for fila in filas:
+        punto = {
+            'periodo': fila['periodo'],
+            'entradas': fila['entradas'],
+            'salidas': fila['salidas'],
+            'movimientos': fila['movimientos'],
+        }
+        if campos:
+            punto['id'] = fila[campos[0]]
+            punto['nombre'] = fila[campos[1]]
+        resultado.append(punto)
+    return resultado
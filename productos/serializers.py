@@ -1,17 +1,34 @@
 from rest_framework import serializers
-from .models import Producto, Categoria, Inventario
+from .models import Producto, Categoria, Inventario, PronosticoStock, RegistroAuditoria
 
 class CategoriaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Categoria
-        fields = ['id', 'nombre']
+        fields = ['id', 'nombre', 'version']
+        read_only_fields = ['version']
 
 class ProductoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Producto
-        fields = ['id', 'nombre', 'descripcion', 'precio', 'stock', 'categoria']
+        fields = ['id', 'codigo', 'nombre', 'descripcion', 'precio', 'stock', 'categoria', 'version']
+        read_only_fields = ['version']
 
 class InventarioSerializer(serializers.ModelSerializer):
     class Meta:
         model = Inventario
-        fields = ['id', 'producto', 'cantidad', 'fecha_actualizacion', 'tipo']
+        fields = ['id', 'producto', 'cantidad', 'fecha_actualizacion', 'tipo', 'version']
+        read_only_fields = ['version']
+
+class PronosticoStockSerializer(serializers.ModelSerializer):
+    nombre = serializers.CharField(source='producto.nombre', read_only=True)
+    stock = serializers.IntegerField(source='producto.stock', read_only=True)
+
+    class Meta:
+        model = PronosticoStock
+        fields = ['producto', 'nombre', 'stock', 'demanda_diaria', 'desviacion_diaria',
+                  'dias_para_agotarse', 'punto_reorden', 'calculado_en']
+
+class RegistroAuditoriaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RegistroAuditoria
+        fields = ['id', 'fecha', 'usuario', 'usuario_nombre', 'accion', 'modelo', 'objeto_id', 'cambios']
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .cache import invalidar_catalogo, invalidar_productos
+from .models import Categoria, Inventario, Producto
+from .rollups import descontar_movimiento
+from .snapshots import rehacer_snapshots
+from .valoracion import CAMPOS, registrar_cambios
+
+@receiver(post_delete, sender=Inventario)
+def descontar_movimiento_eliminado(sender, instance, **kwargs):
+    descontar_movimiento(instance)
+    rehacer_snapshots([instance.producto_id], timezone.localtime(instance.fecha_creacion).date())
+
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_producto_en_cache(sender, instance, **kwargs):
+    invalidar_productos([instance.pk])
+
+@receiver(post_delete, sender=Producto)
+def retirar_producto_de_la_valoracion(sender, instance, **kwargs):
+    # Un borrado en cascada desde la categoría también se lleva su fila de valoración
+    registrar_cambios([({campo: getattr(instance, campo) for campo in CAMPOS}, None)], crear=False)
+
+@receiver([post_save, post_delete], sender=Categoria)
+def invalidar_catalogo_por_categoria(sender, instance, **kwargs):
+    # Las exportaciones toman el nombre de la categoría de la instantánea del catálogo
+    invalidar_catalogo()
@@ -0,0 +1,184 @@
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Inventario, InventarioArchivado, Producto, StockDiario
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 1000
+
+
+def delta_stock():
+    """Efecto de cada movimiento sobre el stock: suma las entradas y resta las salidas."""
+    return Case(
+        When(tipo='salida', then=-F('cantidad')),
+        default=F('cantidad'),
+        output_field=IntegerField(),
+    )
+
+
+def inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+def _ultimo_stock(producto_ids, antes_de):
+    """Stock del último snapshot anterior a `antes_de` para cada producto."""
+    ultima_fecha = StockDiario.objects.filter(
+        producto=OuterRef('producto'), fecha__lt=antes_de
+    ).order_by('-fecha').values('fecha')[:1]
+
+    resultado = {}
+    producto_ids = list(producto_ids)
+    for i in range(0, len(producto_ids), TAMANO_LOTE):
+        resultado.update(
+            StockDiario.objects.filter(
+                producto_id__in=producto_ids[i:i + TAMANO_LOTE],
+                fecha=Subquery(ultima_fecha),
+            ).values_list('producto_id', 'stock')
+        )
+    return resultado
+
+
+def _neto(modelo):
+    return Coalesce(Subquery(
+        modelo._base_manager.filter(producto=OuterRef('pk')).order_by().values('producto')
+        .annotate(neto=Sum(delta_stock())).values('neto')[:1]
+    ), Value(0))
+
+
+def stock_inicial(producto_ids):
+    """
+    Stock de apertura de cada producto: el actual menos el neto de todos sus movimientos,
+    también los archivados. Es el stock con que se creó o importó el producto (y cualquier
+    ajuste hecho sin movimiento), la base de quien aún no tiene snapshots anteriores.
+    """
+    resultado = {}
+    producto_ids = list(producto_ids)
+    for i in range(0, len(producto_ids), TAMANO_LOTE):
+        resultado.update(
+            Producto._base_manager.filter(pk__in=producto_ids[i:i + TAMANO_LOTE])
+            .annotate(apertura=F('stock') - _neto(Inventario) - _neto(InventarioArchivado))
+            .values_list('pk', 'apertura')
+        )
+    return resultado
+
+
+def _stock_base(producto_ids, antes_de):
+    """Stock de partida antes de `antes_de`: el último snapshot o, si no hay, el de apertura."""
+    producto_ids = list(producto_ids)
+    base = _ultimo_stock(producto_ids, antes_de)
+    sin_snapshot = [pk for pk in producto_ids if pk not in base]
+    if sin_snapshot:
+        base.update(stock_inicial(sin_snapshot))
+    return base
+
+
+def _generar(movimientos, acumulado):
+    """Guarda un snapshot por producto y día con movimientos, acumulando sobre `acumulado`."""
+    por_dia = movimientos.annotate(dia=TruncDate('fecha_creacion')).values('dia', 'producto_id') \
+        .annotate(neto=Sum(delta_stock())).order_by('dia', 'producto_id')
+
+    lote = []
+    total = 0
+    for fila in por_dia.iterator(chunk_size=TAMANO_LOTE):
+        producto_id = fila['producto_id']
+        acumulado[producto_id] = acumulado.get(producto_id, 0) + fila['neto']
+        lote.append(StockDiario(producto_id=producto_id, fecha=fila['dia'], stock=acumulado[producto_id]))
+        if len(lote) >= TAMANO_LOTE:
+            StockDiario.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        StockDiario.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+def construir_snapshots(hasta=None, reconstruir=False):
+    """
+    Genera los snapshots de los días cerrados que faltan, hasta `hasta` (por defecto ayer).
+
+    Solo se guarda una fila por producto y día con movimientos, así que el snapshot
+    más reciente de un producto anterior a un día siempre refleja su stock en ese día.
+    """
+    hasta = hasta or timezone.localdate() - datetime.timedelta(days=1)
+
+    from .archivo import horizonte_archivo
+
+    with transaction.atomic():
+        if reconstruir:
+            # Los snapshots de los días archivados no se pueden recalcular desde Inventario
+            horizonte = horizonte_archivo()
+            anteriores = StockDiario.objects.filter(fecha__gte=horizonte) if horizonte else StockDiario.objects.all()
+            anteriores.delete()
+
+        ultimo = StockDiario.objects.aggregate(ultimo=Max('fecha'))['ultimo']
+        if ultimo:
+            desde = ultimo + datetime.timedelta(days=1)
+        else:
+            primero = Inventario.objects.order_by('fecha_creacion').values_list('fecha_creacion', flat=True).first()
+            if primero is None:
+                return 0
+            desde = timezone.localtime(primero).date()
+
+        if desde > hasta:
+            return 0
+
+        movimientos = Inventario.objects.filter(
+            fecha_creacion__gte=inicio_dia(desde),
+            fecha_creacion__lt=inicio_dia(hasta + datetime.timedelta(days=1)),
+        )
+        acumulado = _stock_base(
+            movimientos.order_by().values_list('producto_id', flat=True).distinct(), desde
+        )
+        total = _generar(movimientos, acumulado)
+
+    logger.info(f"Snapshots de stock generados - Desde: {desde}, Hasta: {hasta}, Filas: {total}")
+    return total
+
+
+def rehacer_snapshots(producto_ids, desde):
+    """
+    Recalcula los snapshots ya generados de unos productos desde el día `desde`, tras
+    editar, borrar o aplicar con retraso un movimiento de ese día. Los días posteriores
+    al último snapshot los genera construir_snapshots como siempre.
+    """
+    producto_ids = list(producto_ids)
+    ultimo = StockDiario.objects.aggregate(ultimo=Max('fecha'))['ultimo']
+    if not producto_ids or ultimo is None or desde > ultimo:
+        return 0
+
+    with transaction.atomic():
+        StockDiario.objects.filter(producto_id__in=producto_ids, fecha__gte=desde).delete()
+        movimientos = Inventario.objects.filter(
+            producto_id__in=producto_ids,
+            fecha_creacion__gte=inicio_dia(desde),
+            fecha_creacion__lt=inicio_dia(ultimo + datetime.timedelta(days=1)),
+        )
+        total = _generar(movimientos, _stock_base(producto_ids, desde))
+
+    logger.info(f"Snapshots de stock rehechos - Productos: {len(producto_ids)}, Desde: {desde}, Filas: {total}")
+    return total
+
+
+def stock_en(producto_id, momento):
+    """
+    Stock de un producto en un instante: el snapshot más cercano anterior más los
+    movimientos posteriores a él, que como mucho abarcan el propio día consultado.
+    """
+    snapshot = StockDiario.objects.filter(
+        producto_id=producto_id, fecha__lt=timezone.localtime(momento).date()
+    ).order_by('-fecha').first()
+
+    movimientos = Inventario.objects.filter(producto_id=producto_id, fecha_creacion__lte=momento)
+    if snapshot:
+        movimientos = movimientos.filter(fecha_creacion__gte=inicio_dia(snapshot.fecha + datetime.timedelta(days=1)))
+
+    neto = movimientos.aggregate(neto=Sum(delta_stock()))['neto'] or 0
+    base = snapshot.stock if snapshot else stock_inicial([producto_id]).get(producto_id, 0)
+    return base + neto, snapshot
@@ -1,7 +1,25 @@
+import asyncio
+import datetime
+import json
+import os
 import pytest
+from django.contrib.auth.models import User
+from django.test import AsyncClient
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from django.urls import reverse
-from .models import Producto, Categoria
+from django.utils import timezone
+from .models import Producto, Categoria, Inventario, StockDiario, MovimientoDiario, PronosticoStock
+from .snapshots import construir_snapshots
+from .rollups import reconstruir_rollups
+from .pronosticos import calcular_pronosticos, filtro_bajo_stock
+from .eventos import Broker, broker
+
+@pytest.fixture(autouse=True)
+def limpiar_cache():
+    # Los cubos de tokens del control de admisión viven en la caché
+    from django.core.cache import cache
+    cache.clear()
 
 @pytest.fixture
 def api_client():
@@ -126,3 +144,1148 @@ def test_eliminar_categoria(api_client, crear_categoria):
     response = api_client.delete(url)
     assert response.status_code == 204
     assert not Categoria.objects.filter(id=crear_categoria.id).exists()
+
+###############################################################################
+
+def _movimiento(producto, tipo, cantidad, dias_atras):
+    movimiento = Inventario.objects.create(producto=producto, tipo=tipo, cantidad=cantidad)
+    fecha = timezone.now() - datetime.timedelta(days=dias_atras)
+    Inventario.objects.filter(pk=movimiento.pk).update(fecha_creacion=fecha)
+    return movimiento
+
+@pytest.mark.django_db
+def test_construir_snapshots_incremental(crear_producto):
+    _movimiento(crear_producto, 'entrada', 10, 3)
+    _movimiento(crear_producto, 'salida', 4, 2)
+    assert construir_snapshots() == 2
+    assert list(StockDiario.objects.order_by('fecha').values_list('stock', flat=True)) == [10, 6]
+
+    _movimiento(crear_producto, 'entrada', 5, 1)
+    assert construir_snapshots() == 1
+    assert StockDiario.objects.order_by('-fecha').first().stock == 11
+
+@pytest.mark.django_db
+def test_stock_at(api_client, crear_producto):
+    _movimiento(crear_producto, 'entrada', 10, 3)
+    _movimiento(crear_producto, 'salida', 4, 1)
+    construir_snapshots()
+    _movimiento(crear_producto, 'entrada', 7, 0)
+
+    url = reverse('producto-stock-at', args=[crear_producto.id])
+    hace_dos_dias = (timezone.localdate() - datetime.timedelta(days=2)).isoformat()
+    response = api_client.get(url, {'t': hace_dos_dias})
+    assert response.status_code == 200
+    assert response.data['stock'] == 10
+
+    response = api_client.get(url, {'t': timezone.now().isoformat()})
+    assert response.data['stock'] == 13
+
+    response = api_client.get(url, {'t': 'ayer'})
+    assert response.status_code == 400
+
+@pytest.mark.django_db
+def test_snapshots_parten_del_stock_inicial_y_se_rehacen_al_editar(api_client, crear_categoria):
+    producto = Producto.objects.create(nombre="Monitor", precio="200.00", categoria=crear_categoria, stock=50)
+    url = reverse('producto-stock-at', args=[producto.id])
+    hace_tres_dias = (timezone.localdate() - datetime.timedelta(days=3)).isoformat()
+    assert api_client.get(url, {'t': hace_tres_dias}).data['stock'] == 50
+
+    _movimiento(producto, 'entrada', 10, 3)
+    movimiento = _movimiento(producto, 'salida', 4, 2)
+    construir_snapshots()
+    assert list(StockDiario.objects.order_by('fecha').values_list('stock', flat=True)) == [60, 56]
+
+    movimiento = Inventario.objects.get(pk=movimiento.pk)
+    movimiento.cantidad = 6
+    movimiento.save()
+    assert list(StockDiario.objects.order_by('fecha').values_list('stock', flat=True)) == [60, 54]
+
+    Inventario.objects.get(pk=movimiento.pk).delete()
+    assert list(StockDiario.objects.order_by('fecha').values_list('stock', flat=True)) == [60]
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_acumulados_se_actualizan_con_cada_movimiento(crear_producto):
+    Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=10)
+    movimiento = Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=5)
+    Inventario.objects.create(producto=crear_producto, tipo='salida', cantidad=3)
+
+    movimiento.tipo = 'salida'
+    movimiento.cantidad = 2
+    movimiento.save()
+
+    acumulados = {m.tipo: (m.cantidad, m.movimientos) for m in MovimientoDiario.objects.all()}
+    assert acumulados == {'entrada': (10, 1), 'salida': (5, 2)}
+
+    movimiento.delete()
+    assert MovimientoDiario.objects.get(tipo='salida').cantidad == 3
+
+    MovimientoDiario.objects.all().delete()
+    assert reconstruir_rollups() == 2
+    assert MovimientoDiario.objects.get(tipo='entrada').cantidad == 10
+
+@pytest.mark.django_db
+def test_editar_movimiento_aplica_la_diferencia_sin_releerlo(crear_producto):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=10)
+    movimiento = Inventario.objects.select_related('producto').get(producto=crear_producto)
+    movimiento.cantidad = 4
+    with CaptureQueriesContext(connection) as consultas:
+        movimiento.save()
+    assert not [q for q in consultas.captured_queries
+                if q['sql'].startswith('SELECT') and 'productos_inventario' in q['sql']]
+    crear_producto.refresh_from_db()
+    assert crear_producto.stock == 4
+
+    # Pasar la entrada de 4 a una salida de 3 resta 7: sin stock suficiente no se guarda
+    movimiento.tipo, movimiento.cantidad = 'salida', 3
+    with pytest.raises(ValueError):
+        movimiento.save()
+    Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=10)
+    movimiento = Inventario.objects.select_related('producto').filter(producto=crear_producto).first()
+    movimiento.tipo, movimiento.cantidad = 'salida', 3
+    movimiento.save()
+    crear_producto.refresh_from_db()
+    assert crear_producto.stock == 7
+    assert {m.tipo: m.cantidad for m in MovimientoDiario.objects.all()} == {'entrada': 10, 'salida': 3}
+
+@pytest.mark.django_db
+def test_acumulados_usan_la_categoria_del_movimiento(crear_producto, crear_categoria):
+    Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=10)
+    otra = Categoria.objects.create(nombre="Oficina")
+    crear_producto.categoria = otra
+    crear_producto.save()
+    Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=5)
+    _movimiento(crear_producto, 'salida', 3, 1)
+
+    esperado = {('entrada', crear_categoria.id, 15), ('salida', otra.id, 3)}
+    assert set(MovimientoDiario.objects.values_list('tipo', 'categoria_id', 'cantidad')) == esperado
+    reconstruir_rollups()
+    assert set(MovimientoDiario.objects.values_list('tipo', 'categoria_id', 'cantidad')) == esperado
+
+@pytest.mark.django_db
+def test_analytics_movimientos(api_client, crear_producto):
+    Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=10)
+    Inventario.objects.create(producto=crear_producto, tipo='salida', cantidad=4)
+
+    url = reverse('analytics-movements-list')
+    response = api_client.get(url, {'group_by': 'categoria', 'interval': 'week'})
+    assert response.status_code == 200
+    assert len(response.data) == 1
+    assert response.data[0]['nombre'] == crear_producto.categoria.nombre
+    assert response.data[0]['entradas'] == 10
+    assert response.data[0]['salidas'] == 4
+    assert response.data[0]['movimientos'] == 2
+
+    response = api_client.get(url, {'interval': 'hour'})
+    assert response.status_code == 400
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_calcular_pronosticos(crear_producto, crear_categoria):
+    sin_demanda = Producto.objects.create(nombre="Mouse", precio="20.00", categoria=crear_categoria, stock=3)
+    Producto.objects.filter(pk=crear_producto.pk).update(stock=40)
+    hoy = timezone.localdate()
+    for dias in range(1, 11):
+        MovimientoDiario.objects.create(producto=crear_producto, categoria=crear_categoria,
+                                        fecha=hoy - datetime.timedelta(days=dias), tipo='salida',
+                                        cantidad=7, movimientos=1)
+
+    assert calcular_pronosticos(ventana=10, plazo=7, factor=0, hoy=hoy, tamano_lote=1) == 2
+
+    pronostico = PronosticoStock.objects.get(producto=crear_producto)
+    assert pronostico.demanda_diaria == 7
+    assert pronostico.dias_para_agotarse == pytest.approx(40 / 7)
+    assert pronostico.punto_reorden == 49
+    assert PronosticoStock.objects.get(producto=sin_demanda).dias_para_agotarse is None
+
+    # Sin demanda estimada sigue rigiendo el umbral fijo
+    bajo_stock = set(Producto.objects.filter(filtro_bajo_stock()).values_list('id', flat=True))
+    assert bajo_stock == {crear_producto.id, sin_demanda.id}
+
+@pytest.mark.django_db
+def test_bajo_stock_sin_demanda_usa_umbral_fijo(crear_categoria, settings):
+    settings.STOCK_BAJO_UMBRAL = 5
+    justo = Producto.objects.create(nombre="Mouse", precio="20.00", categoria=crear_categoria, stock=5)
+    agotado = Producto.objects.create(nombre="Teclado", precio="30.00", categoria=crear_categoria, stock=0)
+    Producto.objects.create(nombre="Cable", precio="5.00", categoria=crear_categoria, stock=6)
+    calcular_pronosticos(ventana=10, plazo=7, factor=0)
+    assert set(PronosticoStock.objects.values_list('punto_reorden', flat=True)) == {0}
+
+    bajo_stock = set(Producto.objects.filter(filtro_bajo_stock()).values_list('id', flat=True))
+    assert bajo_stock == {justo.id, agotado.id}
+
+@pytest.mark.django_db
+def test_listar_pronosticos_para_reorden(api_client, crear_producto, crear_categoria):
+    Producto.objects.create(nombre="Mouse", precio="20.00", categoria=crear_categoria, stock=100)
+    MovimientoDiario.objects.create(producto=crear_producto, categoria=crear_categoria,
+                                    fecha=timezone.localdate() - datetime.timedelta(days=1),
+                                    tipo='salida', cantidad=30, movimientos=1)
+    calcular_pronosticos()
+
+    response = api_client.get(reverse('pronosticostock-list'), {'reorden': '1'})
+    assert response.status_code == 200
+    assert [p['producto'] for p in response.data] == [crear_producto.id]
+
+###############################################################################
+
+def test_broker_reenvia_eventos_tras_reconexion():
+    async def escenario():
+        local = Broker(historial=10)
+        primero = local.publicar_local('stock', {'producto': 1})
+        segundo = local.publicar_local('stock_bajo', {'producto': 1})
+
+        suscripcion, pendientes = local.suscribir(ultimo_id=primero.id)
+        assert [e.id for e in pendientes] == [segundo.id]
+
+        tercero = local.publicar_local('stock', {'producto': 2})
+        recibido = await asyncio.wait_for(suscripcion[1].get(), timeout=1)
+        assert recibido.id == tercero.id
+        local.cancelar(suscripcion)
+        assert local.conexiones == 0
+
+    asyncio.run(escenario())
+
+@pytest.mark.django_db
+def test_movimiento_publica_stock_bajo(crear_producto, django_capture_on_commit_callbacks):
+    Producto.objects.filter(pk=crear_producto.pk).update(stock=12)
+    crear_producto.refresh_from_db()
+    # Sin conexiones abiertas no se consulta el pronóstico ni se publica nada
+    publicados = len(broker._historial)
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    with django_capture_on_commit_callbacks(execute=True), CaptureQueriesContext(connection) as consultas:
+        Inventario.objects.create(producto=crear_producto, tipo='salida', cantidad=4)
+    assert len(broker._historial) == publicados
+    assert not [q for q in consultas.captured_queries if 'productos_pronosticostock' in q['sql']]
+
+    async def suscribir():
+        return broker.suscribir()
+
+    loop = asyncio.new_event_loop()
+    suscripcion, _ = loop.run_until_complete(suscribir())
+    try:
+        with django_capture_on_commit_callbacks(execute=True):
+            Inventario.objects.create(producto=crear_producto, tipo='salida', cantidad=4)
+    finally:
+        broker.cancelar(suscripcion)
+        loop.close()
+
+    ultimos = list(broker._historial)[-2:]
+    assert [e.tipo for e in ultimos] == ['stock', 'stock_bajo']
+    assert ultimos[-1].datos['stock'] == 4
+
+@pytest.mark.django_db(transaction=True)
+def test_eventos_stock_flujo_sse():
+    usuario = User.objects.create_user(username='empleado', password='clave-segura-123')
+
+    async def escenario():
+        client = AsyncClient()
+        response = await client.get(reverse('eventos_stock'))
+        assert response.status_code == 401
+
+        await client.aforce_login(usuario)
+        response = await client.get(reverse('eventos_stock'))
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/event-stream'
+        flujo = response.streaming_content.__aiter__()
+        assert (await flujo.__anext__()).startswith(b'retry:')
+
+        evento = broker.publicar_local('stock_bajo', {'producto': 1, 'nombre': 'Laptop', 'stock': 2})
+        mensaje = await asyncio.wait_for(flujo.__anext__(), timeout=1)
+        assert mensaje.startswith(f"id: {evento.id}\nevent: stock_bajo\n".encode())
+        await flujo.aclose()
+
+    asyncio.run(escenario())
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_lecturas_async(client, crear_producto):
+    response = client.get(reverse('async_productos_list'))
+    assert response.status_code == 200
+    assert response.json()[0]['nombre'] == crear_producto.nombre
+    assert response.json()[0]['precio'] == '1500.00'
+
+    response = client.get(reverse('async_productos_detail', args=[crear_producto.id]))
+    assert response.json()['categoria'] == crear_producto.categoria_id
+    assert client.get(reverse('async_categorias_detail', args=[999])).status_code == 404
+
+    response = client.get(reverse('async_dashboard_data'))
+    assert response.json()['productos'] == 1
+    assert response.json()['productos_bajo_stock'][0]['id'] == crear_producto.id
+
+    response = client.get(reverse('async_exportar_productos_json'))
+    assert response.json()[0]['categoria'] == crear_producto.categoria.nombre
+
+@pytest.mark.django_db
+def test_lecturas_async_requieren_jwt(client, settings, crear_categoria):
+    settings.TESTING = False
+    url = reverse('async_categorias_list')
+    assert client.get(url).status_code == 401
+    assert client.get(url, HTTP_AUTHORIZATION='Bearer basura').status_code == 401
+
+    usuario = User.objects.create_user(username='lector', password='clave-segura-123')
+    response = client.get(url, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(usuario)}')
+    assert response.status_code == 200
+    assert response.json()[0]['nombre'] == crear_categoria.nombre
+
+@pytest.mark.django_db(transaction=True)
+def test_cadena_de_middleware_asincrona_sin_adaptar(caplog, crear_producto):
+    import logging
+    from django.core.handlers.asgi import ASGIHandler
+
+    # Un middleware solo síncrono obligaría a adaptar la cadena y a ejecutar cada petición en un hilo
+    with caplog.at_level(logging.DEBUG, logger='django.request'):
+        ASGIHandler()
+    assert not [r.getMessage() for r in caplog.records if 'adapted for middleware' in r.getMessage()]
+
+    async def escenario():
+        response = await AsyncClient().get(reverse('async_productos_list'))
+        assert response.status_code == 200
+        assert response.json()[0]['nombre'] == crear_producto.nombre
+
+    asyncio.run(escenario())
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_documentacion_api_se_construye_al_primer_acceso(client):
+    from Management.warmup import calentar
+    calentar(modulos_pesados=True, base_datos=True)
+
+    response = client.get('/api-docs/', {'format': 'openapi'})
+    assert response.status_code == 200
+    assert '/productos/' in response.json()['paths']
+    assert client.get('/redoc/').status_code == 200
+
+@pytest.mark.django_db
+def test_esquema_openapi_en_cache_con_etag_y_gzip(client, settings, tmp_path, monkeypatch):
+    import gzip
+    from django.core.management import call_command
+    from Management import schema
+
+    settings.OPENAPI_SCHEMA_DIR = str(tmp_path)
+    schema._esquemas.clear()
+    call_command('generate_openapi_schema', stdout=open(os.devnull, 'w'))
+    assert (tmp_path / f"schema-{schema.version_codigo()}.json").exists()
+    # En ejecución (p. ej. en Fly) hay variables que no existían en el build; la versión no cambia
+    monkeypatch.setenv('FLY_IMAGE_REF', 'registry.fly.io/app:deployment-1')
+    assert schema.version_codigo.__wrapped__() == schema.version_codigo()
+
+    response = client.get('/api-docs/', {'format': 'openapi'}, HTTP_ACCEPT_ENCODING='gzip, br')
+    assert response.status_code == 200
+    assert response['Content-Encoding'] == 'gzip'
+    assert b'"/productos/"' in gzip.decompress(response.content)
+
+    response = client.get('/redoc/', {'format': 'openapi'}, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_datos_de_benchmark_deterministas_y_coherentes():
+    from django.db.models import Case, F, IntegerField, Sum, When
+    from .benchmark import sembrar_datos
+    from .valoracion import verificar
+
+    sembrar_datos(30, 400, semilla=7)
+    stock_calculado = dict(
+        Inventario.objects.values('producto').annotate(
+            neto=Sum(Case(
+                When(tipo='entrada', then='cantidad'),
+                default=-1 * F('cantidad'),
+                output_field=IntegerField(),
+            ))
+        ).values_list('producto', 'neto')
+    )
+    for producto in Producto.objects.all():
+        assert producto.stock == stock_calculado.get(producto.pk, 0) >= 0
+    assert Inventario.objects.count() == 400
+    assert Inventario.objects.dates('fecha_creacion', 'year').count() >= 2
+    assert MovimientoDiario.objects.aggregate(total=Sum('movimientos'))['total'] == 400
+    assert verificar() == []
+    primera = list(Inventario.objects.order_by('id').values_list('tipo', 'cantidad')[:50])
+
+    Inventario.objects.all().delete()
+    Producto.objects.all().delete()
+    Categoria.objects.all().delete()
+    sembrar_datos(30, 400, semilla=7)
+    assert list(Inventario.objects.order_by('id').values_list('tipo', 'cantidad')[:50]) == primera
+
+def test_exponente_de_escalado():
+    from .benchmark import exponente_escalado
+
+    assert exponente_escalado([(1000, 5.0), (10000, 5.0)]) == 0
+    assert exponente_escalado([(1000, 5.0), (10000, 50.0)]) == 1
+    assert exponente_escalado([(1000, 5.0)]) is None
+
+@pytest.mark.django_db
+def test_medir_falla_con_respuestas_no_2xx():
+    from .benchmark import MedicionFallida, medir
+
+    assert medir(lambda: 200, repeticiones=2)['peticiones'] == 2
+    assert medir(lambda: 302, repeticiones=1, esperados={302})['peticiones'] == 1
+    with pytest.raises(MedicionFallida):
+        medir(lambda: 429, repeticiones=2)
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_diario_de_peticiones_redacta_credenciales(client, api_client, settings, tmp_path, crear_categoria):
+    from .benchmark import leer_diario
+
+    settings.REQUEST_JOURNAL_PATH = str(tmp_path / 'journal.ndjson')
+    client.post(reverse('login'), {'username': 'ana', 'password': 'secreta'})
+    response = api_client.post(reverse('categoria-list'), {'nombre': 'Hogar'}, format='json')
+    assert response.status_code == 201
+    api_client.get(reverse('categoria-detail', args=[crear_categoria.pk]), {'formato': 'corto'})
+
+    login, alta, consulta = leer_diario(settings.REQUEST_JOURNAL_PATH)
+    assert login['b'] == {'username': 'ana', 'password': '***'}
+    assert 'secreta' not in open(settings.REQUEST_JOURNAL_PATH).read()
+    assert (alta['m'], alta['s'], alta['ct'], alta['b']) == ('POST', 201, 'application/json', {'nombre': 'Hogar'})
+    assert consulta['q'] == 'formato=corto' and 'b' not in consulta
+    assert leer_diario(settings.REQUEST_JOURNAL_PATH, solo_lectura=True) == [consulta]
+
+def test_reproduccion_del_diario_por_ruta():
+    from .benchmark import reproducir
+
+    entradas = [
+        {'t': 100.0, 'm': 'GET', 'p': '/api/productos/1/', 's': 200},
+        {'t': 100.1, 'm': 'GET', 'p': '/api/productos/2/', 's': 200},
+        {'t': 100.2, 'm': 'GET', 'p': '/api/productos/3/', 's': 404},
+        {'t': 100.3, 'm': 'POST', 'p': '/api/categorias/', 's': 201},
+    ]
+    respuestas = {'/api/productos/1/': 200, '/api/productos/2/': 200, '/api/productos/3/': 404, '/api/categorias/': 500}
+
+    resultado = reproducir(entradas, lambda e: (respuestas[e['p']], 0.01), velocidad=10, concurrencia=2)
+    assert resultado['rutas']['GET /api/productos/{id}/']['peticiones'] == 3
+    assert resultado['rutas']['GET /api/productos/{id}/']['errores'] == 0
+    assert resultado['rutas']['POST /api/categorias/']['errores'] == 1
+    assert resultado['total']['tasa_error'] == 0.25
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_importar_catalogo_csv_con_upsert_y_errores(api_client, crear_categoria):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    existente = Producto.objects.create(
+        codigo='SKU-1', nombre="Viejo", precio="1.00", stock=7, categoria=crear_categoria
+    )
+    contenido = (
+        "codigo,nombre,descripcion,precio,stock,categoria\n"
+        "SKU-1,Laptop,Actualizada,1500.50,99,Electrónica\n"
+        "SKU-2,Silla,,80,3,Muebles\n"
+        ",Lámpara,Sin código,20.00,,Muebles\n"
+        "SKU-3,,Sin nombre,abc,-1,Muebles\n"
+    ).encode()
+    archivo = SimpleUploadedFile('catalogo.csv', contenido, content_type='text/csv')
+    response = api_client.post(reverse('producto-importar'), {'archivo': archivo}, format='multipart')
+
+    assert response.status_code == 200
+    assert (response.data['procesadas'], response.data['importadas'], response.data['categorias_creadas']) == (4, 3, 1)
+    assert response.data['errores'] == [
+        {'fila': 5, 'errores': {
+            'nombre': "Este campo es requerido.",
+            'precio': "Número con hasta 10 dígitos y 2 decimales.",
+            'stock': "Entero mayor o igual que 0.",
+        }},
+    ]
+    existente.refresh_from_db()
+    assert (existente.nombre, str(existente.precio), existente.stock) == ("Laptop", "1500.50", 7)
+    assert Producto.objects.get(codigo='SKU-2').categoria.nombre == "Muebles"
+    assert Producto.objects.filter(nombre="Lámpara", codigo__isnull=True).exists()
+
+@pytest.mark.django_db
+def test_importar_catalogo_ndjson_sin_crear_categorias(crear_categoria, tmp_path):
+    from django.core.management import call_command
+
+    ruta = tmp_path / 'catalogo.ndjson'
+    ruta.write_text(
+        '{"codigo": "A", "nombre": "Mouse", "precio": "25.00", "categoria": "Electrónica"}\n'
+        '{"codigo": "B", "nombre": "Mesa", "precio": "90.00", "categoria": "Muebles"}\n'
+        'no es json\n',
+        encoding='utf-8',
+    )
+    errores = tmp_path / 'errores.json'
+    call_command('import_catalog', str(ruta), '--no-crear-categorias', '--errores', str(errores),
+                 stdout=open(os.devnull, 'w'))
+
+    assert list(Producto.objects.values_list('codigo', flat=True)) == ['A']
+    assert [e['fila'] for e in json.loads(errores.read_text())] == [2, 3]
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_eliminar_categoria_oculta_sus_productos_con_un_update(api_client, crear_producto):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    Inventario.objects.create(tipo='entrada', producto=crear_producto, cantidad=4)
+    categoria = crear_producto.categoria
+    with CaptureQueriesContext(connection) as consultas:
+        response = api_client.delete(reverse('categoria-detail', args=[categoria.id]))
+    assert response.status_code == 204
+    assert len(consultas.captured_queries) == 1
+
+    assert not Producto.objects.exists() and not Inventario.objects.exists()
+    assert Producto.todos.filter(pk=crear_producto.pk).exists()
+    assert api_client.get(reverse('producto-detail', args=[crear_producto.id])).status_code == 404
+    assert api_client.delete(reverse('categoria-detail', args=[categoria.id])).status_code == 404
+
+@pytest.mark.django_db
+def test_purgar_eliminados_por_lotes(crear_categoria):
+    from django.core.management import call_command
+
+    otra = Categoria.objects.create(nombre="Hogar")
+    productos = [
+        Producto.objects.create(nombre=f"P{i}", precio="1.00", categoria=crear_categoria if i < 5 else otra)
+        for i in range(7)
+    ]
+    for producto in productos:
+        Inventario.objects.create(tipo='entrada', producto=producto, cantidad=3)
+    construir_snapshots()
+    calcular_pronosticos()
+
+    Categoria.objects.filter(pk=crear_categoria.pk).eliminar()
+    Producto.objects.filter(pk=productos[5].pk).eliminar()
+    call_command('purge_deleted', '--batch-size', '2', stdout=open(os.devnull, 'w'))
+
+    assert list(Categoria.todos.values_list('nombre', flat=True)) == ["Hogar"]
+    assert list(Producto.todos.values_list('pk', flat=True)) == [productos[6].pk]
+    assert list(Inventario.todos.values_list('producto', flat=True)) == [productos[6].pk]
+    for modelo in (StockDiario, MovimientoDiario, PronosticoStock):
+        assert not modelo.objects.exclude(producto=productos[6]).exists()
+    assert MovimientoDiario.objects.filter(producto=productos[6]).exists()
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_compresion_negociada_y_json_compacto(client, crear_categoria):
+    import gzip
+    from django.http import StreamingHttpResponse
+    from django.test import RequestFactory
+    from Management.middleware.compression import CompressionMiddleware, negociar
+
+    for i in range(60):
+        Producto.objects.create(nombre=f"Producto {i}", precio="10.00", categoria=crear_categoria)
+    url = reverse('exportar_productos_json')
+
+    compacto = client.get(url)
+    assert 'Content-Encoding' not in compacto and b'\n' not in compacto.content
+    assert 'Accept-Encoding' in compacto['Vary']
+    legible = client.get(url, {'pretty': '1'})
+    assert b'\n    ' in legible.content and json.loads(legible.content) == json.loads(compacto.content)
+
+    comprimido = client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+    assert comprimido['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(comprimido.content) == compacto.content
+    assert negociar('gzip;q=1, br;q=0, zstd;q=0')[0] == 'gzip'
+    assert negociar('identity') is None
+
+    # Por debajo del umbral no compensa comprimir
+    pequeno = client.get(reverse('categoria-list'), HTTP_ACCEPT_ENCODING='gzip')
+    assert 'Content-Encoding' not in pequeno
+
+    respuesta = StreamingHttpResponse((b'{"n": %d}\n' % i for i in range(500)), content_type='application/json')
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+    respuesta = CompressionMiddleware(lambda r: respuesta)(request)
+    assert respuesta['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(b''.join(respuesta.streaming_content)).count(b'\n') == 500
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_control_de_admision_por_usuario_y_clase(client, settings):
+    from Management.metrics import admision_rechazos
+
+    settings.ADMISION_TASAS = dict(settings.ADMISION_TASAS, lectura=(0.5, 2))
+    url = reverse('categoria-list')
+    rechazos = admision_rechazos.labels('limite_tasa', 'lectura')._value.get()
+    assert [client.get(url).status_code for _ in range(3)] == [200, 200, 429]
+    response = client.get(url)
+    assert response.status_code == 429 and int(response['Retry-After']) >= 1
+    assert admision_rechazos.labels('limite_tasa', 'lectura')._value.get() == rechazos + 2
+
+    # Otro usuario (o clase de ruta) tiene su propio cubo
+    token = AccessToken.for_user(User.objects.create_user(username='otro', password='x'))
+    assert client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}').status_code == 200
+    assert client.post(url, {'nombre': 'Hogar'}, content_type='application/json').status_code == 201
+
+@pytest.mark.django_db
+def test_control_de_admision_descarta_por_concurrencia(client, settings):
+    settings.ADMISION_LIMITES_VISTA = {'exportar_productos_json': 0}
+    response = client.get(reverse('exportar_productos_json'))
+    assert response.status_code == 429
+    assert response['Retry-After'] == str(settings.ADMISION_REINTENTO_VISTA_SEGUNDOS)
+    assert client.get(reverse('exportar_inventarios_json')).status_code == 200
+
+    # Una exportación en streaming ocupa su hueco hasta que se termina de enviar
+    settings.ADMISION_LIMITES_VISTA = {'exportar_productos': 1}
+    client.force_login(User.objects.create_user(username='exportador', password='x'))
+    en_curso = client.get(reverse('exportar_productos'))
+    assert client.get(reverse('exportar_productos')).status_code == 429
+    b''.join(en_curso.streaming_content)
+    assert client.get(reverse('exportar_productos')).status_code == 200
+
+    settings.ADMISION_MAX_CONCURRENCIA = 0
+    from django.test import Client
+    assert Client().get(reverse('categoria-list')).status_code == 429
+
+def test_cubo_de_tokens_no_gasta_tokens_rechazados():
+    from Management.middleware.admission import consumir_token
+
+    # Ráfaga de 3 a 1 token por segundo: los rechazos devuelven lo que avanzaron
+    assert [consumir_token('cubo', 1, 3, ahora=100)[0] for _ in range(5)] == [True, True, True, False, False]
+    assert consumir_token('cubo', 1, 3, ahora=100) == (False, 1)
+    assert consumir_token('cubo', 1, 3, ahora=101)[0]
+    assert not consumir_token('cubo', 1, 3, ahora=101)[0]
+
+@pytest.mark.django_db
+def test_metricas_no_son_publicas(client, settings):
+    settings.METRICAS_TOKEN = 'secreto'
+    assert client.get('/metrics').status_code == 200
+    externo = {'REMOTE_ADDR': '203.0.113.7'}
+    assert client.get('/metrics', **externo).status_code == 403
+    assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer otro', **externo).status_code == 403
+    assert client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto', **externo).status_code == 200
+
+    client.force_login(User.objects.create_user(username='operador', password='x', is_staff=True))
+    assert client.get('/metrics', **externo).status_code == 200
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_escritura_diferida_de_movimientos(api_client, crear_producto, settings):
+    from django.core.management import call_command
+    from .models import MovimientoPendiente
+
+    settings.INVENTARIO_ESCRITURA_DIFERIDA = True
+    url = reverse('inventario-list')
+    tickets = []
+    for tipo, cantidad in [('entrada', 10), ('salida', 4), ('salida', 20), ('salida', 6)]:
+        response = api_client.post(url, {'tipo': tipo, 'producto': crear_producto.id, 'cantidad': cantidad}, format='json')
+        assert response.status_code == 202
+        tickets.append(response.data['ticket'])
+    crear_producto.refresh_from_db()
+    assert crear_producto.stock == 0 and not Inventario.objects.exists()
+    assert api_client.get(reverse('inventario-ticket', args=[tickets[0]])).data['estado'] == 'pendiente'
+
+    call_command('drain_inventory_queue', stdout=open(os.devnull, 'w'))
+
+    crear_producto.refresh_from_db()
+    assert crear_producto.stock == 0
+    estados = [api_client.get(reverse('inventario-ticket', args=[t])).data for t in tickets]
+    assert [e['estado'] for e in estados] == ['aplicado', 'aplicado', 'rechazado', 'aplicado']
+    assert estados[2]['error'] == "Stock insuficiente para realizar la salida."
+    assert Inventario.objects.count() == 3
+    salidas = MovimientoDiario.objects.get(producto=crear_producto, tipo='salida')
+    assert (salidas.cantidad, salidas.movimientos) == (10, 2)
+
+    # Un movimiento aplicado con retraso cuenta en el día en que se recibió, aunque ese
+    # día ya tenga snapshot
+    ayer = timezone.now() - datetime.timedelta(days=1)
+    _movimiento(crear_producto, 'entrada', 3, 1)
+    construir_snapshots()
+    assert StockDiario.objects.get(producto=crear_producto).stock == 3
+    tarde = MovimientoPendiente.objects.create(producto=crear_producto, tipo='entrada', cantidad=7)
+    MovimientoPendiente.objects.filter(pk=tarde.pk).update(recibido_en=ayer)
+    call_command('drain_inventory_queue', stdout=open(os.devnull, 'w'))
+    tarde.refresh_from_db()
+    assert tarde.inventario.fecha_creacion == ayer
+    assert MovimientoDiario.objects.get(producto=crear_producto, tipo='entrada',
+                                        fecha=timezone.localtime(ayer).date()).cantidad == 7
+    assert StockDiario.objects.get(producto=crear_producto).stock == 10
+
+    settings.INVENTARIO_COLA_MAX = 1
+    MovimientoPendiente.objects.create(producto=crear_producto, tipo='entrada', cantidad=1)
+    response = api_client.post(url, {'tipo': 'entrada', 'producto': crear_producto.id, 'cantidad': 1}, format='json')
+    assert response.status_code == 503 and response['Retry-After']
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_auditoria_por_lotes_con_diff_y_compactacion(api_client, crear_categoria, settings,
+                                                     django_capture_on_commit_callbacks):
+    from django.core.management import call_command
+    from .models import RegistroAuditoria
+
+    settings.AUDITORIA_LOTE = 3
+    settings.AUDITORIA_INTERVALO_MS = 60000
+    usuario = User.objects.create_user(username='auditor', password='x')
+    api_client.force_authenticate(usuario)
+    with django_capture_on_commit_callbacks(execute=True):
+        producto = api_client.post(reverse('producto-list'), {
+            'nombre': 'Tablet', 'precio': '800.00', 'categoria': crear_categoria.id,
+        }, format='json').data
+    url = reverse('producto-detail', args=[producto['id']])
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.patch(url, {'precio': '750.00'}, format='json')
+    # Aún en el buffer: el lote es de 3
+    assert not RegistroAuditoria.objects.exists()
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.patch(url, {'precio': '700.00', 'stock': 2}, format='json')
+    assert RegistroAuditoria.objects.count() == 3
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client.delete(url)
+
+    # La consulta vacía el buffer antes de leer
+    registros = api_client.get(reverse('auditoria-list'), {'modelo': 'Producto', 'objeto': producto['id']}).data
+    assert [r['accion'] for r in registros] == ['eliminar', 'actualizar', 'actualizar', 'crear']
+    assert registros[0]['usuario_nombre'] == 'auditor'
+    assert registros[1]['cambios'] == {'precio': ['750.00', '700.00'], 'stock': [0, 2]}
+    assert registros[3]['cambios']['nombre'] == [None, 'Tablet']
+    assert api_client.get(reverse('auditoria-list'), {'usuario': 'otro'}).data == []
+
+    call_command('compact_audit_log', '--compactar-dias', '0', stdout=open(os.devnull, 'w'))
+    actualizaciones = RegistroAuditoria.objects.filter(accion='actualizar')
+    assert actualizaciones.count() == 1
+    assert actualizaciones.get().cambios == {'precio': ['800.00', '700.00'], 'stock': [0, 2]}
+    call_command('compact_audit_log', '--dias', '0', stdout=open(os.devnull, 'w'))
+    assert not RegistroAuditoria.objects.exists()
+
+@pytest.mark.django_db
+def test_concurrencia_optimista_con_etag_e_if_match(api_client, crear_producto):
+    url = reverse('producto-detail', args=[crear_producto.id])
+    response = api_client.get(url)
+    assert response['ETag'] == '"1"'
+    datos = {k: response.data[k] for k in ('nombre', 'descripcion', 'precio', 'stock', 'categoria')}
+
+    response = api_client.put(url, {**datos, 'precio': '1400.00'}, format='json', HTTP_IF_MATCH='"1"')
+    assert response.status_code == 200 and response['ETag'] == '"2"'
+    # Un segundo editor con la versión que leyó antes no pisa el cambio
+    response = api_client.put(url, {**datos, 'nombre': 'Portátil'}, format='json', HTTP_IF_MATCH='"1"')
+    assert response.status_code == 412
+    crear_producto.refresh_from_db()
+    assert (crear_producto.nombre, str(crear_producto.precio), crear_producto.version) == ('Laptop', '1400.00', 2)
+
+    # La forma débil que deja el middleware de compresión también vale
+    assert api_client.patch(url, {'nombre': 'Portátil'}, format='json', HTTP_IF_MATCH='W/"2"').status_code == 200
+
+    # Un movimiento cambia el stock y la versión: un PUT con el ETag leído antes no revierte el stock
+    response = api_client.get(url)
+    datos = {k: response.data[k] for k in ('nombre', 'descripcion', 'precio', 'stock', 'categoria')}
+    movimiento = Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=5)
+    assert api_client.put(url, datos, format='json', HTTP_IF_MATCH=response['ETag']).status_code == 412
+    assert api_client.get(url).data['stock'] == datos['stock'] + 5
+
+    url_movimiento = reverse('inventario-detail', args=[movimiento.id])
+    response = api_client.patch(url_movimiento, {'cantidad': 6}, format='json', HTTP_IF_MATCH='"1"')
+    assert response.status_code == 200 and response.data['version'] == 2
+    assert api_client.patch(url_movimiento, {'cantidad': 7}, format='json', HTTP_IF_MATCH='"1"').status_code == 412
+
+    assert api_client.delete(url, HTTP_IF_MATCH='"2"').status_code == 412
+    assert api_client.delete(url, HTTP_IF_MATCH=api_client.get(url)['ETag']).status_code == 204
+
+@pytest.mark.django_db
+def test_consulta_multiple_en_orden_con_cache(api_client, crear_categoria, settings, django_assert_num_queries):
+    settings.CACHE_COMPARTIDA = True
+    productos = [Producto.objects.create(nombre=f"P{i}", precio="10.00", categoria=crear_categoria) for i in range(3)]
+    ids = [productos[2].id, 999999, productos[0].id, productos[2].id]
+    url = reverse('producto-list')
+
+    with django_assert_num_queries(1):
+        datos = api_client.get(url, {'ids': ','.join(map(str, ids))}).data
+    assert [d['id'] for d in datos] == ids
+    assert datos[1] == {'id': 999999, 'detail': 'No encontrado.'}
+    assert datos[0]['nombre'] == 'P2'
+
+    # Los encontrados salen de la caché; solo se consulta el que falta
+    with django_assert_num_queries(1):
+        api_client.post(reverse('producto-multi-get'), {'ids': ids}, format='json')
+    productos[2].nombre = 'Renombrado'
+    productos[2].save()
+    datos = api_client.post(reverse('producto-multi-get'), {'ids': ids}, format='json').data
+    assert datos[0]['nombre'] == datos[3]['nombre'] == 'Renombrado'
+
+    Producto.objects.filter(pk=productos[0].id).eliminar()
+    assert api_client.get(url, {'ids': productos[0].id}).data == [{'id': productos[0].id, 'detail': 'No encontrado.'}]
+    assert api_client.get(url, {'ids': 'a,b'}).status_code == 400
+    assert api_client.post(reverse('producto-multi-get'), {'ids': 5}, format='json').status_code == 400
+
+    # Con una caché por proceso no se guarda nada: un cambio hecho en otro worker se ve al momento
+    settings.CACHE_COMPARTIDA = False
+    api_client.post(reverse('producto-multi-get'), {'ids': [productos[1].id]}, format='json')
+    Producto.objects.filter(pk=productos[1].id).update(nombre='Desde otro worker')
+    datos = api_client.post(reverse('producto-multi-get'), {'ids': [productos[1].id]}, format='json').data
+    assert datos[0]['nombre'] == 'Desde otro worker'
+
+@pytest.mark.django_db
+def test_lote_de_peticiones_con_transaccion_opcional(api_client, crear_categoria):
+    url = reverse('batch-list')
+    categoria = f"/api/categorias/{crear_categoria.id}/"
+    response = api_client.post(url, {'requests': [
+        {'method': 'POST', 'path': '/api/productos/',
+         'body': {'nombre': 'Tablet', 'precio': '800.00', 'categoria': crear_categoria.id}},
+        {'method': 'PATCH', 'path': categoria, 'body': {'nombre': 'Gadgets'}, 'headers': {'If-Match': '"1"'}},
+        {'method': 'GET', 'path': f"{categoria}?pretty=1"},
+        {'method': 'GET', 'path': '/api/no-existe/'},
+        {'method': 'GET', 'path': '/login/'},
+    ]}, format='json')
+    assert response.status_code == 200 and response.data['revertido'] is False
+    respuestas = response.data['respuestas']
+    assert [r['status'] for r in respuestas] == [201, 200, 200, 404, 400]
+    assert respuestas[1]['headers']['ETag'] == '"2"'
+    assert respuestas[2]['body']['nombre'] == 'Gadgets'
+    assert all('duracion_ms' in r for r in respuestas)
+
+    # En modo atómico un fallo revierte las anteriores y omite las siguientes
+    response = api_client.post(url, {'atomic': True, 'requests': [
+        {'method': 'PATCH', 'path': categoria, 'body': {'nombre': 'Otra'}},
+        {'method': 'PATCH', 'path': categoria, 'body': {'nombre': 'Más'}, 'headers': {'If-Match': '"1"'}},
+        {'method': 'DELETE', 'path': categoria},
+    ]}, format='json')
+    assert response.data['revertido'] is True
+    assert [r['status'] for r in response.data['respuestas']] == [200, 412, 424]
+    crear_categoria.refresh_from_db()
+    assert (crear_categoria.nombre, crear_categoria.version) == ('Gadgets', 2)
+
+    assert api_client.post(url, {'requests': [{'method': 'GET', 'path': '/api/categorias/'}] * 51},
+                           format='json').status_code == 400
+
+@pytest.mark.django_db
+def test_lote_cobra_admision_y_registra_cada_subpeticion(api_client, crear_categoria, settings, tmp_path):
+    from .benchmark import leer_diario
+
+    settings.REQUEST_JOURNAL_PATH = str(tmp_path / 'journal.ndjson')
+    settings.ADMISION_TASAS = dict(settings.ADMISION_TASAS, lectura=(0.5, 2))
+    response = api_client.post(reverse('batch-list'), {'requests': [
+        {'method': 'POST', 'path': '/api/categorias/', 'body': {'nombre': 'Hogar'}},
+        {'method': 'GET', 'path': '/api/categorias/'},
+        {'method': 'GET', 'path': f"/api/categorias/{crear_categoria.id}/"},
+        {'method': 'GET', 'path': '/api/categorias/'},
+    ]}, format='json')
+    # La ráfaga de lecturas es de 2: la tercera lectura del lote se rechaza como una petición suelta
+    respuestas = response.data['respuestas']
+    assert [r['status'] for r in respuestas] == [201, 200, 200, 429]
+    assert respuestas[3]['headers']['Retry-After']
+
+    # El diario tiene las subpeticiones, que se reproducen una a una, y no el lote
+    entradas = leer_diario(settings.REQUEST_JOURNAL_PATH)
+    assert [(e['m'], e['p'], e['s']) for e in entradas] == [
+        ('POST', '/api/categorias/', 201), ('GET', '/api/categorias/', 200),
+        ('GET', f"/api/categorias/{crear_categoria.id}/", 200), ('GET', '/api/categorias/', 429),
+    ]
+    assert entradas[0]['b'] == {'nombre': 'Hogar'}
+
+def test_truncar_texto_al_ancho_de_la_columna():
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from .pdf import truncar
+
+    assert truncar("Corto", 100) == "Corto"
+    recortado = truncar("Descripción muy larga " * 10, 120)
+    assert recortado.endswith('…') and stringWidth(recortado, 'Helvetica', 9) <= 120
+
+@pytest.mark.django_db
+def test_pdf_de_inventarios_en_paralelo_y_por_paginas(client, crear_producto, settings):
+    import re
+    from .pdf import FILAS_POR_PAGINA
+
+    settings.REPORTES_PDF_PROCESOS = 2
+    settings.REPORTES_PDF_PAGINAS_POR_TROZO = 1
+    total = FILAS_POR_PAGINA * 3 + 5
+    Inventario.objects.bulk_create([
+        Inventario(producto=crear_producto, tipo='entrada', cantidad=i) for i in range(total)
+    ])
+    client.force_login(User.objects.create_user(username='reportes', password='x'))
+    response = client.get(reverse('exportar_inventarios_pdf'))
+    assert response.status_code == 200 and response.streaming
+    pdf = b''.join(response.streaming_content)
+
+    assert pdf.startswith(b'%PDF-1.4') and pdf.endswith(b'%%EOF\n')
+    assert re.search(rb'/Type /Pages /Kids \[[^\]]*\] /Count 4 ', pdf)
+    # Cada entrada de la tabla xref apunta al inicio de su objeto
+    inicio_xref = int(pdf.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+    entradas = pdf[inicio_xref:].split(b'\n')[3:]
+    for numero, entrada in enumerate(entradas, start=1):
+        if not entrada.endswith(b' n '):
+            break
+        assert pdf[int(entrada[:10]):].startswith(b'%d 0 obj' % numero)
+
+    # El pool de procesos se cierra (al salir el worker) y se recrea si hace falta
+    from . import reportes
+    procesos = list(reportes._pool._processes.values())
+    reportes.cerrar_pool()
+    assert reportes._pool is None and not any(p.is_alive() for p in procesos)
+
+@pytest.mark.django_db
+def test_exportar_csv_y_xlsx_con_filtros(client, crear_producto):
+    import csv
+    import io
+
+    otra = Categoria.objects.create(nombre="Hogar")
+    silla = Producto.objects.create(nombre="Silla, plegable", precio="20.00", categoria=otra)
+    Inventario.objects.create(producto=crear_producto, tipo='entrada', cantidad=10)
+    Inventario.objects.create(producto=silla, tipo='entrada', cantidad=5)
+    Inventario.objects.create(producto=silla, tipo='salida', cantidad=2)
+    client.force_login(User.objects.create_user(username='contable', password='x'))
+
+    response = client.get(reverse('exportar_inventarios'), {'categoria': otra.id, 'tipo': 'entrada',
+                                                            'desde': timezone.localdate().isoformat()})
+    assert response.streaming and response['Content-Type'].startswith('text/csv')
+    filas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+    assert filas[0][:3] == ['id', 'fecha', 'tipo']
+    assert [(f[2], f[4], f[6]) for f in filas[1:]] == [('entrada', 'Silla, plegable', '5')]
+
+    response = client.get(reverse('exportar_productos'), {'format': 'csv'})
+    filas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+    assert [f[2] for f in filas[1:]] == ['Laptop', 'Silla, plegable']
+
+    assert client.get(reverse('exportar_inventarios'), {'desde': 'ayer'}).status_code == 400
+    assert client.get(reverse('exportar_productos'), {'format': 'pdf'}).status_code == 400
+
+    openpyxl = pytest.importorskip('openpyxl')
+    response = client.get(reverse('exportar_productos'), {'format': 'xlsx', 'categoria': otra.id})
+    hoja = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+    assert [c.value for c in hoja[2]][2:6] == ['Silla, plegable', None, 20, 3]
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_archivar_movimientos_antiguos_y_consultar_historial(api_client, crear_producto, tmp_path):
+    import gzip
+    from django.core.management import call_command
+    from .archivo import archivar_movimientos, horizonte_archivo
+    from .benchmark import fechas_manuales
+    from .models import InventarioArchivado, MesArchivado
+
+    ahora = timezone.now()
+    antiguo = ahora - datetime.timedelta(days=500)
+    with fechas_manuales(Inventario):
+        for fecha, tipo, cantidad in [(antiguo, 'entrada', 10), (antiguo, 'salida', 3), (ahora, 'entrada', 5)]:
+            Inventario.objects.create(producto=crear_producto, tipo=tipo, cantidad=cantidad,
+                                      fecha_creacion=fecha, fecha_actualizacion=fecha)
+    acumulados = MovimientoDiario.objects.count()
+
+    call_command('archive_inventory', '--meses', '12', stdout=open(os.devnull, 'w'))
+
+    assert list(Inventario.objects.values_list('cantidad', flat=True)) == [5]
+    assert sorted(InventarioArchivado.objects.values_list('cantidad', flat=True)) == [3, 10]
+    local = timezone.localtime(antiguo)
+    assert horizonte_archivo() == datetime.date(local.year + local.month // 12, local.month % 12 + 1, 1)
+    crear_producto.refresh_from_db()
+    assert crear_producto.stock == 12
+    # Los acumulados de los días archivados sobreviven a una reconstrucción completa
+    reconstruir_rollups()
+    assert MovimientoDiario.objects.count() == acumulados
+
+    url = reverse('inventario-historial')
+    assert [m['cantidad'] for m in api_client.get(url).data] == [5]
+    completo = api_client.get(url, {'incluir_archivo': '1', 'producto': crear_producto.id}).data
+    assert [(m['cantidad'], m['archivado']) for m in completo] == [(5, False), (3, True), (10, True)]
+    assert len(api_client.get(url, {'incluir_archivo': '1', 'tipo': 'salida'}).data) == 1
+    assert api_client.get(url, {'desde': 'ayer'}).status_code == 400
+
+    # Modo archivo: NDJSON comprimido por mes, registrado también en MesArchivado
+    movidos = archivar_movimientos(ahora + datetime.timedelta(seconds=1), lote=1, directorio=str(tmp_path))
+    assert sum(movidos.values()) == 1 and not Inventario.objects.exists()
+    registro = MesArchivado.objects.exclude(destino='tabla').get()
+    with gzip.open(registro.destino, 'rt', encoding='utf-8') as archivo:
+        assert [json.loads(linea)['cantidad'] for linea in archivo] == [5]
+    # Los meses que solo quedaron en archivos siguen apareciendo en el historial
+    completo = api_client.get(url, {'incluir_archivo': '1', 'producto': crear_producto.id}).data
+    assert [(m['cantidad'], m['archivado']) for m in completo] == [(5, True), (3, True), (10, True)]
+    assert [m['cantidad'] for m in api_client.get(url, {'incluir_archivo': '1', 'limite': '2'}).data] == [5, 3]
+    assert [m['cantidad'] for m in api_client.get(url, {'incluir_archivo': '1', 'tipo': 'entrada'}).data] == [5, 10]
+    assert api_client.get(url, {'incluir_archivo': '1', 'desde': (ahora + datetime.timedelta(days=1)).date()}).data == []
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_valoracion_por_categoria_incremental_y_verificada(api_client, crear_categoria, settings):
+    from decimal import Decimal
+    from django.core.management import CommandError, call_command
+    from .importacion import ImportadorCatalogo
+    from .ingesta import aplicar_lote, encolar_movimiento
+    from .models import ValoracionCategoria
+    from .valoracion import verificar
+
+    def valor(categoria):
+        fila = ValoracionCategoria.objects.filter(categoria=categoria).first()
+        return (fila.valor, fila.unidades, fila.productos) if fila else None
+
+    muebles = Categoria.objects.create(nombre="Muebles")
+    laptop = Producto.objects.create(nombre="Laptop", precio="100.00", categoria=crear_categoria)
+    silla = Producto.objects.create(codigo='SKU-1', nombre="Silla", precio="20.00", stock=5, categoria=muebles)
+    Inventario.objects.create(producto=laptop, tipo='entrada', cantidad=3)
+    assert valor(crear_categoria) == (Decimal('300.00'), 3, 1)
+
+    # Precio y categoría cambiados por la API; la cola diferida también actualiza el stock
+    url = reverse('producto-detail', args=[laptop.id])
+    version = api_client.get(url).data['version']
+    response = api_client.patch(url, {'precio': '150.00', 'categoria': muebles.id}, format='json',
+                                HTTP_IF_MATCH=f'"{version}"')
+    assert response.status_code == 200
+    encolar_movimiento(silla, 'salida', 2)
+    aplicar_lote()
+    assert valor(crear_categoria) == (Decimal('0.00'), 0, 0)
+    assert valor(muebles) == (Decimal('510.00'), 6, 2)
+
+    ImportadorCatalogo().importar([(1, {'codigo': 'SKU-1', 'nombre': 'Silla', 'precio': '30', 'categoria': 'Muebles'}),
+                                   (2, {'codigo': 'SKU-2', 'nombre': 'Mesa', 'precio': '90', 'stock': '1',
+                                        'categoria': 'Electrónica'})])
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    # El borrado resta el aporte agregado con UPDATE, sin leer antes los productos
+    with CaptureQueriesContext(connection) as consultas:
+        Producto.objects.filter(pk=laptop.pk).eliminar()
+    assert [q['sql'].split()[0] for q in consultas.captured_queries
+            if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))] == ['UPDATE', 'UPDATE']
+    assert valor(muebles) == (Decimal('90.00'), 3, 1)
+    assert valor(crear_categoria) == (Decimal('90.00'), 1, 1)
+    assert verificar() == []
+
+    response = api_client.get(reverse('valoracion-list'))
+    assert [(c['nombre'], c['valor']) for c in response.data['categorias']] == [
+        ("Electrónica", Decimal('90.00')), ("Muebles", Decimal('90.00'))
+    ]
+    assert response.data['total']['valor'] == Decimal('180.00')
+
+    # Una escritura que se salta el ORM deja una desviación que el comando nocturno detecta y corrige
+    Producto.objects.filter(pk=silla.pk).update(stock=10)
+    with pytest.raises(CommandError):
+        call_command('verify_valuation', stdout=open(os.devnull, 'w'))
+    call_command('verify_valuation', '--corregir', stdout=open(os.devnull, 'w'))
+    assert valor(muebles) == (Decimal('300.00'), 10, 1) and verificar() == []
+
+    # Un movimiento actualiza stock y valoración sin volver a leer ni bloquear el producto
+
+    silla = Producto.objects.get(pk=silla.pk)
+    with CaptureQueriesContext(connection) as consultas:
+        Inventario.objects.create(producto=silla, tipo='salida', cantidad=4)
+    assert not [c['sql'] for c in consultas if c['sql'].startswith('SELECT') and 'FROM "productos_producto"' in c['sql']]
+    assert valor(muebles) == (Decimal('180.00'), 6, 1) and verificar() == []
+    # Con precio y categoría cambiados por otra petición, el movimiento valora con los vigentes
+    otra = Producto.objects.get(pk=silla.pk)
+    otra.precio, otra.categoria = Decimal('50.00'), crear_categoria
+    otra.save()
+    Inventario.objects.create(producto=silla, tipo='entrada', cantidad=2)
+    assert valor(crear_categoria) == (Decimal('490.00'), 9, 2) and verificar() == []
+    # Con el stock en memoria desfasado, la salida se valida contra el de la base de datos
+    Producto.objects.filter(pk=silla.pk).update(stock=1)
+    with pytest.raises(ValueError):
+        Inventario.objects.create(producto=silla, tipo='salida', cantidad=5)
+
+###############################################################################
+
+@pytest.mark.django_db
+def test_vistas_html_sin_consultas_de_autenticacion(client, settings):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    def consultas_de_auth(url):
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get(url)
+        return response, [q['sql'] for q in consultas.captured_queries
+                          if 'auth_user' in q['sql'] or 'usuarios_profile' in q['sql']]
+
+    usuario = User.objects.create_user(username='gerente', password='clave')
+    usuario.profile.role = 'admin'
+    usuario.profile.save()
+    response = client.post(reverse('login'), {'username': 'gerente', 'password': 'clave'})
+    assert response.url == reverse('admin_dashboard')
+
+    response, auth = consultas_de_auth(reverse('initial'))
+    assert response.url == reverse('admin_dashboard') and auth == []
+    response, auth = consultas_de_auth(reverse('admin_dashboard'))
+    assert response.status_code == 200 and auth == [] and b'Bienvenido, gerente' in response.content
+    # Bajo WSGI la página no abre el EventSource que el endpoint rechazaría con 501
+    assert b'new EventSource' not in response.content
+
+    # Pasado el intervalo de revalidación el rol se vuelve a leer y un cambio se aplica
+    usuario.profile.role = 'secretary'
+    usuario.profile.save()
+    assert client.get(reverse('admin_dashboard')).status_code == 200
+    settings.SESION_REVALIDAR_SEGUNDOS = -1
+    assert client.get(reverse('empleado_dashboard')).status_code == 403
+    settings.SESION_REVALIDAR_SEGUNDOS = 300
+
+    from django.test import Client
+    copia = Client()
+    copia.cookies[settings.SESSION_COOKIE_NAME] = client.cookies[settings.SESSION_COOKIE_NAME].value
+    assert copia.get(reverse('initial')).url != reverse('login')
+
+    client.post(reverse('logout'))
+    assert client.get(reverse('initial')).url == reverse('login')
+    assert client.get(reverse('admin_dashboard')).url.startswith('/login/')
+    # Sin Redis las sesiones van a la base de datos: el logout también invalida una cookie copiada
+    assert settings.SESSION_ENGINE == 'django.contrib.sessions.backends.db'
+    assert copia.get(reverse('initial')).url == reverse('login')
+
+###############################################################################
+
+@pytest.mark.django_db(transaction=True)
+def test_instantanea_del_catalogo_compartida(api_client, client, settings, tmp_path, django_assert_num_queries):
+    import csv
+    from .catalogo import Instantanea, instantanea, ruta_instantanea
+
+    settings.CATALOGO_INSTANTANEA_DIR = str(tmp_path)
+    settings.CATALOGO_INSTANTANEA_INTERVALO_MS = 0
+    settings.CACHE_COMPARTIDA = True
+    cafe = Categoria.objects.create(nombre="Cafetería")
+    productos = [
+        Producto.objects.create(nombre="Café molido", codigo='CAF-1', precio="12.50", stock=4, categoria=cafe),
+        Producto.objects.create(nombre="Taza", descripcion="Cerámica", precio="3.05", categoria=cafe),
+        Producto.objects.create(nombre="Descafeinado", precio="9.99", categoria=cafe),
+    ]
+
+    catalogo = instantanea()
+    assert len(catalogo) == 3 and not catalogo.ids.flags.writeable
+    # Un segundo worker mapea el mismo archivo en lugar de reconstruirlo
+    assert Instantanea(ruta_instantanea()).version == catalogo.version
+
+    ids = [productos[1].id, 999999, productos[0].id]
+    with django_assert_num_queries(0):
+        datos = api_client.get(reverse('producto-list'), {'ids': ','.join(map(str, ids))}).data
+    esperado = api_client.get(reverse('producto-detail', args=[productos[1].id])).data
+    assert datos[0] == dict(esperado) and datos[1] == {'id': 999999, 'detail': 'No encontrado.'}
+
+    with django_assert_num_queries(0):
+        sugerencias = api_client.get(reverse('producto-buscar'), {'q': 'cafe'}).data
+    assert [s['nombre'] for s in sugerencias] == ["Café molido", "Descafeinado"]
+    assert [s['nombre'] for s in api_client.get(reverse('producto-buscar'), {'q': 'caf-1'}).data] == ["Café molido"]
+
+    # Un cambio avanza la versión del catálogo y la siguiente lectura la reconstruye
+    productos[0].precio = "13.00"
+    productos[0].save()
+    assert api_client.post(reverse('producto-multi-get'), {'ids': [productos[0].id]}, format='json').data[0]['precio'] == '13.00'
+    assert instantanea().version != catalogo.version
+
+    client.force_login(User.objects.create_user(username='catalogo', password='x'))
+    response = client.get(reverse('exportar_productos'))
+    filas = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+    assert filas[1] == [str(productos[0].id), 'CAF-1', 'Café molido', '', '13.00', '4', str(cafe.id), 'Cafetería']
+
+    # Con la caché de cada worker, la versión no reflejaría los cambios de los demás: sin instantánea
+    settings.CACHE_COMPARTIDA = False
+    assert instantanea() is None
+
+
+###############################################################################################
+
+@pytest.mark.django_db
+def test_pragmas_de_sqlite_en_cada_conexion(tmp_path):
+    from django.db import connections
+    from django.db.backends.sqlite3.base import DatabaseWrapper
+
+    datos = dict(connections['default'].settings_dict, NAME=str(tmp_path / 'local.sqlite3'))
+    datos['OPTIONS'] = {'timeout': 5, 'transaction_mode': 'IMMEDIATE'}
+    conexion = DatabaseWrapper(datos, alias='perfil_sqlite')
+    try:
+        with conexion.cursor() as cursor:
+            vigentes = {}
+            for pragma in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout'):
+                cursor.execute(f"PRAGMA {pragma}")
+                vigentes[pragma] = cursor.fetchone()[0]
+    finally:
+        conexion.close()
+    assert vigentes == {
+        'journal_mode': 'wal', 'synchronous': 1, 'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024, 'busy_timeout': 5000,
+    }
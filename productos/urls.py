@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework import routers
-from .views import ProductoViewSet, CategoriaViewSet, InventarioViewSet
-from . import views
+from .views import ProductoViewSet, CategoriaViewSet, InventarioViewSet, MovimientosAnalyticsViewSet, PronosticoStockViewSet, AuditoriaViewSet, LoteViewSet, ValoracionViewSet
+from . import views, async_views
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -12,20 +12,38 @@ router = routers.DefaultRouter()
 router.register('productos', ProductoViewSet)
 router.register('categorias', CategoriaViewSet)
 router.register('inventarios', InventarioViewSet)
+router.register('pronosticos', PronosticoStockViewSet)
+router.register('analytics/movements', MovimientosAnalyticsViewSet, basename='analytics-movements')
+router.register('auditoria', AuditoriaViewSet, basename='auditoria')
+router.register('batch', LoteViewSet, basename='batch')
+router.register('valoracion', ValoracionViewSet, basename='valoracion')
 
 urlpatterns = [
     path('', views.initial_view, name='initial'),
+    # lecturas con el ORM asíncrono (aprovechan el despliegue ASGI)
+    path('api/async/productos/', async_views.productos_list, name='async_productos_list'),
+    path('api/async/productos/<int:pk>/', async_views.productos_detail, name='async_productos_detail'),
+    path('api/async/categorias/', async_views.categorias_list, name='async_categorias_list'),
+    path('api/async/categorias/<int:pk>/', async_views.categorias_detail, name='async_categorias_detail'),
+    path('api/async/dashboard/', async_views.dashboard_data, name='async_dashboard_data'),
+    path('api/async/exportar_productos_json/', async_views.exportar_productos_json, name='async_exportar_productos_json'),
+    path('api/async/exportar_inventarios_json/', async_views.exportar_inventarios_json, name='async_exportar_inventarios_json'),
     path('api/', include(router.urls)),
     # vistas html
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('empleado-dashboard/', views.empleado_dashboard, name='empleado_dashboard'),
+    # eventos en tiempo real (ASGI)
+    path('eventos/stock/', views.eventos_stock, name='eventos_stock'),
     # aciones de descarga
     path('exportar-inventarios-pdf/', views.exportar_inventarios_pdf, name='exportar_inventarios_pdf'),
     path('exportar-productos-pdf/', views.exportar_productos_pdf, name='exportar_productos_pdf'),
     path('exportar_productos_json/', views.exportar_productos_json, name='exportar_productos_json'),
     path('exportar_inventarios_json/', views.exportar_inventarios_json, name='exportar_inventarios_json'),
+    # ?format=csv|xlsx con filtros desde, hasta, categoria, producto y tipo
+    path('exportar-productos/', views.exportar_productos, name='exportar_productos'),
+    path('exportar-inventarios/', views.exportar_inventarios, name='exportar_inventarios'),
     #logs
     path('logs/', view_logs, name='view_logs'),
     path('logs/export-pdf/', export_logs_pdf, name='export_logs_pdf'),
@@ -0,0 +1,205 @@
+"""
+Valoración del stock (precio × stock) por categoría, mantenida de forma incremental en
+ValoracionCategoria. Cada escritura de productos aplica, en su misma transacción, la
+diferencia entre el aporte anterior y el nuevo de cada producto, así que leer la
+valoración cuesta una fila por categoría. `manage.py verify_valuation` la recalcula
+desde Producto y reporta (o corrige) las diferencias.
+"""
+import collections
+import logging
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Producto, ValoracionCategoria
+
+logger = logging.getLogger(__name__)
+
+# Columnas de Producto que determinan su aporte a la valoración
+CAMPOS = ('precio', 'stock', 'categoria_id', 'eliminado_en')
+CENTIMO = Decimal('0.01')
+
+
+def _deltas():
+    return collections.defaultdict(lambda: [Decimal(0), 0, 0])
+
+
+def aporte(valores):
+    """(categoria_id, valor, unidades) de un producto, o None si no cuenta (no existe o está eliminado)."""
+    if valores is None or valores['eliminado_en'] is not None:
+        return None
+    return valores['categoria_id'], Decimal(str(valores['precio'])) * valores['stock'], valores['stock']
+
+
+def acumular(deltas, anterior, nuevo):
+    """Suma a `deltas` el cambio de aporte de un producto que pasó de `anterior` a `nuevo`."""
+    for valores, signo in ((anterior, -1), (nuevo, 1)):
+        datos = aporte(valores)
+        if datos is not None:
+            categoria_id, valor, unidades = datos
+            delta = deltas[categoria_id]
+            delta[0] += signo * valor
+            delta[1] += signo * unidades
+            delta[2] += signo
+
+
+def aplicar(deltas, crear=True):
+    """
+    Aplica {categoria_id: [valor, unidades, productos]} con un UPDATE incremental por
+    categoría, en orden de id para que dos transacciones no se bloqueen mutuamente.
+    Debe llamarse dentro de la transacción que modificó los productos. Sin `crear` no
+    se insertan las filas que falten (la categoría puede estar borrándose).
+    """
+    ahora = timezone.now()
+    for categoria_id in sorted(deltas):
+        valor, unidades, productos = deltas[categoria_id]
+        if not (valor or unidades or productos):
+            continue
+        filtro = ValoracionCategoria.objects.filter(categoria_id=categoria_id)
+        incremento = {
+            'valor': F('valor') + valor, 'unidades': F('unidades') + unidades,
+            'productos': F('productos') + productos, 'actualizado_en': ahora,
+        }
+        if filtro.update(**incremento) or not crear:
+            continue
+        try:
+            with transaction.atomic():
+                ValoracionCategoria.objects.create(
+                    categoria_id=categoria_id, valor=valor, unidades=unidades, productos=productos
+                )
+        except IntegrityError:
+            # Otra transacción creó la fila de la categoría entre el UPDATE y el INSERT
+            filtro.update(**incremento)
+
+
+def registrar_cambios(pares, crear=True):
+    """Aplica el cambio de valoración de una secuencia de (anterior, nuevo) con los valores de CAMPOS."""
+    deltas = _deltas()
+    for anterior, nuevo in pares:
+        acumular(deltas, anterior, nuevo)
+    aplicar(deltas, crear)
+
+
+def registrar_stock(producto_id, diferencia):
+    """
+    Suma a la valoración `diferencia` unidades de un producto con un UPDATE que toma el
+    precio y la categoría de su fila vigente, no de una instancia en memoria que otra
+    transacción pudo dejar atrás. Debe llamarse en la transacción que acaba de cambiar el
+    stock: su UPDATE ya retiene la fila. Si la categoría aún no tiene fila de valoración,
+    se lee el producto y se aplica como un cambio más.
+    """
+    vigente = Producto._base_manager.filter(pk=producto_id, eliminado_en__isnull=True)
+    valor = DecimalField(max_digits=20, decimal_places=2)
+    if ValoracionCategoria.objects.filter(categoria_id=Subquery(vigente.values('categoria_id')[:1])).update(
+        valor=F('valor') + ExpressionWrapper(Value(diferencia) * Subquery(vigente.values('precio')[:1]),
+                                             output_field=valor),
+        unidades=F('unidades') + diferencia,
+        actualizado_en=timezone.now(),
+    ):
+        return
+    actual = vigente.values(*CAMPOS).first()
+    if actual is not None:
+        registrar_cambios([(dict(actual, stock=actual['stock'] - diferencia), actual)])
+
+
+def retirar(productos):
+    """
+    Resta de la valoración el aporte de `productos` (un queryset de Producto) con un único
+    UPDATE que agrega en la base de datos precio × stock por categoría, sin leer ni
+    bloquear antes las filas. Debe llamarse en la transacción que acaba de retirarlos:
+    su UPDATE ya retiene esas filas, así que los valores agregados son los definitivos.
+    """
+    def por_categoria(total, campo):
+        return Coalesce(Subquery(
+            productos.filter(categoria_id=OuterRef('categoria_id')).order_by().values('categoria_id')
+            .annotate(total=total).values('total')[:1]
+        ), Value(0), output_field=campo)
+
+    valor = DecimalField(max_digits=20, decimal_places=2)
+    ValoracionCategoria.objects.filter(categoria_id__in=productos.values('categoria_id')).update(
+        valor=F('valor') - por_categoria(Sum(F('precio') * F('stock'), output_field=valor), valor),
+        unidades=F('unidades') - por_categoria(Sum('stock'), ValoracionCategoria._meta.get_field('unidades')),
+        productos=F('productos') - por_categoria(Count('id'), ValoracionCategoria._meta.get_field('productos')),
+        actualizado_en=timezone.now(),
+    )
+
+
+def calcular():
+    """Valoración recalculada desde Producto: {categoria_id: (valor, unidades, productos)}."""
+    filas = Producto._base_manager.filter(eliminado_en__isnull=True).values('categoria_id').annotate(
+        valor=Sum(F('precio') * F('stock'), output_field=DecimalField(max_digits=20, decimal_places=2)),
+        unidades=Sum('stock'),
+        total=Count('id'),
+    ).order_by()
+    return {
+        fila['categoria_id']: (Decimal(str(fila['valor'] or 0)).quantize(CENTIMO), fila['unidades'] or 0, fila['total'])
+        for fila in filas
+    }
+
+
+def verificar(corregir=False):
+    """
+    Compara ValoracionCategoria con la valoración recalculada y devuelve las diferencias
+    como [{'categoria', 'esperado', 'actual'}]. Con `corregir` reescribe las filas que
+    no coinciden, bloqueándolas para no pisar cambios concurrentes.
+    """
+    with transaction.atomic():
+        filas = ValoracionCategoria.objects.select_for_update() if corregir else ValoracionCategoria.objects.all()
+        actuales = {fila.categoria_id: fila for fila in filas}
+        esperados = calcular()
+        diferencias = []
+        for categoria_id in sorted(set(actuales) | set(esperados)):
+            esperado = esperados.get(categoria_id, (Decimal('0.00'), 0, 0))
+            fila = actuales.get(categoria_id)
+            actual = (fila.valor.quantize(CENTIMO), fila.unidades, fila.productos) if fila else (Decimal('0.00'), 0, 0)
+            if actual == esperado:
+                continue
+            diferencias.append({'categoria': categoria_id, 'esperado': esperado, 'actual': actual})
+            if corregir:
+                ValoracionCategoria.objects.update_or_create(
+                    categoria_id=categoria_id,
+                    defaults={'valor': esperado[0], 'unidades': esperado[1], 'productos': esperado[2]},
+                )
+    if diferencias:
+        logger.warning(f"Desviación en la valoración de inventario - Categorías: {len(diferencias)}, "
+                       f"Corregida: {'sí' if corregir else 'no'}")
+    return diferencias
+
+
+def reconstruir():
+    """Reescribe ValoracionCategoria desde Producto, tras cargas masivas que no aplican deltas (bulk_create/bulk_update)."""
+    with transaction.atomic():
+        ValoracionCategoria.objects.all().delete()
+        ValoracionCategoria.objects.bulk_create([
+            ValoracionCategoria(categoria_id=categoria_id, valor=valor, unidades=unidades, productos=productos)
+            for categoria_id, (valor, unidades, productos) in calcular().items()
+        ])
+
+
+def resumen():
+    """Valoración de las categorías visibles, leída de una fila por categoría, y el total."""
+    filas = list(
+        ValoracionCategoria.objects.filter(categoria__eliminado_en__isnull=True)
+        .select_related('categoria').order_by('-valor', 'categoria_id')
+    )
+    return {
+        'categorias': [
+            {
+                'categoria': fila.categoria_id,
+                'nombre': fila.categoria.nombre,
+                'valor': fila.valor,
+                'unidades': fila.unidades,
+                'productos': fila.productos,
+                'actualizado_en': fila.actualizado_en,
+            }
+            for fila in filas
+        ],
+        'total': {
+            'valor': sum((fila.valor for fila in filas), Decimal('0.00')),
+            'unidades': sum(fila.unidades for fila in filas),
+            'productos': sum(fila.productos for fila in filas),
+        },
+    }
@@ -1,35 +1,79 @@
-import json
+import asyncio
+import datetime
 import logging
+import time
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, HttpResponse, JsonResponse
+from django.http import HttpResponseForbidden, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import logout
-from .models import Producto, Categoria, Inventario
-from django.shortcuts import render, redirect, get_object_or_404
+from .models import Producto, Categoria, Inventario, PronosticoStock, MovimientoPendiente, RegistroAuditoria
+from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login
 from django.conf import settings
-from .serializers import ProductoSerializer, CategoriaSerializer, InventarioSerializer
-from drf_yasg.utils import swagger_auto_schema
-from drf_yasg import openapi
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from django.db.models import F, Q
+from .serializers import (
+    ProductoSerializer, CategoriaSerializer, InventarioSerializer, PronosticoStockSerializer,
+    RegistroAuditoriaSerializer,
+)
+from .snapshots import stock_en
+from .rollups import serie_movimientos
+from .pronosticos import filtro_bajo_stock
+from .importacion import formato_de, importar_catalogo
+from .ingesta import ColaLlena, encolar_movimiento
+from . import auditoria, valoracion
+from .auditoria import AuditoriaMixin, auditar
+from .concurrencia import ConflictoVersion, VersionadoMixin, respuesta_conflicto
+from .cache import obtener_productos
+from .lotes import ejecutar_lote
+from .reportes import respuesta_pdf
+from .archivo import historial
+from .exportacion import (
+    COLUMNAS_INVENTARIOS, COLUMNAS_PRODUCTOS, FORMATOS as FORMATOS_EXPORTACION, consulta_inventarios,
+    consulta_productos, respuesta_exportacion,
+)
+from .eventos import broker, iniciar_escucha
 import os
 from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import render
 from io import BytesIO  # Añade esta línea al inicio del archivo
 from django.utils import timezone  # También necesaria para la fecha
+from django.utils.dateparse import parse_date, parse_datetime
 from django.contrib import messages
+from Management import renderers
+from usuarios.sesion import guardar_en_sesion, sesion_requerida, usuario_de_sesion
 
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
 
+# Columnas de los reportes PDF: (título, ancho en puntos, alineación); suman el ancho útil de la página
+COLUMNAS_PDF_INVENTARIOS = [
+    ("Tipo", 70, 'izquierda'),
+    ("Producto", 250, 'izquierda'),
+    ("Cantidad", 70, 'derecha'),
+    ("Fecha Actualización", 150, 'izquierda'),
+]
+COLUMNAS_PDF_PRODUCTOS = [
+    ("Nombre", 170, 'izquierda'),
+    ("Descripción", 230, 'izquierda'),
+    ("Precio", 70, 'derecha'),
+    ("Stock", 70, 'derecha'),
+]
+
 def initial_view(request):
-    logger.info(f"Acceso a vista inicial - Usuario: {'autenticado' if request.user.is_authenticated else 'no autenticado'}")
-    if request.user.is_authenticated:
-        logger.info(f"Redirección por rol - Usuario: {request.user.username}, Rol: {request.user.profile.role}")
-        if request.user.profile.role == 'admin':
+    # El usuario y su rol se leen de la sesión: esta vista no consulta auth_user ni el perfil
+    usuario = usuario_de_sesion(request)
+    logger.info(f"Acceso a vista inicial - Usuario: {'autenticado' if usuario else 'no autenticado'}")
+    if usuario:
+        nombre, rol = usuario
+        logger.info(f"Redirección por rol - Usuario: {nombre}, Rol: {rol}")
+        if rol == 'admin':
             logger.debug("Redirigiendo a dashboard de administrador")
             return redirect('admin_dashboard')
         else:
@@ -41,7 +85,8 @@ def initial_view(request):
 
 def logout_view(request):
     if request.method == 'POST':
-        username = request.user.username if request.user.is_authenticated else 'usuario desconocido'
+        usuario = usuario_de_sesion(request)
+        username = usuario[0] if usuario else 'usuario desconocido'
         logger.info(f"Intento de logout - Usuario: {username}")
         logout(request)
         logger.info(f"Logout exitoso - Usuario: {username}")
@@ -57,6 +102,7 @@ def login_view(request):
         user = authenticate(request, username=username, password=request.POST['password'])
         if user is not None:
             login(request, user)
+            guardar_en_sesion(request, user)
             logger.info(f"Login exitoso - Usuario: {username}, Rol: {user.profile.role}")
             
             if user.profile.role == 'admin':
@@ -72,55 +118,62 @@ def login_view(request):
     logger.debug("Acceso a página de login")
     return render(request, 'login.html')
 
-@login_required(login_url='/login/')
+@sesion_requerida(login_url='/login/')
 def admin_dashboard(request):
-    if request.user.profile.role != 'admin':
-        logger.warning(f"Intento de acceso no autorizado a admin_dashboard - Usuario: {request.user.username}")
+    nombre, rol = usuario_de_sesion(request)
+    if rol != 'admin':
+        logger.warning(f"Intento de acceso no autorizado a admin_dashboard - Usuario: {nombre}")
         return HttpResponseForbidden("No tienes permiso para acceder a esta página.")
 
-    logger.info(f"Acceso a admin_dashboard - Usuario: {request.user.username}")
+    logger.info(f"Acceso a admin_dashboard - Usuario: {nombre}")
     try:
         productos = Producto.objects.select_related('categoria').all()
         categorias = Categoria.objects.all()
-        productos_bajo_stock = Producto.objects.filter(stock__lte=5)
+        productos_bajo_stock = Producto.objects.filter(filtro_bajo_stock()).select_related('pronostico')
         inventarios = Inventario.objects.select_related('producto').order_by('-fecha_actualizacion')
         
         logger.debug(f"Datos cargados - Productos: {productos.count()}, Categorías: {categorias.count()}, Productos bajo stock: {productos_bajo_stock.count()}")
         
         return render(request, 'admin_dashboard.html', {
+            'usuario': nombre,
             'productos': productos,
             'inventarios': inventarios,
             'categorias': categorias,
-            'productos_bajo_stock': productos_bajo_stock
+            'productos_bajo_stock': productos_bajo_stock,
+            'valoracion': valoracion.resumen(),
+            'eventos_activos': settings.EVENTOS_SSE_ACTIVO,
         })
     except Exception as e:
-        logger.error(f"Error en admin_dashboard - Usuario: {request.user.username}, Error: {str(e)}")
+        logger.error(f"Error en admin_dashboard - Usuario: {nombre}, Error: {str(e)}")
         raise
 
-@login_required(login_url='/login/')
+@sesion_requerida(login_url='/login/')
 def empleado_dashboard(request):
-    if request.user.profile.role == 'secretary':
-        logger.warning(f"Intento de acceso no autorizado a empleado_dashboard - Usuario: {request.user.username}, Rol: secretary")
+    nombre, rol = usuario_de_sesion(request)
+    if rol == 'secretary':
+        logger.warning(f"Intento de acceso no autorizado a empleado_dashboard - Usuario: {nombre}, Rol: secretary")
         return HttpResponseForbidden("No tienes permiso para acceder a esta página.")
 
-    logger.info(f"Acceso a empleado_dashboard - Usuario: {request.user.username}")
+    logger.info(f"Acceso a empleado_dashboard - Usuario: {nombre}")
     try:
         productos = Producto.objects.select_related('categoria').all()
-        productos_bajo_stock = Producto.objects.filter(stock__lte=5)
+        productos_bajo_stock = Producto.objects.filter(filtro_bajo_stock()).select_related('pronostico')
         categorias = Categoria.objects.all()
         
         logger.debug(f"Datos cargados - Productos: {productos.count()}, Productos bajo stock: {productos_bajo_stock.count()}")
         
         return render(request, 'empleado_dashboard.html', {
+            'usuario': nombre,
             'productos': productos,
             'categorias': categorias,
-            'productos_bajo_stock': productos_bajo_stock
+            'productos_bajo_stock': productos_bajo_stock,
+            'eventos_activos': settings.EVENTOS_SSE_ACTIVO,
         })
     except Exception as e:
-        logger.error(f"Error en empleado_dashboard - Usuario: {request.user.username}, Error: {str(e)}")
+        logger.error(f"Error en empleado_dashboard - Usuario: {nombre}, Error: {str(e)}")
         raise
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(AuditoriaMixin, VersionadoMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
 
@@ -141,7 +194,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
             return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def create(self, request, *args, **kwargs):
-        logger.info(f"Creando categoría - Usuario: {request.user.username}, Datos: {request.data}")
+        logger.info(f"Creando categoría - Usuario: {request.user.username}")
         try:
             response = super().create(request, *args, **kwargs)
             logger.info(f"Categoría creada exitosamente - ID: {response.data.get('id')}")
@@ -161,7 +214,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
             return JsonResponse({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
 
     def update(self, request, *args, **kwargs):
-        logger.info(f"Actualizando categoría - Usuario: {request.user.username}, ID: {kwargs.get('pk')}, Datos: {request.data}")
+        logger.info(f"Actualizando categoría - Usuario: {request.user.username}, ID: {kwargs.get('pk')}")
         try:
             response = super().update(request, *args, **kwargs)
             logger.info(f"Categoría actualizada exitosamente - ID: {kwargs.get('pk')}")
@@ -171,7 +224,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
             return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def partial_update(self, request, *args, **kwargs):
-        logger.info(f"Actualización parcial de categoría - Usuario: {request.user.username}, ID: {kwargs.get('pk')}, Datos: {request.data}")
+        logger.info(f"Actualización parcial de categoría - Usuario: {request.user.username}, ID: {kwargs.get('pk')}")
         try:
             response = super().partial_update(request, *args, **kwargs)
             logger.info(f"Categoría actualizada parcialmente exitosamente - ID: {kwargs.get('pk')}")
@@ -183,15 +236,22 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         logger.warning(f"Eliminando categoría - Usuario: {request.user.username}, ID: {kwargs.get('pk')}")
         try:
-            instance = self.get_object()
-            response = super().destroy(request, *args, **kwargs)
-            logger.warning(f"Categoría eliminada exitosamente - ID: {instance.id}, Nombre: {instance.nombre}")
-            return response
+            # Borrado lógico: sus productos quedan ocultos al instante y purge_deleted los borra después
+            objeto = self.get_queryset().filter(pk=kwargs.get('pk'))
+            if not self.filtrar_por_version(objeto).eliminar():
+                if objeto.exists():
+                    return respuesta_conflicto()
+                return Response({'detail': 'No encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+            auditar(request.user, 'eliminar', Categoria, kwargs.get('pk'))
+            logger.warning(f"Categoría eliminada exitosamente - ID: {kwargs.get('pk')}")
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        except ConflictoVersion:
+            return respuesta_conflicto()
         except Exception as e:
             logger.error(f"Error al eliminar categoría - Usuario: {request.user.username}, ID: {kwargs.get('pk')}, Error: {str(e)}")
             return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(AuditoriaMixin, VersionadoMixin, viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
 
@@ -203,6 +263,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         logger.info(f"Listando productos - Usuario: {request.user.username}, Filtros: {request.query_params}")
+        if 'ids' in request.query_params:
+            return self._consulta_multiple(request, request.query_params['ids'].split(','))
         try:
             response = super().list(request, *args, **kwargs)
             logger.debug(f"Productos listados exitosamente - Total: {len(response.data)}")
@@ -212,7 +274,7 @@ class ProductoViewSet(viewsets.ModelViewSet):
             return JsonResponse({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     def create(self, request, *args, **kwargs):
-        logger.info(f"Creando producto - Usuario: {request.user.username}, Datos: {request.data}")
+        logger.info(f"Creando producto - Usuario: {request.user.username}")
         try:
             response = super().create(request, *args, **kwargs)
             logger.info(f"Producto creado exitosamente - ID: {response.data.get('id')}")
@@ -232,7 +294,7 @@ class ProductoViewSet(viewsets.ModelViewSet):
             return JsonResponse({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
 
     def update(self, request, *args, **kwargs):
-        logger.info(f"Actualizando producto - Usuario: {request.user.username}, ID: {kwargs.get('pk')}, Datos: {request.data}")
+        logger.info(f"Actualizando producto - Usuario: {request.user.username}, ID: {kwargs.get('pk')}")
         try:
             response = super().update(request, *args, **kwargs)
             logger.info(f"Producto actualizado exitosamente - ID: {kwargs.get('pk')}")
@@ -242,7 +304,7 @@ class ProductoViewSet(viewsets.ModelViewSet):
             return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def partial_update(self, request, *args, **kwargs):
-        logger.info(f"Actualización parcial de producto - Usuario: {request.user.username}, ID: {kwargs.get('pk')}, Datos: {request.data}")
+        logger.info(f"Actualización parcial de producto - Usuario: {request.user.username}, ID: {kwargs.get('pk')}")
         try:
             response = super().partial_update(request, *args, **kwargs)
             logger.info(f"Producto actualizado parcialmente exitosamente - ID: {kwargs.get('pk')}")
@@ -254,15 +316,115 @@ class ProductoViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         logger.warning(f"Eliminando producto - Usuario: {request.user.username}, ID: {kwargs.get('pk')}")
         try:
-            instance = self.get_object()
-            response = super().destroy(request, *args, **kwargs)
-            logger.warning(f"Producto eliminado exitosamente - ID: {instance.id}, Nombre: {instance.nombre}")
-            return response
+            objeto = self.get_queryset().filter(pk=kwargs.get('pk'))
+            if not self.filtrar_por_version(objeto).eliminar():
+                if objeto.exists():
+                    return respuesta_conflicto()
+                return Response({'detail': 'No encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+            auditar(request.user, 'eliminar', Producto, kwargs.get('pk'))
+            logger.warning(f"Producto eliminado exitosamente - ID: {kwargs.get('pk')}")
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        except ConflictoVersion:
+            return respuesta_conflicto()
         except Exception as e:
             logger.error(f"Error al eliminar producto - Usuario: {request.user.username}, ID: {kwargs.get('pk')}, Error: {str(e)}")
             return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-class InventarioViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'], url_path='stock-at')
+    def stock_at(self, request, pk=None):
+        valor = request.query_params.get('t', '')
+        momento = parse_datetime(valor)
+        if momento is None:
+            fecha = parse_date(valor)
+            if fecha is None:
+                return Response({'error': "Parámetro 't' inválido, use YYYY-MM-DD o ISO 8601"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            # Una fecha sin hora se interpreta como el cierre de ese día
+            momento = datetime.datetime.combine(fecha, datetime.time.max)
+        if timezone.is_naive(momento):
+            momento = timezone.make_aware(momento)
+
+        producto = self.get_object()
+        stock, snapshot = stock_en(producto.id, momento)
+        logger.info(f"Consulta de stock histórico - Usuario: {request.user.username}, ID: {producto.id}, Momento: {momento.isoformat()}")
+        return Response({
+            'producto': producto.id,
+            't': momento.isoformat(),
+            'stock': stock,
+            'snapshot': snapshot.fecha if snapshot else None,
+        })
+
+    @action(detail=False, methods=['post'], url_path='multi-get')
+    def multi_get(self, request):
+        """Como ?ids= pero con los ids en el cuerpo ({"ids": [...]}), para listas largas."""
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list):
+            return Response({'error': "El cuerpo debe ser {\"ids\": [...]}"}, status=status.HTTP_400_BAD_REQUEST)
+        return self._consulta_multiple(request, ids)
+
+    LIMITE_BUSQUEDA = 10
+    LIMITE_BUSQUEDA_MAXIMO = 50
+
+    @action(detail=False, methods=['get'])
+    def buscar(self, request):
+        """
+        Sugerencias para el autocompletado: productos cuyo nombre o código contiene ?q=,
+        primero los que empiezan por él. Se resuelven en la instantánea del catálogo.
+        """
+        texto = request.query_params.get('q', '').strip()
+        try:
+            limite = min(int(request.query_params.get('limite', self.LIMITE_BUSQUEDA)), self.LIMITE_BUSQUEDA_MAXIMO)
+        except ValueError:
+            return Response({'error': "'limite' debe ser un entero"}, status=status.HTTP_400_BAD_REQUEST)
+        if not texto:
+            return Response([])
+        from .catalogo import instantanea
+
+        catalogo = instantanea()
+        if catalogo is not None:
+            return Response(catalogo.buscar(texto, max(limite, 1)))
+        productos = Producto.objects.filter(Q(nombre__icontains=texto) | Q(codigo__istartswith=texto)).order_by('id')
+        return Response(ProductoSerializer(productos[:max(limite, 1)], many=True).data)
+
+    def _consulta_multiple(self, request, valores):
+        """
+        Productos en el orden pedido (los repetidos se repiten), resueltos desde la caché
+        por objeto y, los que falten, con consultas id__in por trozos. Los que no existen
+        aparecen como {'id': n, 'detail': 'No encontrado.'}.
+        """
+        try:
+            ids = [int(valor) for valor in valores if str(valor).strip()]
+        except (TypeError, ValueError):
+            return Response({'error': 'Los ids deben ser enteros'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.MULTIGET_MAX_IDS:
+            return Response({'error': f"Se admiten como máximo {settings.MULTIGET_MAX_IDS} ids"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        productos = obtener_productos(ids)
+        logger.info(f"Consulta múltiple de productos - Usuario: {request.user.username}, "
+                    f"Pedidos: {len(ids)}, Encontrados: {len(productos)}")
+        return Response([productos.get(pk) or {'id': pk, 'detail': 'No encontrado.'} for pk in ids])
+
+    @action(detail=False, methods=['post'], url_path='importar', parser_classes=[MultiPartParser])
+    def importar(self, request):
+        """Importa un catálogo CSV o NDJSON (campo 'archivo') y devuelve los errores por fila."""
+        archivo = request.FILES.get('archivo')
+        if archivo is None:
+            return Response({'error': "Falta el archivo en el campo 'archivo'"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            formato = formato_de(archivo.name, request.query_params.get('formato'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Importando catálogo - Usuario: {request.user.username}, Archivo: {archivo.name}, Tamaño: {archivo.size}")
+        try:
+            informe = importar_catalogo(
+                archivo, formato, crear_categorias=request.query_params.get('crear_categorias', '1') != '0'
+            )
+        except UnicodeDecodeError:
+            return Response({'error': "El archivo debe estar codificado en UTF-8"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(informe)
+
+class InventarioViewSet(VersionadoMixin, viewsets.ModelViewSet):
     queryset = Inventario.objects.all()
     serializer_class = InventarioSerializer
 
@@ -272,6 +434,84 @@ class InventarioViewSet(viewsets.ModelViewSet):
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    def create(self, request, *args, **kwargs):
+        if not settings.INVENTARIO_ESCRITURA_DIFERIDA:
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        try:
+            pendiente = encolar_movimiento(datos['producto'], datos['tipo'], datos.get('cantidad', 0))
+        except ColaLlena:
+            logger.warning(f"Cola de movimientos llena - Usuario: {request.user.username}")
+            response = Response({'error': 'La cola de movimientos está llena, reintente más tarde'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = '5'
+            return response
+        logger.info(f"Movimiento encolado - Ticket: {pendiente.ticket}, Usuario: {request.user.username}")
+        return Response({
+            'ticket': pendiente.ticket,
+            'estado': pendiente.estado,
+            'url': reverse('inventario-ticket', args=[pendiente.ticket], request=request),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'tickets/(?P<ticket>[0-9a-f-]{36})', url_name='ticket')
+    def ticket(self, request, ticket=None):
+        pendiente = MovimientoPendiente.objects.filter(ticket=ticket).first()
+        if pendiente is None:
+            return Response({'detail': 'No encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'ticket': pendiente.ticket,
+            'estado': pendiente.estado,
+            'inventario': pendiente.inventario_id,
+            'error': pendiente.error,
+            'recibido_en': pendiente.recibido_en,
+            'procesado_en': pendiente.procesado_en,
+        })
+
+    LIMITE_HISTORIAL = 100
+    LIMITE_HISTORIAL_MAXIMO = 1000
+
+    @action(detail=False, methods=['get'])
+    def historial(self, request):
+        """
+        Movimientos más recientes primero, filtrados por ?producto=, ?tipo=, ?desde= y
+        ?hasta=. Con ?incluir_archivo=1 también se leen los meses ya archivados.
+        """
+        params = request.query_params
+        filtros = {}
+        for nombre in ('desde', 'hasta'):
+            if params.get(nombre):
+                momento = parse_datetime(params[nombre])
+                if momento is None:
+                    fecha = parse_date(params[nombre])
+                    if fecha is None:
+                        return Response({'error': f"Fecha inválida en '{nombre}', use YYYY-MM-DD o ISO 8601"},
+                                        status=status.HTTP_400_BAD_REQUEST)
+                    momento = datetime.datetime.combine(
+                        fecha, datetime.time.min if nombre == 'desde' else datetime.time.max
+                    )
+                if timezone.is_naive(momento):
+                    momento = timezone.make_aware(momento)
+                filtros[nombre] = momento
+        producto = params.get('producto')
+        if producto and not producto.isdigit():
+            return Response({'error': "'producto' debe ser un id numérico"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limite = min(int(params.get('limite', self.LIMITE_HISTORIAL)), self.LIMITE_HISTORIAL_MAXIMO)
+        except ValueError:
+            return Response({'error': "'limite' debe ser un entero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        movimientos = historial(
+            producto_id=int(producto) if producto else None,
+            tipo=params.get('tipo'),
+            incluir_archivo=params.get('incluir_archivo') in ('1', 'true'),
+            limite=max(limite, 1),
+            **filtros,
+        )
+        return Response(list(movimientos))
+
     def perform_create(self, serializer):
         try:
             instance = serializer.save()
@@ -283,18 +523,202 @@ class InventarioViewSet(viewsets.ModelViewSet):
             logger.error(f"Error al crear registro de inventario - Usuario: {self.request.user.username}, Error: {str(e)}")
             raise
 
+class MovimientosAnalyticsViewSet(viewsets.ViewSet):
+    """Series de entradas y salidas agregadas por producto o categoría, leídas de los acumulados diarios."""
+
+    def get_permissions(self):
+        if getattr(settings, 'TESTING', False):
+            logger.debug("Modo TESTING - Permisos AllowAny")
+            return [AllowAny()]
+        return [IsAuthenticated()]
+
+    def list(self, request):
+        params = request.query_params
+        logger.info(f"Consultando analíticas de movimientos - Usuario: {request.user.username}, Filtros: {params}")
+        fechas = {}
+        for nombre in ('desde', 'hasta'):
+            if params.get(nombre):
+                fechas[nombre] = parse_date(params[nombre])
+                if fechas[nombre] is None:
+                    return Response({'error': f"Fecha inválida en '{nombre}', use YYYY-MM-DD"},
+                                    status=status.HTTP_400_BAD_REQUEST)
+        try:
+            serie = serie_movimientos(
+                agrupar_por=params.get('group_by', 'categoria'),
+                intervalo=params.get('interval', 'day'),
+                tipo=params.get('tipo'),
+                producto_id=params.get('producto'),
+                categoria_id=params.get('categoria'),
+                **fechas,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serie)
+
+class ValoracionViewSet(viewsets.ViewSet):
+    """Valor del stock por categoría y total, leído de la valoración mantenida de forma incremental."""
+
+    def get_permissions(self):
+        if getattr(settings, 'TESTING', False):
+            logger.debug("Modo TESTING - Permisos AllowAny")
+            return [AllowAny()]
+        return [IsAuthenticated()]
+
+    def list(self, request):
+        logger.info(f"Consultando valoración de inventario - Usuario: {request.user.username}")
+        return Response(valoracion.resumen())
+
+class AuditoriaViewSet(viewsets.ViewSet):
+    """Consulta de la auditoría filtrada por modelo, objeto, usuario y rango de fechas (solo administradores)."""
+    LIMITE_POR_DEFECTO = 100
+    LIMITE_MAXIMO = 1000
+
+    def get_permissions(self):
+        if getattr(settings, 'TESTING', False):
+            logger.debug("Modo TESTING - Permisos AllowAny")
+            return [AllowAny()]
+        return [IsAuthenticated()]
+
+    def list(self, request):
+        if not getattr(settings, 'TESTING', False) and request.user.profile.role != 'admin':
+            logger.warning(f"Acceso no autorizado a la auditoría - Usuario: {request.user.username}")
+            return Response({'error': 'No autorizado'}, status=status.HTTP_403_FORBIDDEN)
+        params = request.query_params
+        logger.info(f"Consultando auditoría - Usuario: {request.user.username}, Filtros: {params}")
+        # Lo que aún está en el buffer de este proceso también debe aparecer
+        auditoria.vaciar()
+
+        registros = RegistroAuditoria.objects.order_by('-fecha', '-id')
+        if params.get('modelo'):
+            modelo = params['modelo']
+            registros = registros.filter(modelo__iexact=modelo if '.' in modelo else f"productos.{modelo}")
+        if params.get('objeto'):
+            registros = registros.filter(objeto_id=params['objeto'])
+        if params.get('usuario'):
+            usuario = params['usuario']
+            registros = registros.filter(usuario_id=usuario) if usuario.isdigit() else registros.filter(usuario_nombre=usuario)
+        for nombre, filtro in (('desde', 'fecha__gte'), ('hasta', 'fecha__lte')):
+            if params.get(nombre):
+                momento = parse_datetime(params[nombre])
+                if momento is None:
+                    fecha = parse_date(params[nombre])
+                    if fecha is None:
+                        return Response({'error': f"Fecha inválida en '{nombre}', use YYYY-MM-DD o ISO 8601"},
+                                        status=status.HTTP_400_BAD_REQUEST)
+                    momento = datetime.datetime.combine(
+                        fecha, datetime.time.min if nombre == 'desde' else datetime.time.max
+                    )
+                if timezone.is_naive(momento):
+                    momento = timezone.make_aware(momento)
+                registros = registros.filter(**{filtro: momento})
+        try:
+            limite = min(int(params.get('limite', self.LIMITE_POR_DEFECTO)), self.LIMITE_MAXIMO)
+        except ValueError:
+            return Response({'error': "'limite' debe ser un entero"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(RegistroAuditoriaSerializer(registros[:max(limite, 1)], many=True).data)
+
+class LoteViewSet(viewsets.ViewSet):
+    """
+    POST /api/batch/ con {"requests": [{"method", "path", "body"?, "headers"?}, ...], "atomic"?}:
+    ejecuta las peticiones en proceso y devuelve sus respuestas en el mismo orden.
+    """
+
+    def get_permissions(self):
+        if getattr(settings, 'TESTING', False):
+            logger.debug("Modo TESTING - Permisos AllowAny")
+            return [AllowAny()]
+        return [IsAuthenticated()]
+
+    def create(self, request):
+        peticiones = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(peticiones, list) or not peticiones:
+            return Response({'error': "El cuerpo debe ser {\"requests\": [...]}"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(peticiones) > settings.LOTE_API_MAX_PETICIONES:
+            return Response({'error': f"Se admiten como máximo {settings.LOTE_API_MAX_PETICIONES} peticiones por lote"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        atomico = bool(request.data.get('atomic', False))
+        logger.info(f"Ejecutando lote - Usuario: {request.user.username}, Peticiones: {len(peticiones)}, Atómico: {atomico}")
+
+        inicio = time.perf_counter()
+        resultados, revertido = ejecutar_lote(request, peticiones, atomico)
+        duracion = round((time.perf_counter() - inicio) * 1000, 2)
+        logger.info(f"Lote ejecutado - Usuario: {request.user.username}, Peticiones: {len(peticiones)}, "
+                    f"Revertido: {revertido}, Duración: {duracion}ms")
+        return Response({'respuestas': resultados, 'revertido': revertido, 'duracion_ms': duracion})
+
+class PronosticoStockViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = PronosticoStock.objects.select_related('producto').filter(
+        producto__eliminado_en__isnull=True, producto__categoria__eliminado_en__isnull=True
+    ).order_by(F('dias_para_agotarse').asc(nulls_last=True), 'producto_id')
+    serializer_class = PronosticoStockSerializer
+
+    def get_permissions(self):
+        if getattr(settings, 'TESTING', False):
+            logger.debug("Modo TESTING - Permisos AllowAny")
+            return [AllowAny()]
+        return [IsAuthenticated()]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if getattr(self, 'swagger_fake_view', False):
+            return queryset
+        if self.request.query_params.get('reorden') in ('1', 'true'):
+            queryset = queryset.filter(punto_reorden__gte=F('producto__stock'))
+        return queryset
+
+async def eventos_stock(request):
+    """Flujo Server-Sent Events con los cambios de stock y las alertas de stock bajo."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+    if not isinstance(request, ASGIRequest):
+        # Bajo WSGI la conexión abierta bloquearía un worker completo
+        return JsonResponse({'error': 'Los eventos en tiempo real requieren el despliegue ASGI'}, status=501)
+
+    ultimo_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        ultimo_id = int(ultimo_id) if ultimo_id else None
+    except ValueError:
+        ultimo_id = None
+
+    iniciar_escucha()
+    logger.info(f"Conexión a eventos de stock - Usuario: {user.username}, Último evento: {ultimo_id}")
+
+    async def flujo():
+        suscripcion, pendientes = broker.suscribir(ultimo_id)
+        _, cola = suscripcion
+        try:
+            yield "retry: 3000\n\n"
+            for evento in pendientes:
+                yield evento.formatear()
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=settings.EVENTOS_HEARTBEAT_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield evento.formatear()
+        finally:
+            broker.cancelar(suscripcion)
+            logger.debug(f"Conexión a eventos de stock cerrada - Usuario: {user.username}")
+
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 def eliminar_producto(request, producto_id):
     logger.warning(f"Intento de eliminar producto - Usuario: {request.user.username}, Producto ID: {producto_id}")
     try:
-        producto = get_object_or_404(Producto, id=producto_id)
-        if request.method == 'POST':
-            producto.delete()
-            logger.warning(f"Producto eliminado exitosamente - ID: {producto_id}, Nombre: {producto.nombre}, "
-                          f"Usuario: {request.user.username}")
-            return JsonResponse({'status': 'success'}, status=200)
-        logger.warning(f"Método no permitido para eliminar producto - Usuario: {request.user.username}")
-        return JsonResponse({'error': 'Método no permitido'}, status=405)
+        if request.method != 'POST':
+            logger.warning(f"Método no permitido para eliminar producto - Usuario: {request.user.username}")
+            return JsonResponse({'error': 'Método no permitido'}, status=405)
+        if not Producto.objects.filter(id=producto_id).eliminar():
+            return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+        auditar(request.user, 'eliminar', Producto, producto_id)
+        logger.warning(f"Producto eliminado exitosamente - ID: {producto_id}, Usuario: {request.user.username}")
+        return JsonResponse({'status': 'success'}, status=200)
     except Exception as e:
         logger.error(f"Error al eliminar producto - Usuario: {request.user.username}, Producto ID: {producto_id}, "
                     f"Error: {str(e)}")
@@ -304,39 +728,21 @@ def eliminar_producto(request, producto_id):
 def exportar_inventarios_pdf(request):
     logger.info(f"Generando PDF de inventarios - Usuario: {request.user.username}")
     try:
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'inline; filename="reporte_inventarios.pdf"'
-
-        p = canvas.Canvas(response, pagesize=letter)
-        p.setFont("Helvetica", 10)
-        p.drawString(200, 750, "Reporte de Inventarios")
-        
-        p.drawString(30, 730, "Tipo")
-        p.drawString(120, 730, "Producto")
-        p.drawString(300, 730, "Cantidad")
-        p.drawString(420, 730, "Fecha Actualización")
-
-        inventarios = Inventario.objects.select_related('producto').all()
-        y = 710
-
-        for inv in inventarios:
-            p.drawString(30, y, inv.get_tipo_display())
-            p.drawString(120, y, inv.producto.nombre)
-            p.drawString(300, y, str(inv.cantidad))
-            p.drawString(420, y, inv.fecha_actualizacion.strftime("%Y-%m-%d %H:%M:%S"))
-            y -= 20
-
-            if y < 100:
-                p.showPage()
-                p.setFont("Helvetica", 10)
-                y = 750
-
-        p.showPage()
-        p.save()
-        
-        logger.info(f"PDF de inventarios generado exitosamente - Usuario: {request.user.username}, "
-                  f"Registros: {inventarios.count()}")
-        return response
+        tipos = dict(Inventario._meta.get_field('tipo').choices)
+        filas = (
+            (tipos.get(tipo, tipo), nombre, str(cantidad), fecha.strftime("%Y-%m-%d %H:%M:%S"))
+            for tipo, nombre, cantidad, fecha in Inventario.objects.values_list(
+                'tipo', 'producto__nombre', 'cantidad', 'fecha_actualizacion'
+            ).iterator(chunk_size=2000)
+        )
+        usuario = request.user.username
+        return respuesta_pdf(
+            "Reporte de Inventarios", COLUMNAS_PDF_INVENTARIOS, filas, "reporte_inventarios.pdf",
+            al_terminar=lambda total: logger.info(
+                f"PDF de inventarios generado exitosamente - Usuario: {usuario}, Registros: {total}"
+            ),
+            al_fallar=lambda e: logger.error(f"Error al generar PDF de inventarios - Usuario: {usuario}, Error: {str(e)}"),
+        )
     except Exception as e:
         logger.error(f"Error al generar PDF de inventarios - Usuario: {request.user.username}, Error: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
@@ -345,61 +751,50 @@ def exportar_inventarios_pdf(request):
 def exportar_productos_pdf(request):
     logger.info(f"Generando PDF de productos - Usuario: {request.user.username}")
     try:
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'inline; filename="reporte_productos.pdf"'
-
-        p = canvas.Canvas(response, pagesize=letter)
-        p.setFont("Helvetica", 10)
-        p.drawString(200, 750, "Reporte de Productos")
-        
-        p.drawString(30, 730, "Nombre")
-        p.drawString(200, 730, "Descripción")
-        p.drawString(420, 730, "Precio")
-        p.drawString(500, 730, "Stock")
-
-        productos = Producto.objects.all()
-        y = 710
-
-        for producto in productos:
-            p.drawString(30, y, producto.nombre)
-            p.drawString(200, y, producto.descripcion)
-            p.drawString(420, y, str(producto.precio))
-            p.drawString(500, y, str(producto.stock))
-            y -= 20
-
-            if y < 100:
-                p.showPage()
-                p.setFont("Helvetica", 10)
-                y = 750
-
-        p.showPage()
-        p.save()
-        
-        logger.info(f"PDF de productos generado exitosamente - Usuario: {request.user.username}, "
-                  f"Productos: {productos.count()}")
-        return response
+        filas = (
+            (nombre, descripcion or '', str(precio), str(stock))
+            for nombre, descripcion, precio, stock in Producto.objects.values_list(
+                'nombre', 'descripcion', 'precio', 'stock'
+            ).iterator(chunk_size=2000)
+        )
+        usuario = request.user.username
+        return respuesta_pdf(
+            "Reporte de Productos", COLUMNAS_PDF_PRODUCTOS, filas, "reporte_productos.pdf",
+            al_terminar=lambda total: logger.info(
+                f"PDF de productos generado exitosamente - Usuario: {usuario}, Productos: {total}"
+            ),
+            al_fallar=lambda e: logger.error(f"Error al generar PDF de productos - Usuario: {usuario}, Error: {str(e)}"),
+        )
     except Exception as e:
         logger.error(f"Error al generar PDF de productos - Usuario: {request.user.username}, Error: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
 
 def exportar_productos_json(request):
+    from .catalogo import instantanea
+
     logger.info(f"Generando JSON de productos - Usuario: {request.user.username if request.user.is_authenticated else 'Anónimo'}")
     try:
-        productos = Producto.objects.select_related('categoria').all()
-        data = []
-
-        for p in productos:
-            data.append({
-                'id': p.id,
-                'nombre': p.nombre,
-                'descripcion': p.descripcion,
-                'precio': float(p.precio),
-                'stock': p.stock,
-                'categoria': p.categoria.nombre
-            })
+        catalogo = instantanea()
+        if catalogo is not None:
+            data = [
+                {'id': pk, 'nombre': nombre, 'descripcion': descripcion, 'precio': float(precio),
+                 'stock': stock, 'categoria': categoria}
+                for pk, _, nombre, descripcion, precio, stock, _, categoria in catalogo.filas()
+            ]
+        else:
+            data = []
+            for p in Producto.objects.select_related('categoria').all():
+                data.append({
+                    'id': p.id,
+                    'nombre': p.nombre,
+                    'descripcion': p.descripcion,
+                    'precio': float(p.precio),
+                    'stock': p.stock,
+                    'categoria': p.categoria.nombre
+                })
 
         response = HttpResponse(
-            json.dumps(data, indent=4, ensure_ascii=False),
+            renderers.dumps(data, request),
             content_type='application/json'
         )
         response['Content-Disposition'] = 'attachment; filename="productos.json"'
@@ -426,7 +821,7 @@ def exportar_inventarios_json(request):
             })
 
         response = HttpResponse(
-            json.dumps(data, indent=4, ensure_ascii=False),
+            renderers.dumps(data, request),
             content_type='application/json'
         )
         response['Content-Disposition'] = 'attachment; filename="inventarios.json"'
@@ -437,6 +832,28 @@ def exportar_inventarios_json(request):
         logger.error(f"Error al generar JSON de inventarios - Error: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
     
+def _exportar(request, nombre, columnas, consulta_de):
+    formato = request.GET.get('format', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        return JsonResponse({'error': f"Formato no soportado, use uno de: {', '.join(FORMATOS_EXPORTACION)}"}, status=400)
+    try:
+        consulta = consulta_de(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    logger.info(f"Exportando {nombre} - Usuario: {request.user.username}, Formato: {formato}, Filtros: {request.GET.dict()}")
+    try:
+        return respuesta_exportacion(formato, nombre, columnas, consulta)
+    except ImportError:
+        return JsonResponse({'error': "La exportación XLSX requiere openpyxl"}, status=501)
+
+@login_required
+def exportar_productos(request):
+    return _exportar(request, 'productos', COLUMNAS_PRODUCTOS, consulta_productos)
+
+@login_required
+def exportar_inventarios(request):
+    return _exportar(request, 'inventarios', COLUMNAS_INVENTARIOS, consulta_inventarios)
+
 @login_required
 @user_passes_test(lambda u: u.profile.role == 'admin')
 def view_logs(request):
@@ -479,6 +896,9 @@ def export_logs_pdf(request):
     """Exportar logs a PDF"""
     if not request.user.profile.role == 'admin':
         return HttpResponseForbidden("No tienes permiso para realizar esta acción.")
+
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
     
     log_file_path = os.path.join(settings.BASE_DIR, 'logs/django.log')
     error_log_path = os.path.join(settings.BASE_DIR, 'logs/errors.log')
@@ -0,0 +1,65 @@
+"""
+Nombre y rol del usuario guardados en la sesión al iniciarla, para que las vistas HTML
+y el logging los lean sin consultar auth_user ni usuarios_profile en cada página. Cada
+SESION_REVALIDAR_SEGUNDOS se vuelven a cargar desde la base de datos, lo que también
+comprueba el hash de la contraseña: un cambio de rol o de contraseña se aplica a las
+sesiones abiertas como mucho tras ese intervalo.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.utils.functional import SimpleLazyObject, empty
+
+CLAVE_USUARIO = '_usuario_nombre'
+CLAVE_ROL = '_usuario_rol'
+CLAVE_VALIDADO = '_usuario_validado'
+
+
+def guardar_en_sesion(request, usuario):
+    request.session[CLAVE_USUARIO] = usuario.username
+    request.session[CLAVE_ROL] = usuario.profile.role
+    request.session[CLAVE_VALIDADO] = int(time.time())
+
+
+def usuario_de_sesion(request):
+    """(nombre, rol) del usuario de la sesión, o None si no hay una sesión iniciada."""
+    sesion = getattr(request, 'session', None)
+    if sesion is None or SESSION_KEY not in sesion:
+        return None
+    validado = sesion.get(CLAVE_VALIDADO, 0)
+    if CLAVE_ROL not in sesion or time.time() - validado > settings.SESION_REVALIDAR_SEGUNDOS:
+        # Sesión iniciada sin pasar por login_view (o revalidación periódica): se carga el usuario una vez
+        if not request.user.is_authenticated:
+            return None
+        guardar_en_sesion(request, request.user)
+    return sesion[CLAVE_USUARIO], sesion[CLAVE_ROL]
+
+
+def sesion_requerida(vista=None, login_url=None):
+    """Como login_required, pero comprobando la sesión sin cargar request.user."""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(request, *args, **kwargs):
+            if usuario_de_sesion(request) is None:
+                from django.contrib.auth.views import redirect_to_login
+
+                return redirect_to_login(request.get_full_path(), login_url or settings.LOGIN_URL)
+            return funcion(request, *args, **kwargs)
+        return envoltura
+    return decorador(vista) if vista else decorador
+
+
+def nombre_usuario(request):
+    """
+    Nombre para los logs: el de request.user si ya se cargó (por ejemplo, al autenticar
+    con DRF) y, si no, el guardado en la sesión, sin forzar ninguna consulta.
+    """
+    usuario = getattr(request, 'user', None)
+    if usuario is None:
+        return 'anonymous'
+    if isinstance(usuario, SimpleLazyObject) and usuario._wrapped is empty:
+        sesion = getattr(request, 'session', None)
+        return (sesion.get(CLAVE_USUARIO) if sesion is not None else None) or 'anonymous'
+    return getattr(usuario, 'username', '') or 'anonymous'